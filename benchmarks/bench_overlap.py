@@ -0,0 +1,87 @@
+"""
+Benchmarks of the OpSim loading and CCD-visit overlap hot paths on a
+synthetic OpSim db.
+"""
+import os
+import sys
+import argparse
+import tempfile
+from desc_roman_sims.survey_region_ccds import SurveyRegion, \
+    CcdRegionFactory, OpSimData
+from desc_roman_sims.instrument_cache import clear_caches
+from bench_results import time_call
+from synthetic_opsim import make_opsim_db
+
+
+__all__ = ['run_overlap_benchmarks']
+
+
+def run_overlap_benchmarks(db_file, ra0=9.5, dec0=-44., region_size=10.,
+                           repeat=5):
+    """
+    Time the OpSimData load, obs_info, CcdRegionFactory construction,
+    create, and select_ccds for visits that are fully and partially
+    inside a region centered on (ra0, dec0).
+
+    Returns
+    -------
+    dict : Timings keyed by benchmark name.
+    """
+    results = {}
+    results['opsim_data_load'] \
+        = time_call(lambda: OpSimData(db_file), repeat=repeat)
+    region = SurveyRegion(ra0, dec0, region_size, region_size)
+    results['opsim_data_load_region'] = time_call(
+        lambda: OpSimData(db_file, region=region), repeat=repeat)
+
+    opsim_data = OpSimData(db_file)
+    visits = opsim_data.df['observationId'].to_numpy()[:1000]
+    results['obs_info_x1000'] = time_call(
+        lambda: [opsim_data.obs_info(_) for _ in visits], repeat=repeat)
+
+    mjd, _, _, band, rottelpos = opsim_data.obs_info(visits[0])
+    # The full-overlap pointing is at the region center, and the
+    # partial-overlap pointing is on the region's eastern edge.
+    pointings = {'full': (ra0, dec0),
+                 'partial': (region.ra_max, dec0)}
+
+    def make_factory(pointing='full'):
+        ra, dec = pointings[pointing]
+        return CcdRegionFactory(mjd, ra, dec, band, rottelpos,
+                                fov_radius=1.8)
+
+    def cold_factory():
+        clear_caches()
+        return make_factory()
+
+    results['ccd_region_factory_cold'] = time_call(cold_factory,
+                                                   repeat=repeat)
+    results['ccd_region_factory'] = time_call(make_factory, repeat=repeat)
+    results['create_R22_S11'] = time_call(
+        lambda: make_factory().create('R22_S11'), repeat=repeat)
+    for pointing in pointings:
+        results[f'select_ccds_{pointing}'] = time_call(
+            lambda: make_factory(pointing).select_ccds(region),
+            repeat=repeat)
+        results[f'select_ccds_bulk_{pointing}'] = time_call(
+            lambda: make_factory(pointing).select_ccds_bulk(region),
+            repeat=repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_visits', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'opsim.db')
+        make_opsim_db(db_file, num_visits=args.num_visits)
+        results = run_overlap_benchmarks(db_file, repeat=args.repeat)
+    for name, timing in results.items():
+        print(f"{name:40s} {timing['median']:10.4g} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
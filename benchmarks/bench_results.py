@@ -0,0 +1,75 @@
+"""
+Timing and storage of benchmark results.  Results are saved as json
+files with the package version info so that the timings from
+different versions can be compared.
+"""
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+
+
+__all__ = ['time_call', 'save_results', 'load_results', 'compare_results']
+
+
+def time_call(func, repeat=5, number=1):
+    """
+    Time func(), repeat times, with number calls per repetition.
+    Return a dict with the median and minimum time per call in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0)/number)
+    return dict(median=float(np.median(times)), min=float(np.min(times)),
+                repeat=repeat, number=number)
+
+
+def _git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, outfile, label=None):
+    """Save the benchmark results with the version and host info."""
+    output = dict(label=label, version=_git_version(),
+                  timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  python=sys.version.split()[0], host=platform.node(),
+                  results=results)
+    with open(outfile, 'w') as fobj:
+        json.dump(output, fobj, indent=2)
+
+
+def load_results(infile):
+    with open(infile) as fobj:
+        return json.load(fobj)
+
+
+def compare_results(results, baseline, threshold=1.2):
+    """
+    Compare the median timings to a baseline, and return a report
+    and the list of benchmarks that are slower by more than the
+    threshold factor.
+    """
+    lines = [f"{'benchmark':40s} {'baseline':>10s} {'current':>10s} "
+             f"{'ratio':>7s}"]
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        ratio = timing['median']/baseline[name]['median']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  <-- slower'
+        lines.append(f"{name:40s} {baseline[name]['median']:10.4g} "
+                     f"{timing['median']:10.4g} {ratio:7.2f}{flag}")
+    return "\n".join(lines), regressions
@@ -0,0 +1,70 @@
+"""
+Start-up time of the package imports and command-line tools, measured
+in fresh interpreter processes.
+"""
+import os
+import sys
+import argparse
+import subprocess
+import time
+import numpy as np
+
+
+__all__ = ['run_startup_benchmarks']
+
+
+_BIN_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'bin')
+
+# Import statements and command-line tools to time.
+IMPORTS = ('import desc_roman_sims',
+           'from desc_roman_sims import GalSimJobGenerator',
+           'import desc_roman_sims.survey_region_ccds',
+           'import desc_roman_sims.overlap_pipeline',
+           'import desc_roman_sims.cli')
+COMMANDS = ('desc_roman_overlaps', 'desc_roman_submit', 'desc_roman_status')
+
+
+def _time_process(args, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return dict(median=float(np.median(times)), min=float(np.min(times)),
+                repeat=repeat, number=1)
+
+
+def run_startup_benchmarks(repeat=5):
+    """
+    Time the imports and the `--help` of each command-line tool.
+
+    Returns
+    -------
+    dict : Timings keyed by benchmark name.
+    """
+    results = {'python_startup': _time_process([sys.executable, '-c', ''],
+                                               repeat)}
+    for statement in IMPORTS:
+        name = 'startup_' + statement.split()[-1].replace('.', '_')
+        results[name] = _time_process([sys.executable, '-c', statement],
+                                      repeat)
+    for command in COMMANDS:
+        results[f'startup_{command}_help'] = _time_process(
+            [sys.executable, os.path.join(_BIN_DIR, command), '--help'],
+            repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    for name, timing in run_startup_benchmarks(args.repeat).items():
+        print(f"{name:40s} {timing['median']:10.4g} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Microbenchmark of the GalSimJobGenerator task submission rate.  A fake
+`galsim` executable is put at the front of the PATH so that the
+submitted jobs finish immediately, and the imsim config is a minimal
+yaml file with the entries that GalSimJobGenerator reads.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import parsl
+from parsl.config import Config
+from parsl.executors import ThreadPoolExecutor
+from desc_roman_sims import GalSimJobGenerator
+
+
+_IMSIM_YAML = """output.dir:
+    type: FormattedStr
+    format: {tmp_dir}/output/%08d
+input.atm_psf.save_file:
+    type: FormattedStr
+    format: {tmp_dir}/atm_psf_files/atm_psf_%08d-%1d-%s.pkl
+"""
+
+
+def make_fake_galsim(bin_dir):
+    """Write a `galsim` script that exits immediately."""
+    os.makedirs(bin_dir, exist_ok=True)
+    galsim_script = os.path.join(bin_dir, 'galsim')
+    with open(galsim_script, 'w') as fobj:
+        fobj.write("#!/bin/sh\nexit 0\n")
+    os.chmod(galsim_script, 0o755)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+
+
+def make_imsim_yaml(tmp_dir):
+    imsim_yaml = os.path.join(tmp_dir, 'imsim.yaml')
+    with open(imsim_yaml, 'w') as fobj:
+        fobj.write(_IMSIM_YAML.format(tmp_dir=tmp_dir))
+    return imsim_yaml
+
+
+def run_submission_benchmark(tmp_dir, num_visits=100, nfiles=10,
+                             max_threads=4):
+    """
+    Time the GalSimJobGenerator construction, which assembles the job
+    lists, and the submission of all of the PSF and CCD jobs against
+    the fake galsim command.  The Parsl config is loaded and cleaned up
+    here.  A RuntimeError is raised if any of the jobs failed.
+
+    Returns
+    -------
+    dict : Timings keyed by benchmark name.
+    """
+    make_fake_galsim(os.path.join(tmp_dir, 'bin'))
+    imsim_yaml = make_imsim_yaml(tmp_dir)
+    config = Config(executors=[
+        ThreadPoolExecutor(label='thread_pool', max_threads=1),
+        ThreadPoolExecutor(label='local', max_threads=max_threads)],
+                    run_dir=os.path.join(tmp_dir, 'runinfo'))
+    parsl.load(config)
+    try:
+        visits = list(range(1, num_visits + 1))
+        t0 = time.perf_counter()
+        generator = GalSimJobGenerator(
+            imsim_yaml, visits, nfiles=nfiles,
+            log_dir=os.path.join(tmp_dir, 'logging'),
+            clean_up_atm_psfs=False, bash_app_executor='local')
+        dt_init = time.perf_counter() - t0
+
+        ccd_futures = []
+        t0 = time.perf_counter()
+        for _ in range(generator.num_jobs + 1):
+            ccd_future = generator.get_job_future()
+            if ccd_future is not None:
+                ccd_futures.append(ccd_future)
+        dt_submit = time.perf_counter() - t0
+        exceptions = [_.exception() for _ in ccd_futures]
+    finally:
+        parsl.dfk().cleanup()
+        parsl.clear()
+    # A submission rate is only meaningful if the jobs succeeded.
+    failures = [_ for _ in exceptions if _ is not None]
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(ccd_futures)} CCD "
+                           f"jobs failed, e.g., {failures[0]!r}")
+    num_tasks = len(ccd_futures) + len(visits)
+    print(f"submitted {len(ccd_futures)} CCD jobs and {len(visits)} "
+          f"PSF jobs in {dt_submit:.2f} s: "
+          f"{num_tasks/dt_submit:.1f} submissions/s")
+    return {'job_generator_init': dict(median=dt_init, min=dt_init,
+                                       repeat=1, number=1),
+            'job_submission_per_task': dict(median=dt_submit/num_tasks,
+                                            min=dt_submit/num_tasks,
+                                            repeat=1, number=num_tasks)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_visits', type=int, default=100)
+    parser.add_argument('--nfiles', type=int, default=10)
+    parser.add_argument('--max_threads', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_submission_benchmark(tmp_dir, num_visits=args.num_visits,
+                                 nfiles=args.nfiles,
+                                 max_threads=args.max_threads)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Run the benchmark suite and save the results for comparison between
+versions, e.g.,
+
+    python benchmarks/run_benchmarks.py --outfile results_main.json
+    python benchmarks/run_benchmarks.py --baseline results_main.json
+"""
+import os
+import sys
+import argparse
+import tempfile
+from bench_results import save_results, load_results, compare_results
+from bench_overlap import run_overlap_benchmarks
+from bench_startup import run_startup_benchmarks
+from bench_submission import run_submission_benchmark
+from synthetic_opsim import make_opsim_db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_visits', type=int, default=10000,
+                        help='number of visits in the synthetic OpSim db')
+    parser.add_argument('--num_job_visits', type=int, default=100,
+                        help='number of visits for job generation')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='json file for the results')
+    parser.add_argument('--label', type=str, default=None)
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='json file of results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slow-down factor reported as a regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'opsim.db')
+        make_opsim_db(db_file, num_visits=args.num_visits)
+        results = run_overlap_benchmarks(db_file, repeat=args.repeat)
+        results.update(run_submission_benchmark(
+            tmp_dir, num_visits=args.num_job_visits))
+    results.update(run_startup_benchmarks(repeat=args.repeat))
+
+    for name, timing in results.items():
+        print(f"{name:40s} {timing['median']:10.4g} s")
+    if args.outfile is not None:
+        save_results(results, args.outfile, label=args.label)
+    if args.baseline is not None:
+        report, regressions \
+            = compare_results(results, load_results(args.baseline)['results'],
+                              threshold=args.threshold)
+        print(report)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
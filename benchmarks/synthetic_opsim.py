@@ -0,0 +1,102 @@
+"""
+Generator of synthetic OpSim sqlite databases for benchmarking.  The
+pointings are distributed uniformly over a spherical cap, with the
+observations table columns that OpSimData and imsim read.
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+
+__all__ = ['make_opsim_db']
+
+
+BANDS = ('u', 'g', 'r', 'i', 'z', 'y')
+
+
+def make_opsim_db(db_file, num_visits=10000, ra0=9.5, dec0=-44.,
+                  radius=10., mjd0=60796., seed=42):
+    """
+    Write a synthetic OpSim db file.
+
+    Parameters
+    ----------
+    db_file : str
+        Output sqlite file.  An existing file is overwritten.
+    num_visits : int [10000]
+        Number of visits.
+    ra0, dec0 : float [9.5, -44.]
+        Center of the spherical cap of pointings in degrees.
+    radius : float [10.]
+        Radius of the spherical cap in degrees.
+    mjd0 : float [60796.]
+        MJD of the first visit.  Visits are ~40 s apart during 8 hour
+        nights.
+    seed : int [42]
+        Random number seed.
+
+    Returns
+    -------
+    pandas.DataFrame : The observations table.
+    """
+    rng = np.random.default_rng(seed)
+    # Uniform sampling of the cap around the north pole, then rotate
+    # the pole to (ra0, dec0).
+    cos_theta = rng.uniform(np.cos(np.radians(radius)), 1., num_visits)
+    sin_theta = np.sqrt(1. - cos_theta**2)
+    phi = rng.uniform(0., 2.*np.pi, num_visits)
+    xyz = np.array([sin_theta*np.cos(phi), sin_theta*np.sin(phi),
+                    cos_theta])
+    colat, lon = np.radians(90. - dec0), np.radians(ra0)
+    rot_y = np.array([[np.cos(colat), 0., np.sin(colat)],
+                      [0., 1., 0.],
+                      [-np.sin(colat), 0., np.cos(colat)]])
+    rot_z = np.array([[np.cos(lon), -np.sin(lon), 0.],
+                      [np.sin(lon), np.cos(lon), 0.],
+                      [0., 0., 1.]])
+    x, y, z = rot_z @ rot_y @ xyz
+    ra = np.degrees(np.arctan2(y, x)) % 360.
+    dec = np.degrees(np.arcsin(np.clip(z, -1., 1.)))
+
+    visits_per_night = 720
+    night = np.arange(num_visits)//visits_per_night
+    mjd = (mjd0 + night + 40./86400.*(np.arange(num_visits)
+                                      % visits_per_night))
+    df = pd.DataFrame(dict(observationId=np.arange(num_visits),
+                           observationStartMJD=mjd,
+                           fieldRA=ra,
+                           fieldDec=dec,
+                           filter=rng.choice(BANDS, num_visits),
+                           rotTelPos=rng.uniform(-90., 90., num_visits),
+                           rotSkyPos=rng.uniform(0., 360., num_visits),
+                           airmass=rng.uniform(1., 2., num_visits),
+                           seeingFwhmEff=rng.uniform(0.5, 1.5, num_visits),
+                           visitExposureTime=np.full(num_visits, 30.),
+                           night=night))
+    if os.path.isfile(db_file):
+        os.remove(db_file)
+    with sqlite3.connect(db_file) as con:
+        df.to_sql('observations', con, index=False)
+        con.execute("create index obs_id on observations (observationId)")
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('db_file', type=str)
+    parser.add_argument('--num_visits', type=int, default=10000)
+    parser.add_argument('--ra0', type=float, default=9.5)
+    parser.add_argument('--dec0', type=float, default=-44.)
+    parser.add_argument('--radius', type=float, default=10.)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    make_opsim_db(args.db_file, num_visits=args.num_visits, ra0=args.ra0,
+                  dec0=args.dec0, radius=args.radius, seed=args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
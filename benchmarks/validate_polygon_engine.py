@@ -0,0 +1,62 @@
+"""
+Validate the vectorized ConvexPolygonEngine against lsst.sphgeom for
+random CCD-sized quadrilaterals scattered around a survey region, and
+compare the run times.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+import lsst.sphgeom
+from desc_roman_sims.survey_region_ccds import SurveyRegion, unit_vectors
+from desc_roman_sims.polygon_engine import validate_against_sphgeom
+
+
+def random_quads(num, ra0, dec0, radius, size=0.22, seed=42):
+    """
+    Return an array of shape (num, 4, 3) of the vertices of squares
+    of side size degrees with random centers within radius degrees of
+    (ra0, dec0) and random orientations.
+    """
+    rng = np.random.default_rng(seed)
+    ra = ra0 + rng.uniform(-radius, radius, num)/np.cos(np.radians(dec0))
+    dec = dec0 + rng.uniform(-radius, radius, num)
+    angle = rng.uniform(0, np.pi/2, num)[:, None] \
+        + np.pi/2*np.arange(4)[None, :]
+    half_diagonal = size/np.sqrt(2.)
+    corner_dec = dec[:, None] + half_diagonal*np.sin(angle)
+    corner_ra = ra[:, None] + (half_diagonal*np.cos(angle)
+                               / np.cos(np.radians(corner_dec)))
+    return unit_vectors(corner_ra, corner_dec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num', type=int, default=100000)
+    parser.add_argument('--size', type=float, default=10.)
+    args = parser.parse_args(argv)
+
+    ra0, dec0 = 9.5, -44.
+    region = SurveyRegion(ra0, dec0, args.size, args.size)
+    vectors = random_quads(args.num, ra0, dec0, args.size)
+
+    t0 = time.time()
+    intersects, contains = region.relate_polygons(vectors)
+    dt_engine = time.time() - t0
+
+    t0 = time.time()
+    for polygon_vectors in vectors:
+        region.intersects(lsst.sphgeom.ConvexPolygon(
+            [lsst.sphgeom.UnitVector3d(*_) for _ in polygon_vectors]))
+    dt_sphgeom = time.time() - t0
+
+    mismatches = validate_against_sphgeom(region.engine, vectors)
+    print(f"{args.num} polygons: {intersects.sum()} intersecting, "
+          f"{contains.sum()} contained")
+    print(f"engine: {dt_engine:.3f} s, sphgeom: {dt_sphgeom:.3f} s")
+    print(f"{mismatches} mismatches with sphgeom")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
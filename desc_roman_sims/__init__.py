@@ -1 +1,48 @@
-from .galsim_job_generator import *
+"""
+The public names of the submodules are imported on first use, so that
+`import desc_roman_sims` and the command-line tools do not load parsl,
+galsim, or the LSST stack until the code that needs them runs.
+"""
+import importlib
+
+
+# Public names and the submodules that define them.
+_SUBMODULE_NAMES = {
+    'capacity_planner': ['NodeProfile', 'PlanResult', 'SimTask',
+                         'read_ccd_visits', 'CapacityPlanner'],
+    'ccd_visit_catalog': ['CcdVisitCatalog', 'det_name_to_num'],
+    'dry_run': ['DryRun', 'simulate_psf', 'simulate_ccds'],
+    'galsim_job_generator': ['GalSimJobGenerator', 'config_hash'],
+    'job_manifest': ['JobManifest', 'det_num_from_filename',
+                     'rendered_dets', 'job_rendered_dets'],
+    'job_packing': ['CcdJobSpec', 'read_process_info', 'CcdCostModel',
+                    'consecutive_jobs', 'balanced_jobs'],
+    'node_cache': ['CACHE_DIR_ENV', 'default_cache_dir', 'NodeCache'],
+    'polygon_engine': ['polygon_vertices', 'interior_normals',
+                       'ConvexPolygonEngine', 'validate_against_sphgeom'],
+    'resource_tracker': ['ResourceTracker', 'EscalatingFuture',
+                         'is_memory_failure'],
+    'sky_ordering': ['ang2pix_ring', 'fov_tiles', 'catalog_reuse_rate',
+                     'sky_order', 'order_visits'],
+    'telemetry': ['TaskTelemetry', 'task_times', 'read_start_time'],
+}
+
+_NAME_TO_SUBMODULE = {name: submodule for submodule, names
+                      in _SUBMODULE_NAMES.items() for name in names}
+
+__all__ = list(_NAME_TO_SUBMODULE)
+
+
+def __getattr__(name):
+    if name not in _NAME_TO_SUBMODULE:
+        raise AttributeError(f"module {__name__!r} has no attribute "
+                             f"{name!r}")
+    module = importlib.import_module(f".{_NAME_TO_SUBMODULE[name]}",
+                                     __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,354 @@
+"""
+Capacity planning for CCD-visit simulation campaigns.  The PSF and CCD
+jobs for a table of CCD-visits are packed onto a number of nodes with
+a discrete-event simulation that uses per-CCD and per-PSF cost
+estimates, and the settings of nfiles, nproc, and memory per job that
+minimize the predicted wall time are recommended.  As with the
+WorkQueue resource specifications of GalSimJobGenerator, each job
+requests a single core, so the jobs are packed onto the nodes by
+memory, and the nproc processes of the CCD jobs share the node cores.
+"""
+import os
+import sys
+import math
+import heapq
+import argparse
+import itertools
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from .job_packing import CcdCostModel, consecutive_jobs, balanced_jobs, \
+    _process_makespan
+
+
+__all__ = ['NodeProfile', 'PlanResult', 'SimTask', 'read_ccd_visits',
+           'CapacityPlanner']
+
+
+NodeProfile = namedtuple('NodeProfile', ['cores', 'memory_MB'])
+
+PlanResult = namedtuple('PlanResult', ['nodes', 'nfiles', 'nproc',
+                                       'GB_per_CCD', 'memory_MB',
+                                       'num_jobs', 'makespan', 'node_hours',
+                                       'core_utilization'])
+
+# A simulated job: the cores and memory it requests and the number of
+# processes that it runs.
+SimTask = namedtuple('SimTask', ['visit', 'is_psf', 'cores', 'memory_MB',
+                                 'duration', 'processes'], defaults=[1])
+
+
+def read_ccd_visits(ccd_visits, camera_name="LsstCam"):
+    """
+    Return a dict of det_num lists keyed by visit from a CCD-visit
+    table, i.e., a parquet file with visit, band, and det_name columns
+    as written by OverlapPipeline, a data frame with those columns, or
+    a CcdVisitCatalog.
+    """
+    if hasattr(ccd_visits, 'det_lists'):
+        return {visit: sorted(int(_) for _ in dets) for visit, dets
+                in ccd_visits.det_lists().items()}
+    if isinstance(ccd_visits, str):
+        ccd_visits = pd.read_parquet(ccd_visits)
+    df = ccd_visits
+    if 'det_num' not in df:
+        from .ccd_visit_catalog import det_name_to_num
+        df = df.assign(det_num=det_name_to_num(df['det_name'],
+                                               camera_name=camera_name))
+    return {visit: sorted(int(_) for _ in group['det_num'])
+            for visit, group in df.groupby('visit', sort=True)}
+
+
+class CapacityPlanner:
+    """
+    Predict the makespan and node-hours of a campaign for different
+    job settings and node counts.
+    """
+    def __init__(self, det_lists, node_profile=NodeProfile(64, 182000),
+                 cost_model=None, psf_wall_time=300., psf_memory_GB=8.,
+                 job_overhead=60., memory_margin=1.2, packing='consecutive',
+                 window=200, GB_per_CCD=None):
+        """
+        Parameters
+        ----------
+        det_lists : dict
+            Lists of det_num values keyed by visit, e.g., from
+            read_ccd_visits.  The visits are processed in key order.
+        node_profile : NodeProfile [NodeProfile(64, 182000)]
+            Cores and memory in MB of each node.  The memory default
+            is the WorkQueue worker memory in parsl_config.
+        cost_model : CcdCostModel [None]
+            Per-CCD wall time and memory estimates.  If None, a model
+            with the default values is used.
+        psf_wall_time : float [300.]
+            Wall time in seconds of each atm psf job.
+        psf_memory_GB : float [8.]
+            Memory of each atm psf job in GB.
+        job_overhead : float [60.]
+            Start-up time in seconds of each CCD job, e.g., for reading
+            the sky catalog and atm psf file.
+        memory_margin : float [1.2]
+            Factor applied to the summed peak memory of the nproc
+            largest CCDs in each job for balanced packing and for the
+            suggested GB_per_CCD values.
+        packing : str ['consecutive']
+            'consecutive' or 'balanced'.  See GalSimJobGenerator.
+        window : int [200]
+            Number of queued tasks that are considered for starting
+            at each scheduling step, i.e., how far the scheduler can
+            look past a task that does not fit.
+        GB_per_CCD : float [None]
+            Memory per process in GB of the consecutively packed CCD
+            jobs.  As in GalSimJobGenerator, these jobs request
+            GB_per_CCD*nproc, and balanced jobs request the memory of
+            their job specs.  If None, the value from
+            suggest_GB_per_CCD is used for each nfiles and nproc.
+        """
+        self.det_lists = det_lists
+        self.node_profile = NodeProfile(*node_profile)
+        self.cost_model = CcdCostModel() if cost_model is None \
+            else cost_model
+        self.psf_wall_time = psf_wall_time
+        self.psf_memory_MB = 1024*psf_memory_GB
+        self.job_overhead = job_overhead
+        self.memory_margin = memory_margin
+        if packing not in ('consecutive', 'balanced'):
+            raise ValueError(f"Unknown packing mode: {packing}")
+        self.packing = packing
+        self.window = window
+        self.GB_per_CCD = GB_per_CCD
+        self._costs = {visit: self.cost_model.estimate(visit, dets)
+                       for visit, dets in det_lists.items()}
+
+    def num_ccds(self):
+        return sum(len(_) for _ in self.det_lists.values())
+
+    def suggest_GB_per_CCD(self, nfiles, nproc):
+        """
+        Return the smallest GB_per_CCD, rounded up to 0.1 GB, for
+        which the requests of the consecutively packed jobs cover
+        memory_margin times the estimated peak memory of every job,
+        i.e., the summed peak memory of its nproc largest CCDs.
+        """
+        peak = 0.
+        for visit, dets in self.det_lists.items():
+            memories = self._costs[visit][1]
+            for start in range(0, len(dets), nfiles):
+                job_memories = np.sort(memories[start:start + nfiles])[::-1]
+                peak = max(peak, job_memories[:nproc].sum())
+        return math.ceil(10*self.memory_margin*peak/nproc)/10.
+
+    def _GB_per_CCD(self, nfiles, nproc):
+        """GB_per_CCD of the consecutive jobs, or None for balanced."""
+        if self.packing == 'balanced':
+            return None
+        if self.GB_per_CCD is None:
+            return self.suggest_GB_per_CCD(nfiles, nproc)
+        return self.GB_per_CCD
+
+    def make_tasks(self, nfiles, nproc):
+        """
+        Return the list of SimTasks for the PSF and CCD jobs in
+        submission order.  The cores and memory of each job are the
+        requests made by GalSimJobGenerator.
+        """
+        GB_per_CCD = self._GB_per_CCD(nfiles, nproc)
+        tasks = []
+        for visit, dets in self.det_lists.items():
+            if not dets:
+                continue
+            wall_times, memories = self._costs[visit]
+            index = {det: i for i, det in enumerate(dets)}
+            if self.packing == 'balanced':
+                jobs = balanced_jobs(dets, wall_times, memories, nfiles,
+                                     nproc, memory_margin=self.memory_margin)
+            else:
+                jobs = consecutive_jobs(dets, nfiles)
+            tasks.append(SimTask(visit, True, 1, self.psf_memory_MB,
+                                 self.psf_wall_time))
+            for job in jobs:
+                rows = [index[_] for _ in job.det_nums]
+                job_nproc = min(nproc, len(rows))
+                duration = self.job_overhead + _process_makespan(
+                    wall_times[rows], job_nproc)
+                if job.memory_GB is None:
+                    memory = GB_per_CCD*1024*nproc
+                else:
+                    memory = math.ceil(job.memory_GB*1024)
+                tasks.append(SimTask(visit, False, 1, memory, duration,
+                                     job_nproc))
+        return tasks
+
+    def simulate(self, tasks, nodes):
+        """
+        Simulate running the tasks on the nodes.  Tasks are started in
+        queue order, subject to the free cores and memory of the nodes,
+        and CCD jobs wait for the PSF job of their visit.  The tasks
+        are SimTasks or (visit, is_psf, cores, memory_MB, duration)
+        tuples.  Returns the makespan in seconds and the busy
+        process-seconds.
+        """
+        tasks = [SimTask(*_) for _ in tasks]
+        cores, memory_MB = self.node_profile
+        for _, _, task_cores, task_memory, _, _ in tasks:
+            if task_cores > cores or task_memory > memory_MB:
+                raise ValueError("A task does not fit on a node: "
+                                 f"{task_cores} cores, {task_memory} MB")
+        free_cores = np.full(nodes, cores)
+        free_memory = np.full(nodes, float(memory_MB))
+        psf_done = set()
+        # Indexes, in queue order, of the queued tasks that can be
+        # started at each step, and the index of the next task to add
+        # to that window.
+        window = list(range(min(self.window, len(tasks))))
+        next_task = len(window)
+        running = []
+        now = 0.
+        busy = 0.
+        while window or running:
+            # Start the tasks in the window that fit.  Starting a task
+            # only reduces the free resources, so the tasks passed over
+            # in this pass cannot be started until a task finishes.
+            max_cores, max_memory = free_cores.max(), free_memory.max()
+            i = 0
+            while i < len(window) and max_cores > 0:
+                visit, is_psf, task_cores, task_memory, duration, \
+                    processes = tasks[window[i]]
+                if ((not is_psf and visit not in psf_done)
+                        or task_cores > max_cores
+                        or task_memory > max_memory):
+                    i += 1
+                    continue
+                fits = (free_cores >= task_cores) \
+                    & (free_memory >= task_memory)
+                if not fits.any():
+                    i += 1
+                    continue
+                node = fits.argmax()
+                free_cores[node] -= task_cores
+                free_memory[node] -= task_memory
+                heapq.heappush(running, (now + duration, node, visit,
+                                         is_psf, task_cores, task_memory))
+                busy += processes*duration
+                del window[i]
+                if next_task < len(tasks):
+                    window.append(next_task)
+                    next_task += 1
+                max_cores, max_memory = free_cores.max(), free_memory.max()
+            if not running:
+                raise RuntimeError("No task can be started.")
+            # Advance to the next task completion.
+            now, node, visit, is_psf, task_cores, task_memory \
+                = heapq.heappop(running)
+            free_cores[node] += task_cores
+            free_memory[node] += task_memory
+            if is_psf:
+                psf_done.add(visit)
+        return now, busy
+
+    def evaluate(self, nodes, nfiles, nproc):
+        """
+        Return the PlanResult for the settings.  Since the jobs
+        request one core each, the simulated nodes can run more
+        processes than they have cores, so the makespan is at least
+        the busy process-seconds divided by the total number of cores.
+        """
+        tasks = self.make_tasks(nfiles, nproc)
+        makespan, busy = self.simulate(tasks, nodes)
+        makespan = max(makespan, busy/(nodes*self.node_profile.cores))
+        memory = max(_.memory_MB for _ in tasks if not _.is_psf)
+        return PlanResult(nodes, nfiles, nproc,
+                          self._GB_per_CCD(nfiles, nproc),
+                          int(np.ceil(memory)),
+                          sum(not _.is_psf for _ in tasks), makespan,
+                          nodes*makespan/3600.,
+                          busy/(nodes*self.node_profile.cores*makespan))
+
+    def plan(self, nodes, nfiles_values=(4, 8, 10, 16, 20),
+             nproc_values=(1, 2, 4, 8)):
+        """
+        Evaluate the grid of node counts, nfiles, and nproc values,
+        with nfiles >= nproc as required by GalSimJobGenerator.
+        Returns a data frame of PlanResults sorted by makespan and
+        node-hours.
+        """
+        if np.isscalar(nodes):
+            nodes = [nodes]
+        results = [self.evaluate(*pars) for pars in itertools.product(
+            nodes, nfiles_values, nproc_values) if pars[1] >= pars[2]]
+        df = pd.DataFrame(results, columns=PlanResult._fields)
+        return df.sort_values(['makespan', 'node_hours'], ignore_index=True)
+
+    @staticmethod
+    def recommend(plan):
+        """
+        Return the settings from a plan data frame with the shortest
+        makespan for each node count.
+        """
+        return plan.loc[plan.groupby('nodes')['makespan'].idxmin()] \
+            .reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Predict campaign wall times and node-hours "
+        "from a CCD-visit table.")
+    parser.add_argument('ccd_visits', type=str,
+                        help='parquet file with visit, band, and det_name '
+                        'columns, or a CcdVisitCatalog directory')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[10])
+    parser.add_argument('--cores', type=int, default=64)
+    parser.add_argument('--memory', type=int, default=182000,
+                        help='node memory in MB')
+    parser.add_argument('--nfiles', type=int, nargs='+',
+                        default=[4, 8, 10, 16, 20])
+    parser.add_argument('--nproc', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--cost_model', type=str, default=None,
+                        help='parquet file of CcdCostModel measurements')
+    parser.add_argument('--ccd_wall_time', type=float, default=600.,
+                        help='default wall time per CCD in seconds')
+    parser.add_argument('--ccd_memory', type=float, default=6.,
+                        help='default peak memory per CCD in GB')
+    parser.add_argument('--GB_per_CCD', type=float, default=None,
+                        help='memory per process in GB of the consecutive '
+                        'jobs; if omitted, the value suggested from the '
+                        'cost model is used')
+    parser.add_argument('--psf_wall_time', type=float, default=300.)
+    parser.add_argument('--GB_per_PSF', type=float, default=8.)
+    parser.add_argument('--job_overhead', type=float, default=60.)
+    parser.add_argument('--packing', type=str, default='consecutive',
+                        choices=('consecutive', 'balanced'))
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='csv file for the full plan table')
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.ccd_visits):
+        from .ccd_visit_catalog import CcdVisitCatalog
+        det_lists = read_ccd_visits(CcdVisitCatalog(args.ccd_visits))
+    else:
+        det_lists = read_ccd_visits(args.ccd_visits)
+    cost_model = CcdCostModel(default_wall_time=args.ccd_wall_time,
+                              default_memory_GB=args.ccd_memory)
+    if args.cost_model is not None:
+        cost_model.load(args.cost_model)
+    planner = CapacityPlanner(det_lists,
+                              node_profile=NodeProfile(args.cores,
+                                                       args.memory),
+                              cost_model=cost_model,
+                              psf_wall_time=args.psf_wall_time,
+                              psf_memory_GB=args.GB_per_PSF,
+                              job_overhead=args.job_overhead,
+                              packing=args.packing,
+                              GB_per_CCD=args.GB_per_CCD)
+    print(f"{len(det_lists)} visits, {planner.num_ccds()} CCDs")
+    plan = planner.plan(args.nodes, nfiles_values=args.nfiles,
+                        nproc_values=args.nproc)
+    if args.outfile is not None:
+        plan.to_csv(args.outfile, index=False)
+    print("Recommended settings:")
+    print(planner.recommend(plan).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
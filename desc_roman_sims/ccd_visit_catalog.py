@@ -0,0 +1,156 @@
+"""
+Persistent, columnar catalog of the CCD-visits to simulate.  The
+catalog is stored as a Parquet dataset partitioned by band and visit
+range, with detectors encoded as integer det_num values.
+"""
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs
+
+
+__all__ = ['CcdVisitCatalog', 'det_name_to_num']
+
+
+def det_name_to_num(det_names, camera_name="LsstCam"):
+    """Convert detector names, e.g., 'R22_S11', to det_num values."""
+    from .instrument_cache import get_cached_camera
+    camera = get_cached_camera(camera_name)
+    return np.array([camera[_].getId() for _ in det_names], dtype=np.int16)
+
+
+class CcdVisitCatalog:
+    """
+    Catalog of CCD-visits, i.e., (visit, band, det_num) rows, stored
+    as a hive-partitioned Parquet dataset in a directory.
+    """
+    schema = pa.schema([('visit', pa.int64()),
+                        ('band', pa.string()),
+                        ('det_num', pa.int16()),
+                        ('visit_block', pa.int64())])
+
+    def __init__(self, path, visit_block_size=100000):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory containing the dataset.
+        visit_block_size : int [100000]
+            Range of visit numbers per partition.
+        """
+        self.path = path
+        self.visit_block_size = visit_block_size
+        self._partitioning = ds.partitioning(
+            pa.schema([('band', pa.string()), ('visit_block', pa.int64())]),
+            flavor='hive')
+        self._filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self):
+        return ds.dataset(self.path, schema=self.schema, format='parquet',
+                          partitioning=self._partitioning,
+                          filesystem=self._filesystem)
+
+    def __len__(self):
+        if not os.path.isdir(self.path):
+            return 0
+        return self._dataset().count_rows()
+
+    def append(self, df, camera_name="LsstCam"):
+        """
+        Add CCD-visits to the catalog, skipping any (visit, det_num)
+        pairs that are already present.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Data frame with visit, band, and either det_num or
+            det_name columns, e.g., as produced by
+            overlap_pipeline.consolidate.
+        camera_name : str ['LsstCam']
+            Camera used to convert det_name values to det_num.
+
+        Returns
+        -------
+        int
+            Number of CCD-visits added.
+        """
+        if 'det_num' in df:
+            det_num = df['det_num'].to_numpy(dtype=np.int16)
+        else:
+            det_num = det_name_to_num(df['det_name'], camera_name)
+        new = pd.DataFrame(dict(visit=df['visit'].to_numpy(dtype=np.int64),
+                                band=df['band'].astype(str).to_numpy(),
+                                det_num=det_num))
+        new = new.drop_duplicates(['visit', 'det_num'])
+        if len(self) > 0:
+            existing = self.read(visits=np.unique(new['visit']),
+                                 columns=['visit', 'det_num']).to_pandas()
+            keys = pd.MultiIndex.from_frame(existing)
+            new = new[~pd.MultiIndex.from_frame(new[['visit', 'det_num']])
+                      .isin(keys)]
+        if len(new) == 0:
+            return 0
+        new['visit_block'] = new['visit'] // self.visit_block_size
+        table = pa.Table.from_pandas(new, schema=self.schema,
+                                     preserve_index=False)
+        ds.write_dataset(table, self.path, format='parquet',
+                         partitioning=self._partitioning,
+                         basename_template=f"part-{uuid.uuid4().hex}-{{i}}"
+                         ".parquet",
+                         existing_data_behavior='overwrite_or_ignore')
+        return len(new)
+
+    def read(self, bands=None, visits=None, columns=None):
+        """
+        Return a pyarrow Table of the selected CCD-visits.
+
+        Parameters
+        ----------
+        bands : list [None]
+            Bands to select.  If None, select all bands.
+        visits : list [None]
+            Visits to select.  If None, select all visits.
+        columns : list [None]
+            Columns to read.  If None, read visit, band, and det_num.
+        """
+        if columns is None:
+            columns = ['visit', 'band', 'det_num']
+        if not os.path.isdir(self.path):
+            return pa.Table.from_pylist(
+                [], schema=pa.schema([self.schema.field(_)
+                                      for _ in columns]))
+        condition = None
+        if bands is not None:
+            condition = ds.field('band').isin(list(bands))
+        if visits is not None:
+            visits = np.asarray(visits, dtype=np.int64)
+            blocks = np.unique(visits // self.visit_block_size)
+            visit_condition = (ds.field('visit_block').isin(blocks)
+                               & ds.field('visit').isin(visits))
+            condition = visit_condition if condition is None \
+                else condition & visit_condition
+        return self._dataset().to_table(columns=columns, filter=condition)
+
+    def visits(self, bands=None):
+        """Return the sorted array of visits in the catalog."""
+        table = self.read(bands=bands, columns=['visit'])
+        return np.unique(table['visit'].to_numpy())
+
+    def det_lists(self, visits=None, bands=None):
+        """
+        Return a dict of sorted det_num arrays keyed by visit.
+        """
+        df = self.read(bands=bands, visits=visits,
+                       columns=['visit', 'det_num']).to_pandas()
+        if len(df) == 0:
+            return {}
+        df = df.sort_values(['visit', 'det_num'])
+        visit_values = df['visit'].to_numpy()
+        det_nums = df['det_num'].to_numpy()
+        splits = np.flatnonzero(np.diff(visit_values)) + 1
+        return {int(group[0]): dets for group, dets
+                in zip(np.split(visit_values, splits),
+                       np.split(det_nums, splits))}
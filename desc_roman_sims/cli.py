@@ -0,0 +1,155 @@
+"""
+Command-line tools for submitting the CCD jobs of a campaign and for
+reporting its status.  The package modules, and parsl, are imported
+only after the arguments are parsed, so that `--help` and the status
+queries start quickly.
+"""
+import argparse
+
+
+__all__ = ['submit_main', 'status_main']
+
+
+def _add_visit_args(parser):
+    parser.add_argument('--visits', type=int, nargs='+', default=None,
+                        help='OpSim visit numbers')
+    parser.add_argument('--visit_file', type=str, default=None,
+                        help='text file with a visit number per line')
+    parser.add_argument('--ccd_catalog', type=str, default=None,
+                        help='CcdVisitCatalog directory of the CCD-visits')
+
+
+def _read_visits(args):
+    """
+    Return the CcdVisitCatalog, or the list of visits from the command
+    line and visit file, or None if none were given.
+    """
+    if args.ccd_catalog is not None:
+        from .ccd_visit_catalog import CcdVisitCatalog
+        return CcdVisitCatalog(args.ccd_catalog)
+    visits = list(args.visits or [])
+    if args.visit_file is not None:
+        with open(args.visit_file) as fobj:
+            visits.extend(int(line.split()[0]) for line in fobj
+                          if line.strip() and not line.startswith('#'))
+    return visits or None
+
+
+def submit_main(argv=None):
+    """Submit, or restart, the CCD jobs for a list of visits."""
+    parser = argparse.ArgumentParser(
+        description="Submit the imSim atm PSF and CCD jobs for a set of "
+        "visits.  Use --manifest with --reconcile to restart a campaign.")
+    parser.add_argument('imsim_yaml', type=str, help='imSim config file')
+    _add_visit_args(parser)
+    parser.add_argument('--nfiles', type=int, default=10,
+                        help='CCDs per job')
+    parser.add_argument('--nproc', type=int, default=1,
+                        help='processes per job')
+    parser.add_argument('--GB_per_CCD', type=float, default=6)
+    parser.add_argument('--GB_per_PSF', type=float, default=8)
+    parser.add_argument('--log_dir', type=str, default='logging')
+    parser.add_argument('--keep_atm_psfs', action='store_true',
+                        default=False,
+                        help='do not delete the atm PSF files')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='JobManifest sqlite file')
+    parser.add_argument('--reconcile', action='store_true', default=False,
+                        help='update the manifest from the output files')
+    parser.add_argument('--packing', type=str, default='consecutive',
+                        choices=('consecutive', 'balanced'))
+    parser.add_argument('--max_in_flight', type=int, default=None,
+                        help='maximum number of CCD jobs in flight')
+    parser.add_argument('--telemetry', type=str, default=None,
+                        help='TaskTelemetry sqlite file')
+    parser.add_argument('--node_cache_GB', type=float, default=None,
+                        help='stage atm PSF files in a node-local cache '
+                        'of this size')
+    parser.add_argument('--node_cache_dir', type=str, default=None,
+                        help='node-local cache directory on the workers')
+    parser.add_argument('--memory', type=int, default=182000,
+                        help='WorkQueue worker memory in MB')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--provider', type=str, default='local',
+                        choices=('local', 'slurm', 'pbspro'))
+    parser.add_argument('--nodes_per_block', type=int, default=1)
+    parser.add_argument('--max_blocks', type=int, default=1)
+    parser.add_argument('--warm_workers', type=int, default=0,
+                        help='run the jobs on this many warm workers '
+                        'instead of WorkQueue')
+    parser.add_argument('--no_monitor', action='store_true', default=False)
+    parser.add_argument('--run_dir', type=str, default='runinfo')
+    args = parser.parse_args(argv)
+
+    visits = _read_visits(args)
+    if visits is None:
+        parser.error("No visits given.")
+
+    from .parsl.parsl_config import load_wq_config
+    from .galsim_job_generator import GalSimJobGenerator
+    load_wq_config(memory=args.memory, port=args.port,
+                   monitor=not args.no_monitor, run_dir=args.run_dir,
+                   warm_workers=args.warm_workers,
+                   use_work_queue=args.warm_workers == 0,
+                   provider=args.provider,
+                   nodes_per_block=args.nodes_per_block,
+                   max_blocks=args.max_blocks,
+                   task_memory=args.GB_per_CCD*1024*args.nproc,
+                   node_cache_dir=args.node_cache_dir)
+    executor = 'warm_pool' if args.warm_workers > 0 else 'work_queue'
+    generator = GalSimJobGenerator(
+        args.imsim_yaml, visits, nfiles=args.nfiles, nproc=args.nproc,
+        GB_per_CCD=args.GB_per_CCD, GB_per_PSF=args.GB_per_PSF,
+        log_dir=args.log_dir, clean_up_atm_psfs=not args.keep_atm_psfs,
+        bash_app_executor=executor, manifest=args.manifest,
+        reconcile_manifest=args.reconcile, packing=args.packing,
+        telemetry=args.telemetry, node_cache_GB=args.node_cache_GB)
+    generator.run(max_in_flight=args.max_in_flight)
+    return 0
+
+
+def status_main(argv=None):
+    """Report the progress of a campaign from its job manifest."""
+    parser = argparse.ArgumentParser(
+        description="Report the rendered CCDs and atm PSF files recorded "
+        "in a job manifest.")
+    parser.add_argument('manifest', type=str, help='JobManifest sqlite file')
+    _add_visit_args(parser)
+    parser.add_argument('--ndets', type=int, default=189,
+                        help='CCDs per visit if no CCD catalog is given')
+    parser.add_argument('--telemetry', type=str, default=None,
+                        help='TaskTelemetry sqlite file')
+    args = parser.parse_args(argv)
+
+    from .job_manifest import JobManifest
+    manifest = JobManifest(args.manifest)
+    visits = _read_visits(args)
+    if hasattr(visits, 'det_lists'):
+        expected = {visit: len(dets) for visit, dets
+                    in visits.det_lists().items()}
+    elif visits is not None:
+        expected = {visit: args.ndets for visit in visits}
+    else:
+        expected = None
+    finished = manifest.finished_dets(None if expected is None
+                                      else list(expected))
+    num_ccds = sum(len(_) for _ in finished.values())
+    if expected is None:
+        print(f"{num_ccds} CCDs rendered for {len(finished)} visits")
+    else:
+        done = sum(len(finished.get(visit, ())) >= num
+                   for visit, num in expected.items())
+        started = sum(0 < len(finished.get(visit, ())) < num
+                      for visit, num in expected.items())
+        print(f"visits: {done} done, {started} partial, "
+              f"{len(expected) - done - started} not started "
+              f"of {len(expected)}")
+        print(f"CCDs: {num_ccds} of {sum(expected.values())} rendered")
+    for status, count in sorted(manifest.psf_status_counts().items()):
+        print(f"atm PSF files {status}: {count}")
+    manifest.close()
+
+    if args.telemetry is not None:
+        from .telemetry import TaskTelemetry
+        print(TaskTelemetry(args.telemetry).report())
+    return 0
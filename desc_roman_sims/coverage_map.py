@@ -0,0 +1,230 @@
+"""
+Sky-coverage and depth maps of the CCD footprints of many visits.  The
+footprints are rasterized onto a pixel grid in RA, Dec covering a
+survey region, per band, with array operations, and the maps are
+rendered with a single matplotlib collection.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from .polygon_engine import interior_normals
+from .survey_region_ccds import unit_vectors, CcdRegionFactory
+
+
+__all__ = ['CoverageMap']
+
+
+class CoverageMap:
+    """
+    Per-band maps of the number of visits, the summed exposure time,
+    and the coadded 5-sigma depth on an RA, Dec pixel grid.
+    """
+    def __init__(self, ra0, dec0, lon_size, lat_size, pixel_scale=0.05,
+                 margin=1.):
+        """
+        Parameters
+        ----------
+        ra0, dec0 : float
+            Center of the map in degrees.
+        lon_size, lat_size : float
+            Size of the map in degrees, as for SurveyRegion.
+        pixel_scale : float [0.05]
+            Pixel size in degrees.  The RA pixel size is scaled by
+            1/cos(dec0) so that the pixels are nearly square.
+        margin : float [1.]
+            Margin in degrees added to each side of the map.
+        """
+        self.ra0 = ra0
+        cos_dec = np.cos(np.radians(dec0))
+        self.ra_step = pixel_scale/cos_dec
+        self.dec_step = pixel_scale
+        ra_half = (lon_size/2. + margin)/cos_dec
+        dec_half = lat_size/2. + margin
+        nx = int(np.ceil(2*ra_half/self.ra_step))
+        ny = int(np.ceil(2*dec_half/self.dec_step))
+        self.ra_edges = ra0 - ra_half + self.ra_step*np.arange(nx + 1)
+        self.dec_edges = dec0 - dec_half + self.dec_step*np.arange(ny + 1)
+        ra = (self.ra_edges[:-1] + self.ra_edges[1:])/2.
+        dec = (self.dec_edges[:-1] + self.dec_edges[1:])/2.
+        self._pixel_vectors = unit_vectors(*np.meshgrid(ra, dec))
+        self.shape = (ny, nx)
+        self._maps = {}
+
+    @staticmethod
+    def from_region(region, pixel_scale=0.05, margin=1.):
+        """Create a CoverageMap covering a SurveyRegion."""
+        return CoverageMap((region.ra_min + region.ra_max)/2.,
+                           (region.dec_min + region.dec_max)/2.,
+                           (region.ra_max - region.ra_min)*region.cos_dec,
+                           region.dec_max - region.dec_min,
+                           pixel_scale=pixel_scale, margin=margin)
+
+    @property
+    def bands(self):
+        return sorted(self._maps)
+
+    def _band_maps(self, band):
+        if band not in self._maps:
+            self._maps[band] = dict(counts=np.zeros(self.shape, dtype=int),
+                                    exptime=np.zeros(self.shape),
+                                    flux=np.zeros(self.shape))
+        return self._maps[band]
+
+    def add(self, band, ra, dec, exptime=None, m5=None, chunk_size=10000):
+        """
+        Add CCD footprints to the maps for a band.
+
+        Parameters
+        ----------
+        band : str
+            Band of the observations.
+        ra, dec : np.ndarray
+            Arrays of shape (n_ccd_visits, n_vertices) of the footprint
+            vertices in degrees, in order around each footprint.
+        exptime : np.ndarray [None]
+            Exposure time in seconds of each CCD-visit.
+        m5 : np.ndarray [None]
+            5-sigma limiting magnitude of each CCD-visit, e.g., the
+            OpSim fiveSigmaDepth values, for the coadded depth map.
+        chunk_size : int [10000]
+            Number of footprints rasterized per array operation.
+        """
+        maps = self._band_maps(band)
+        ra = (np.asarray(ra) - self.ra0 + 180.) % 360. - 180. + self.ra0
+        dec = np.asarray(dec)
+        ny, nx = self.shape
+        for start in range(0, len(ra), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            normals = interior_normals(unit_vectors(ra[chunk], dec[chunk]))
+            # Pixel index ranges of the footprint bounding boxes.
+            i0, i1 = (np.floor((_(ra[chunk], axis=1) - self.ra_edges[0])
+                               / self.ra_step).astype(int)
+                      for _ in (np.min, np.max))
+            j0, j1 = (np.floor((_(dec[chunk], axis=1) - self.dec_edges[0])
+                               / self.dec_step).astype(int)
+                      for _ in (np.min, np.max))
+            if len(i0) == 0:
+                continue
+            ii = i0[:, None, None] + np.arange(np.max(i1 - i0) + 1)
+            jj = j0[:, None, None] + np.arange(np.max(j1 - j0) + 1)[:, None]
+            ii, jj = np.broadcast_arrays(ii, jj)
+            valid = ((ii >= 0) & (ii < nx) & (jj >= 0) & (jj < ny)
+                     & (ii <= i1[:, None, None]) & (jj <= j1[:, None, None]))
+            pixels = self._pixel_vectors[np.clip(jj, 0, ny - 1),
+                                         np.clip(ii, 0, nx - 1)]
+            inside = valid & np.all(np.einsum('nhwj,nkj->nhwk', pixels,
+                                              normals) >= 0, axis=-1)
+            index = (jj[inside], ii[inside])
+            np.add.at(maps['counts'], index, 1)
+            rows = np.nonzero(inside)[0]
+            if exptime is not None:
+                np.add.at(maps['exptime'], index,
+                          np.asarray(exptime)[chunk][rows])
+            if m5 is not None:
+                np.add.at(maps['flux'], index,
+                          10**(0.8*np.asarray(m5)[chunk][rows]))
+
+    def add_ccd_visits(self, ccd_visits, opsim_data, template=None):
+        """
+        Add the CCD-visits in a data frame with visit, band, and
+        det_name columns, e.g., from OverlapPipeline, using the
+        pointings in an OpSimData object.  The exposure times and
+        depths are taken from the visitExposureTime and fiveSigmaDepth
+        columns of the OpSim data.  These are not loaded by default,
+        so a warning is issued if they are missing, in which case the
+        corresponding maps are not filled.
+
+        If focal plane templates are given, the footprints of all of
+        the visits in each band are computed with array operations;
+        otherwise a CcdRegionFactory is used for each visit.
+        """
+        df = opsim_data.df.set_index('observationId')
+        missing = [_ for _ in ('visitExposureTime', 'fiveSigmaDepth')
+                   if _ not in df]
+        if missing:
+            warnings.warn(f"The OpSim data lack the {missing} columns, so "
+                          "the corresponding exptime and depth maps will "
+                          "be empty.  Include them in the columns loaded "
+                          "by OpSimData.", stacklevel=2)
+        for band, group in ccd_visits.groupby('band'):
+            visits = np.unique(group['visit'])
+            if template is not None:
+                obs = opsim_data.obs_infos(visits)
+                det_names, ra, dec = template.corners(
+                    obs.mjd, obs.ra, obs.dec, band, obs.rottelpos)
+                visit_index = pd.Index(visits).get_indexer(group['visit'])
+                det_index = pd.Index(det_names).get_indexer(
+                    group['det_name'])
+                ra, dec = (ra[visit_index, det_index],
+                           dec[visit_index, det_index])
+            else:
+                ra, dec = [], []
+                for visit, rows in group.groupby('visit'):
+                    factory = CcdRegionFactory(*opsim_data.obs_info(visit))
+                    _, visit_ra, visit_dec \
+                        = factory.ccd_corners(list(rows['det_name']))
+                    ra.append(visit_ra)
+                    dec.append(visit_dec)
+                group = group.sort_values('visit', kind='stable')
+                ra, dec = np.concatenate(ra), np.concatenate(dec)
+            columns = {}
+            for column in ('visitExposureTime', 'fiveSigmaDepth'):
+                if column in df:
+                    columns[column] \
+                        = df.loc[group['visit'], column].to_numpy()
+            self.add(band, ra, dec,
+                     exptime=columns.get('visitExposureTime'),
+                     m5=columns.get('fiveSigmaDepth'))
+
+    def counts(self, band=None):
+        """Visit counts per pixel for a band, or all bands if None."""
+        bands = self.bands if band is None else [band]
+        return sum((self._maps[_]['counts'] for _ in bands),
+                   np.zeros(self.shape, dtype=int))
+
+    def exptime(self, band=None):
+        """Summed exposure time per pixel in seconds."""
+        bands = self.bands if band is None else [band]
+        return sum((self._maps[_]['exptime'] for _ in bands),
+                   np.zeros(self.shape))
+
+    def depth(self, band):
+        """
+        Coadded 5-sigma depth per pixel, 1.25*log10(sum(10**(0.8*m5))),
+        or NaN for pixels without m5 values.  Depths in different bands
+        cannot be combined, so band must be one of the mapped bands.
+        """
+        if band not in self._maps:
+            raise ValueError(f"The depth map needs one of the bands "
+                             f"{self.bands}, not {band!r}.")
+        flux = self._maps[band]['flux']
+        with np.errstate(divide='ignore'):
+            return np.where(flux > 0, 1.25*np.log10(flux), np.nan)
+
+    def plot(self, ax, band=None, quantity='counts', region=None,
+             **kwargs):
+        """
+        Render a map with a single pcolormesh call and return the
+        QuadMesh, e.g., for a colorbar.  quantity is 'counts',
+        'exptime', or 'depth', and the region boundary is drawn if a
+        SurveyRegion is given.  The counts and exposure times are summed
+        over all bands if band is None, while the depth map needs a
+        band.
+        """
+        if quantity == 'depth':
+            values = self.depth(band)
+        else:
+            values = getattr(self, quantity)(band)
+        if quantity == 'counts':
+            values = np.ma.masked_equal(values, 0)
+        mesh = ax.pcolormesh(self.ra_edges, self.dec_edges, values,
+                             shading='flat', **kwargs)
+        if region is not None:
+            ra = (region.ra_min, region.ra_max, region.ra_max,
+                  region.ra_min, region.ra_min)
+            dec = (region.dec_min, region.dec_min, region.dec_max,
+                   region.dec_max, region.dec_min)
+            ax.plot(ra, dec, color='red')
+        ax.set_xlabel('RA (deg)')
+        ax.set_ylabel('Dec (deg)')
+        return mesh
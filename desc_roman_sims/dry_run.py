@@ -0,0 +1,176 @@
+"""
+Simulated PSF and CCD tasks for dry runs of GalSimJobGenerator.  Each
+task sleeps for its cost-model duration, scaled by a time factor, so
+that scheduling settings such as nfiles, nproc, GB_per_CCD, and the
+PSF clean-up policy can be evaluated on a local executor without
+running galsim.
+"""
+import time
+import threading
+import numpy as np
+from .job_packing import CcdCostModel, _process_makespan
+
+
+__all__ = ['DryRun', 'simulate_psf', 'simulate_ccds']
+
+
+def _write_start_time(start_file):
+    if start_file is not None:
+        with open(start_file, 'w') as fobj:
+            fobj.write(f"{time.time()}\n")
+
+
+def simulate_psf(imsim_yaml, visit, config_hash, duration=0., psf_file=None,
+                 time_command=None, inputs=(), stderr=None, stdout=None,
+                 start_file=None):
+    """
+    python_app function that simulates the atm psf job for a visit,
+    writing an empty psf file so that the clean-up tasks can run.
+    Returns the start and end times.
+    """
+    _write_start_time(start_file)
+    start = time.time()
+    time.sleep(duration)
+    if psf_file is not None:
+        open(psf_file, 'w').close()
+    return start, time.time()
+
+
+def simulate_ccds(imsim_yaml, visit, det_nums, config_hash, duration=0.,
+                  nproc=1, verbosity=2, inputs=(), stderr=None, stdout=None,
+                  start_file=None):
+    """
+    python_app function that simulates rendering a list of CCDs.
+    Returns the start and end times.
+    """
+    _write_start_time(start_file)
+    start = time.time()
+    time.sleep(duration)
+    return start, time.time()
+
+
+class DryRun:
+    """
+    Durations of the simulated tasks and the bookkeeping of their
+    start and end times, memory requests, and atm psf files.
+    """
+    def __init__(self, cost_model=None, psf_wall_time=300.,
+                 psf_size_GB=1., time_scale=1e-3, slots=None,
+                 use_existing_psf_files=False):
+        """
+        Parameters
+        ----------
+        cost_model : CcdCostModel [None]
+            Cost model for the CCD wall times.  If None, a model with
+            the default values is used.
+        psf_wall_time : float [300.]
+            Wall time in seconds of each atm psf job.
+        psf_size_GB : float [1.]
+            Disk size of each atm psf file in GB.
+        time_scale : float [1e-3]
+            Ratio of the simulated task sleep times to the modeled
+            wall times.  The reported times are in modeled seconds.
+        slots : int [None]
+            Number of task slots of the executor, e.g., the max_workers
+            passed to parsl_config.load_dry_run_config.  The idle time
+            and utilization are only reported if this is given.
+        use_existing_psf_files : bool [False]
+            If True, visits with atm psf files in the real atm_psf
+            directory, or recorded in the manifest, do not get
+            simulated psf jobs, as in a real run of the same campaign.
+            If False, a psf job is simulated for every visit, so that
+            the results do not depend on the files already on disk.
+        """
+        self.cost_model = CcdCostModel() if cost_model is None \
+            else cost_model
+        self.psf_wall_time = psf_wall_time
+        self.psf_size_GB = psf_size_GB
+        self.time_scale = time_scale
+        self.slots = slots
+        self.use_existing_psf_files = use_existing_psf_files
+        self._lock = threading.Lock()
+        self.tasks = []
+        self.psf_events = []
+        self._psf_files = set()
+
+    def ccd_duration(self, visit, det_nums, nproc):
+        """Sleep time for a CCD job run on nproc processes."""
+        wall_times = self.cost_model.estimate(visit, list(det_nums))[0]
+        return self.time_scale*_process_makespan(wall_times, nproc)
+
+    def psf_duration(self, visit):
+        """Sleep time for an atm psf job."""
+        return self.time_scale*self.psf_wall_time
+
+    def watch(self, future, job_type, visit, memory_MB):
+        """Record the times of the task when its future is done."""
+        def done(future):
+            if future.exception() is not None:
+                return
+            start, end = future.result()
+            with self._lock:
+                self.tasks.append((job_type, visit, start, end, memory_MB))
+                if job_type == 'psf':
+                    self.psf_events.append((end, 1))
+                    self._psf_files.add(visit)
+        future.add_done_callback(done)
+
+    def psf_removed(self, visit, future=None):
+        """
+        Done callback for the removal of the atm psf file of visit.
+        Only the removal of a file written by a simulated psf job is
+        recorded.
+        """
+        with self._lock:
+            if visit in self._psf_files:
+                self._psf_files.remove(visit)
+                self.psf_events.append((time.time(), -1))
+
+    @staticmethod
+    def _peak(events):
+        """Peak of the running sum of (time, delta) events."""
+        if not events:
+            return 0
+        events = sorted(events, key=lambda _: (_[0], _[1]))
+        return float(max(np.cumsum([_[1] for _ in events])))
+
+    def summary(self):
+        """
+        Return a dict with the makespan, busy time, idle time, peak
+        number of running tasks, peak memory requested by the running
+        tasks in MB, and peak atm psf disk usage in GB.  Times are in
+        modeled seconds.  The idle time and utilization are included
+        only if the number of slots was given.
+        """
+        with self._lock:
+            tasks = list(self.tasks)
+            psf_events = list(self.psf_events)
+        if not tasks:
+            return {}
+        starts = np.array([_[2] for _ in tasks])
+        ends = np.array([_[3] for _ in tasks])
+        makespan = (ends.max() - starts.min())/self.time_scale
+        busy = np.sum(ends - starts)/self.time_scale
+        task_events = ([(_[2], 1) for _ in tasks]
+                       + [(_[3], -1) for _ in tasks])
+        memory_events = ([(_[2], _[4]) for _ in tasks]
+                         + [(_[3], -_[4]) for _ in tasks])
+        summary = dict(num_psf_tasks=sum(_[0] == 'psf' for _ in tasks),
+                       num_ccd_tasks=sum(_[0] == 'ccd' for _ in tasks),
+                       makespan=makespan, busy_time=busy,
+                       peak_running_tasks=self._peak(task_events),
+                       peak_memory_MB=self._peak(memory_events),
+                       peak_psf_disk_GB=(self.psf_size_GB
+                                         * self._peak(psf_events)))
+        if self.slots is not None:
+            summary['idle_time'] = self.slots*makespan - busy
+            summary['utilization'] = busy/(self.slots*makespan)
+        return summary
+
+    def report(self):
+        """Return a text report of the summary."""
+        summary = self.summary()
+        lines = ["Dry run summary:"]
+        for key, value in summary.items():
+            lines.append(f"  {key:20s} {value:12.6g}")
+        return "\n".join(lines)
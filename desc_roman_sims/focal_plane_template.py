@@ -0,0 +1,312 @@
+"""
+Focal plane templates for fast, approximate computation of CCD
+footprints on the sky.  The CCD corner offsets in the tangent plane
+are precomputed with the exact Batoid WCS on a grid of rotTelPos
+values for each band.  For a given visit, the offsets for the nearest
+grid point are rotated and projected onto the boresight.
+"""
+import numpy as np
+from .survey_region_ccds import CcdRegionFactory, unit_vectors
+
+
+__all__ = ['FocalPlaneTemplate', 'FocalPlaneTemplates', 'parallactic_angle',
+           'airmass']
+
+
+RUBIN_LATITUDE = -30.2446  # degrees
+RUBIN_LONGITUDE = -70.7494  # degrees
+
+
+def local_sidereal_time(mjd, longitude=RUBIN_LONGITUDE):
+    """Local mean sidereal time in degrees."""
+    return (280.46061837 + 360.98564736629*(np.asarray(mjd) - 51544.5)
+            + longitude) % 360.
+
+
+def parallactic_angle(mjd, ra, dec, latitude=RUBIN_LATITUDE,
+                      longitude=RUBIN_LONGITUDE):
+    """Parallactic angle in degrees of the pointing(s) at the given MJD(s)."""
+    ha = np.radians(local_sidereal_time(mjd, longitude) - np.asarray(ra))
+    dec = np.radians(dec)
+    lat = np.radians(latitude)
+    return np.degrees(np.arctan2(np.sin(ha), np.tan(lat)*np.cos(dec)
+                                 - np.sin(dec)*np.cos(ha)))
+
+
+def airmass(mjd, ra, dec, latitude=RUBIN_LATITUDE,
+            longitude=RUBIN_LONGITUDE):
+    """Plane-parallel airmass, sec(z), of the pointing(s) at the MJD(s)."""
+    ha = np.radians(local_sidereal_time(mjd, longitude) - np.asarray(ra))
+    dec = np.radians(dec)
+    lat = np.radians(latitude)
+    return 1./(np.sin(lat)*np.sin(dec) + np.cos(lat)*np.cos(dec)*np.cos(ha))
+
+
+def _wrap(angle):
+    """Wrap angles in degrees to [-180, 180)."""
+    return (np.asarray(angle) + 180.) % 360. - 180.
+
+
+def tangent_plane_offsets(ra, dec, ra0, dec0):
+    """Gnomonic projection, in degrees, of (ra, dec) about (ra0, dec0)."""
+    ra, dec, ra0, dec0 = (np.radians(_) for _ in (ra, dec, ra0, dec0))
+    dra = ra - ra0
+    cos_c = (np.sin(dec0)*np.sin(dec) + np.cos(dec0)*np.cos(dec)*np.cos(dra))
+    xi = np.cos(dec)*np.sin(dra)/cos_c
+    eta = (np.cos(dec0)*np.sin(dec)
+           - np.sin(dec0)*np.cos(dec)*np.cos(dra))/cos_c
+    return np.degrees(xi), np.degrees(eta)
+
+
+def deproject(xi, eta, ra0, dec0):
+    """Inverse gnomonic projection of tangent plane offsets in degrees."""
+    xi, eta, ra0, dec0 = (np.radians(_) for _ in (xi, eta, ra0, dec0))
+    denom = np.cos(dec0) - eta*np.sin(dec0)
+    ra = ra0 + np.arctan2(xi, denom)
+    dec = np.arctan2(np.sin(dec0) + eta*np.cos(dec0), np.hypot(xi, denom))
+    return np.degrees(ra) % 360., np.degrees(dec)
+
+
+def rotation_angle(xi0, eta0, xi1, eta1):
+    """
+    Least-squares rotation angle in degrees that maps the offsets
+    (xi0, eta0) onto (xi1, eta1).
+    """
+    return np.degrees(np.arctan2(np.sum(xi0*eta1 - eta0*xi1),
+                                 np.sum(xi0*xi1 + eta0*eta1)))
+
+
+def angular_separation(ra0, dec0, ra1, dec1):
+    """Angular separation in arcsec of points given in degrees."""
+    chord = np.linalg.norm(unit_vectors(ra0, dec0) - unit_vectors(ra1, dec1),
+                           axis=-1)
+    return np.degrees(2.*np.arcsin(chord/2.))*3600.
+
+
+class FocalPlaneTemplate:
+    """
+    Template of CCD corner offsets in the tangent plane for a single
+    band, computed at a reference pointing on the meridian for a grid
+    of rotTelPos values.
+
+    The template neglects the change with airmass of the differential
+    refraction across the field.  For a refraction of about 58 tan(z)
+    arcsec, that change is roughly 1.8 (sec^2(z) - sec^2(z_ref)) arcsec
+    at the edge of the field, i.e., about 0.7 arcsec at airmass 1.25
+    and 2 arcsec at airmass 1.5, relative to the reference pointing.
+    The template is therefore only trusted up to `max_airmass`, the
+    largest airmass of the pointings at which it has been validated,
+    which is MAX_DEFAULT_AIRMASS or less for the default validation
+    pointings.  Pass validation_pointings to check it at larger
+    airmasses.
+    """
+    # Largest airmass of the default validation pointings.
+    MAX_DEFAULT_AIRMASS = 1.25
+
+    def __init__(self, band, rottelpos_grid=None, ref_mjd=60800.,
+                 ref_dec=-40., camera_name="LsstCam", tolerance=5.,
+                 validation_pointings=None):
+        """
+        Parameters
+        ----------
+        band : str
+            Band of observation, e.g., 'u', 'g', 'r', 'i', 'z', 'y'.
+        rottelpos_grid : sequence [None]
+            Grid of rotTelPos values in degrees.  If None, then use
+            5 degree steps from -90 to 90 degrees.
+        ref_mjd : float [60800.]
+            MJD of the reference pointings.
+        ref_dec : float [-40.]
+            Dec in degrees of the reference pointings.
+        camera_name : str ['LsstCam']
+            Camera class name.
+        tolerance : float [5.]
+            Maximum allowed deviation, in arcsec, of the template
+            corners from the exact WCS values.
+        validation_pointings : sequence [None]
+            (mjd, ra, dec, rottelpos) tuples of the pointings at which
+            the template is checked against the exact WCS after it is
+            built.  If None, use four pointings with hour angles from
+            -30 to 30 degrees, Decs from -60 to -15 degrees, and
+            airmasses below MAX_DEFAULT_AIRMASS, and with rotTelPos
+            values midway between grid points, where the interpolation
+            error is largest.
+        """
+        if rottelpos_grid is None:
+            rottelpos_grid = np.arange(-90., 91., 5.)
+        self.band = band
+        self.rottelpos_grid = np.array(sorted(rottelpos_grid), dtype=float)
+        self.camera_name = camera_name
+        self.tolerance = tolerance
+        self.max_deviation = 0.
+
+        self.ref_mjd = ref_mjd
+        self.ref_ra = float(local_sidereal_time(ref_mjd))
+        self.ref_dec = ref_dec
+        self.ref_q = float(parallactic_angle(ref_mjd, self.ref_ra, ref_dec))
+        self.max_airmass = float(airmass(ref_mjd, self.ref_ra, ref_dec))
+
+        xi, eta = [], []
+        for rottelpos in self.rottelpos_grid:
+            offsets = self._exact_offsets(self.ref_ra, rottelpos)
+            xi.append(offsets[0])
+            eta.append(offsets[1])
+        self.xi = np.array(xi)
+        self.eta = np.array(eta)
+        angles = [rotation_angle(self.xi[0], self.eta[0], x, e)
+                  for x, e in zip(self.xi, self.eta)]
+        self.angles = np.degrees(np.unwrap(np.radians(angles)))
+
+        # Determine the sense of the sky rotation with parallactic
+        # angle using an exact calculation at a second pointing two
+        # hours west of the meridian.
+        cal_ra = (self.ref_ra - 30.) % 360.
+        dq = float(_wrap(parallactic_angle(ref_mjd, cal_ra, ref_dec)
+                         - self.ref_q))
+        if abs(dq) < 1.:
+            raise ValueError("Reference pointings have nearly equal "
+                             "parallactic angles; choose a different ref_dec.")
+        cal_xi, cal_eta = self._exact_offsets(cal_ra, self.rottelpos_grid[0])
+        measured = rotation_angle(self.xi[0], self.eta[0], cal_xi, cal_eta)
+        self.q_sign = np.sign(measured*dq)
+        ra, dec = deproject(cal_xi, cal_eta, cal_ra, ref_dec)
+        self._update_max_deviation(
+            self.corners(ref_mjd, cal_ra, ref_dec, self.rottelpos_grid[0]),
+            (ra, dec))
+        self.max_airmass = max(self.max_airmass,
+                               float(airmass(ref_mjd, cal_ra, ref_dec)))
+
+        # Check the tolerance away from the calibration pointings.
+        if validation_pointings is None:
+            validation_pointings = self._default_validation_pointings()
+        for pointing in validation_pointings:
+            self.validate(*pointing)
+
+    def _default_validation_pointings(self):
+        midpoints = (self.rottelpos_grid[:-1] + self.rottelpos_grid[1:])/2.
+        if len(midpoints) == 0:
+            midpoints = self.rottelpos_grid
+        rottelpos = midpoints[np.linspace(0, len(midpoints) - 1, 4)
+                              .astype(int)]
+        hour_angles = (-30., -10., 10., 30.)
+        decs = (-60., -15., -55., -25.)
+        return [(self.ref_mjd, (self.ref_ra - ha) % 360., dec, rot)
+                for ha, dec, rot in zip(hour_angles, decs, rottelpos)]
+
+    def _exact_offsets(self, ra, rottelpos):
+        factory = CcdRegionFactory(self.ref_mjd, ra, self.ref_dec, self.band,
+                                   rottelpos, camera_name=self.camera_name)
+        self.det_names, corner_ra, corner_dec = factory.ccd_corners()
+        return tangent_plane_offsets(corner_ra, corner_dec, ra, self.ref_dec)
+
+    def corners(self, mjd, ra, dec, rottelpos):
+        """
+        Return the RA, Dec values in degrees of the CCD corners for
+        the specified pointing(s).  For scalar inputs, the arrays have
+        shape (n_dets, 4); for array inputs of length n_visits, the
+        shape is (n_visits, n_dets, 4).
+        """
+        mjd, ra, dec, rottelpos = np.broadcast_arrays(mjd, ra, dec, rottelpos)
+        index = np.abs(rottelpos[..., None]
+                       - self.rottelpos_grid).argmin(axis=-1)
+        theta = (np.interp(rottelpos, self.rottelpos_grid, self.angles)
+                 - self.angles[index]
+                 + self.q_sign*_wrap(parallactic_angle(mjd, ra, dec)
+                                     - self.ref_q))
+        theta = np.radians(theta)[..., None, None]
+        xi, eta = self.xi[index], self.eta[index]
+        xi, eta = (xi*np.cos(theta) - eta*np.sin(theta),
+                   xi*np.sin(theta) + eta*np.cos(theta))
+        return deproject(xi, eta, ra[..., None, None], dec[..., None, None])
+
+    def _update_max_deviation(self, template_corners, exact_corners):
+        deviation = np.max(angular_separation(*template_corners,
+                                              *exact_corners))
+        self.max_deviation = max(self.max_deviation, deviation)
+        if self.max_deviation > self.tolerance:
+            raise ValueError(f"Focal plane template deviation for band "
+                             f"{self.band}, {self.max_deviation:.2f} arcsec, "
+                             f"exceeds the tolerance of {self.tolerance} "
+                             "arcsec.")
+        return deviation
+
+    def validate(self, mjd, ra, dec, rottelpos):
+        """
+        Compare the template corners with the exact WCS values for
+        the specified pointing, update `max_deviation` and
+        `max_airmass`, and return the maximum deviation in arcsec for
+        this pointing.  A ValueError is raised if the maximum
+        deviation exceeds the tolerance.
+        """
+        _, corner_ra, corner_dec = self.exact_corners(mjd, ra, dec, rottelpos)
+        deviation = self._update_max_deviation(
+            self.corners(mjd, ra, dec, rottelpos), (corner_ra, corner_dec))
+        self.max_airmass = max(self.max_airmass, float(airmass(mjd, ra, dec)))
+        return deviation
+
+    def exact_corners(self, mjd, ra, dec, rottelpos):
+        """
+        Return the detector names and the RA, Dec values in degrees of
+        the CCD corners for the specified pointing computed with the
+        exact WCS.
+        """
+        factory = CcdRegionFactory(mjd, ra, dec, self.band, rottelpos,
+                                   camera_name=self.camera_name)
+        return factory.ccd_corners(self.det_names)
+
+
+class FocalPlaneTemplates:
+    """
+    Collection of FocalPlaneTemplate objects, one per band, which are
+    created on demand.  Instances can be passed as the `template`
+    argument of CcdRegionFactory.
+    """
+    def __init__(self, **template_kwargs):
+        """
+        Parameters
+        ----------
+        template_kwargs : dict
+            Keyword arguments passed to the FocalPlaneTemplate
+            constructor.
+        """
+        self.template_kwargs = template_kwargs
+        self._templates = {}
+
+    def __getitem__(self, band):
+        if band not in self._templates:
+            self._templates[band] \
+                = FocalPlaneTemplate(band, **self.template_kwargs)
+        return self._templates[band]
+
+    @property
+    def max_deviation(self):
+        """Maximum deviation in arcsec from the exact WCS over all bands."""
+        return max([_.max_deviation for _ in self._templates.values()],
+                   default=0.)
+
+    def corners(self, mjd, ra, dec, band, rottelpos):
+        """
+        Return the detector names and the RA, Dec values in degrees of
+        the CCD corners for the specified pointing(s).  The corners
+        for pointings with airmass above the `max_airmass` of the
+        template for the band are computed with the exact WCS.
+        """
+        template = self[band]
+        corner_ra, corner_dec = template.corners(mjd, ra, dec, rottelpos)
+        mjd, ra, dec, rottelpos = np.broadcast_arrays(mjd, ra, dec, rottelpos)
+        exact = airmass(mjd, ra, dec) > template.max_airmass
+        for index in np.ndindex(exact.shape):
+            if exact[index]:
+                _, corner_ra[index], corner_dec[index] \
+                    = template.exact_corners(mjd[index], ra[index],
+                                             dec[index], rottelpos[index])
+        return template.det_names, corner_ra, corner_dec
+
+    def validate(self, obs_infos):
+        """
+        Compare the template and exact corners for a sequence of
+        ObsInfo tuples, returning the deviations in arcsec.
+        """
+        return np.array([self[obs_info.band].validate(
+            obs_info.mjd, obs_info.ra, obs_info.dec, obs_info.rottelpos)
+                         for obs_info in obs_infos])
@@ -1,33 +1,138 @@
 import os
+import re
 import glob
+import hashlib
+import math
+import functools
+import threading
 from collections import defaultdict
-import parsl
-from galsim.main import ReadConfig
-
-
-__all__ = ['GalSimJobGenerator']
+from concurrent.futures import Future
+from .ccd_visit_catalog import CcdVisitCatalog
+from .job_manifest import JobManifest, det_num_from_filename, \
+    job_rendered_dets
+from .job_packing import CcdCostModel, consecutive_jobs, balanced_jobs, \
+    read_process_info
+from .resource_tracker import ResourceTracker, EscalatingFuture
+from .psf_scheduler import PsfScheduler
+from .galsim_worker import WARM_WORKER_EXECUTORS, generate_psf, render_ccds
+from .telemetry import TaskTelemetry
+from .dry_run import simulate_psf, simulate_ccds
+from .sky_ordering import order_visits
+
+
+__all__ = ['GalSimJobGenerator', 'config_hash']
+
+
+# Keyword arguments of the app functions that do not affect the
+# outputs and so are excluded from the memoization hash.  Parsl deletes
+# each of these from the kwargs of a call before hashing, so they must
+# be passed as keyword arguments in every call of the app.  The config
+# path is excluded since the config contents enter the hash through
+# config_hash.
+_IGNORE_FOR_CACHE = {'psf': ['imsim_yaml', 'stderr', 'stdout', 'start_file',
+                             'time_command'],
+                     'ccd': ['imsim_yaml', 'stderr', 'stdout', 'start_file',
+                             'nproc', 'verbosity']}
+
+
+def config_hash(imsim_yaml):
+    """Return the sha256 hex digest of the imsim config file contents."""
+    with open(imsim_yaml, 'rb') as fobj:
+        return hashlib.sha256(fobj.read()).hexdigest()
+
+
+def _start_command(start_file):
+    """Shell command to write the task start time for the telemetry."""
+    return "" if start_file is None else f"date +%s.%N > {start_file}; "
+
+
+def _stage_commands(staged_inputs, node_cache_GB):
+    """
+    Shell commands to copy the staged inputs, given as (config_key,
+    path pattern) pairs, to the node-local cache, and the galsim
+    command-line overrides of the config entries with the local paths.
+    """
+    prefix = ""
+    overrides = ""
+    for i, (key, pattern) in enumerate(staged_inputs):
+        prefix += (f"staged_{i}=$(python -m desc_roman_sims.node_cache "
+                   f"stage '{pattern}' --max_GB {node_cache_GB}) && ")
+        overrides += f" {key}=$staged_{i}"
+    return prefix, overrides
+
+
+def galsim_psf_command(imsim_yaml, visit, config_hash, time_command="time",
+                       inputs=(), stderr=None, stdout=None, start_file=None,
+                       parsl_resource_specification={}):
+    """bash_app function to generate the atm psf file for a visit."""
+    return (_start_command(start_file) +
+            f"{time_command} galsim -v 2 {imsim_yaml} "
+            f"output.nfiles=0 input.opsim_data.visit={visit}")
+
+
+def galsim_ccd_command(imsim_yaml, visit, det_nums, config_hash, nproc=1,
+                       verbosity=2, inputs=(), stderr=None, stdout=None,
+                       start_file=None, staged_inputs=(), node_cache_GB=50.,
+                       parsl_resource_specification={}):
+    """bash_app function to render a list of CCDs for a visit."""
+    my_det_list = "[" + ", ".join([str(_) for _ in det_nums]) + "]"
+    stage_prefix, overrides = _stage_commands(staged_inputs, node_cache_GB)
+    return (_start_command(start_file) + stage_prefix +
+            f"galsim -v {verbosity} {imsim_yaml} "
+            f"input.opsim_data.visit={visit} "
+            f"output.nfiles={len(det_nums)} "
+            f"output.nproc={nproc} "
+            "output.det_num='{type: List, items: " + my_det_list + "}'"
+            + overrides)
 
 
 class GalSimJobGenerator:
     def __init__(self, imsim_yaml, visits, nfiles=10, nproc=1,
                  default_det_list=None, GB_per_CCD=6, GB_per_PSF=8,
                  verbosity=2, log_dir="logging", clean_up_atm_psfs=True,
-                 bash_app_executor='work_queue'):
+                 bash_app_executor='work_queue', manifest=None,
+                 reconcile_manifest=False, packing='consecutive',
+                 cost_model=None, adaptive_memory=False, max_GB_per_job=None,
+                 time_command="time", psf_lookahead=None, max_psf_jobs=None,
+                 max_psf_files=None, telemetry=None, dry_run=None,
+                 sky_order=None, node_cache_GB=None,
+                 stage_config_files=None):
 
         # The following line ensures that all processes associated with
         # a galsim instance are occupied to start.
         assert nfiles >= nproc
 
         self.imsim_yaml = imsim_yaml
+        # parsl and galsim are imported here rather than at module load
+        # to keep the start-up time of the command-line tools short.
+        import parsl
+        from galsim.main import ReadConfig
         config = ReadConfig(imsim_yaml)[0]
 
         self.output_dir_format = config['output.dir']['format']
 
-        self.atm_psf_dir \
-            = os.path.dirname(config['input.atm_psf.save_file']['format'])
+        psf_format = config['input.atm_psf.save_file']['format']
+        self.atm_psf_dir = os.path.dirname(psf_format)
+        self._psf_file_format = os.path.basename(psf_format)
         os.makedirs(self.atm_psf_dir, exist_ok=True)
         self.clean_up_atm_psfs = clean_up_atm_psfs
 
+        if isinstance(visits, CcdVisitCatalog):
+            # Render only the CCDs in the catalog for each visit.
+            self._catalog_det_lists = visits.det_lists()
+            self._visit_bands = dict(
+                visits.read(columns=['visit', 'band']).to_pandas()
+                .drop_duplicates('visit').itertuples(index=False))
+            visits = list(self._catalog_det_lists)
+        else:
+            self._catalog_det_lists = None
+            self._visit_bands = {}
+        # Process the visits in sky-locality order, using the pointings
+        # from an OpSimData object, so that consecutive jobs reuse the
+        # same sky catalog files.
+        self.catalog_reuse = None
+        if sky_order is not None:
+            visits, self.catalog_reuse = order_visits(visits, sky_order)
         self.visits = visits
         self.nfiles = nfiles
         self.nproc = nproc
@@ -36,165 +141,607 @@ class GalSimJobGenerator:
             self.target_dets = set(range(189))
         else:
             self.target_dets = set(default_det_list)
+
+        # Use a JobManifest, if provided, to keep track of finished
+        # CCDs and atm_psf files instead of globbing the output
+        # directories.
+        if isinstance(manifest, str):
+            manifest = JobManifest(manifest)
+        self.manifest = manifest
+        if self.manifest is not None and reconcile_manifest:
+            self.manifest.reconcile(self.visits, self.output_dir_format,
+                                    self.atm_psf_dir)
         self._assemble_det_lists()
 
+        # Divide the det lists into jobs, either in consecutive chunks
+        # of nfiles CCDs, or packed to balance the predicted wall times
+        # using the per-CCD costs from the process_info files.
+        if packing not in ('consecutive', 'balanced'):
+            raise ValueError(f"Unknown packing mode: {packing}")
+        self.packing = packing
+        if packing == 'balanced' and cost_model is None:
+            cost_model = CcdCostModel(default_memory_GB=GB_per_CCD)
+            cost_model.scan_output_dirs(self.visits, self.output_dir_format)
+        self.cost_model = cost_model
+        self._assemble_job_lists()
+
         self.GB_per_CCD = GB_per_CCD
         self.GB_per_PSF = GB_per_PSF
+        # Track the observed peak memory of the jobs to set the memory
+        # requests and resubmit jobs that fail on memory.  Use
+        # time_command="/usr/bin/time -v" to measure the PSF job memory.
+        self.resource_tracker = None
+        if adaptive_memory:
+            # The memory requests are only passed to the work_queue
+            # executor, so resubmissions elsewhere would get the same
+            # resources.
+            if bash_app_executor != "work_queue":
+                raise ValueError("Adaptive memory requests require the "
+                                 "work_queue executor.")
+            cap_MB = None if max_GB_per_job is None else max_GB_per_job*1024
+            self.resource_tracker = ResourceTracker(cap_MB=cap_MB)
+        self.time_command = time_command
+
+        # Schedule the PSF jobs ahead of the CCD queue, subject to the
+        # lookahead window and caps on the running PSF jobs and on the
+        # PSF files in flight.
+        self.psf_scheduler = None
+        if (psf_lookahead, max_psf_jobs, max_psf_files) != (None,)*3:
+            if max_psf_files is not None and not clean_up_atm_psfs:
+                raise ValueError("max_psf_files requires clean_up_atm_psfs")
+            self.psf_scheduler = PsfScheduler(
+                self._submit_psf_job,
+                [_ for _ in self.visits if self._job_lists[_]],
+                lookahead=psf_lookahead, max_psf_jobs=max_psf_jobs,
+                max_psf_files=max_psf_files)
+            # Number of visits, starting from the current one, that are
+            # registered with the scheduler so that their PSF jobs can
+            # run ahead of the CCD jobs.
+            self._psf_prefetch = next(_ for _ in (psf_lookahead,
+                                                  max_psf_files,
+                                                  max_psf_jobs)
+                                      if _ is not None)
         self.verbosity = verbosity
         self.log_dir = log_dir
         os.makedirs(self.log_dir, exist_ok=True)
 
+        # Record the submit, launch, start, and end times of each task.
+        if isinstance(telemetry, str):
+            telemetry = TaskTelemetry(telemetry)
+        self.telemetry = telemetry
+
+        # Copy the atm psf file, and any other files given as config
+        # entries in stage_config_files, to a node-local cache of
+        # node_cache_GB before running each CCD job.  The cache
+        # directory is set by the DESC_ROMAN_SIMS_CACHE variable on the
+        # workers; see parsl_config.load_wq_config.
+        self.node_cache_GB = node_cache_GB
+        self.stage_config_files = dict(stage_config_files or {})
+        if node_cache_GB is not None and (
+                dry_run is not None
+                or bash_app_executor in WARM_WORKER_EXECUTORS):
+            raise ValueError("Node-local staging requires the galsim "
+                             "bash_apps.")
+
+        # Register the PSF and CCD apps once.  The job identity is
+        # passed as arguments, and the memoization is keyed on the
+        # visit, det list, and config file hash.
         self.bash_app_executor = bash_app_executor
-        self.bash_app = parsl.bash_app(executors=[bash_app_executor],
-                                       cache=True,
-                                       ignore_for_cache=['stderr', 'stdout'])
+        self.config_hash = config_hash(imsim_yaml)
+        # In a dry run, the jobs are replaced by simulated tasks with
+        # durations from the DryRun cost model.
+        self.dry_run = dry_run
+        # A dry run must not change the state of the real run:  the
+        # simulated psf files are written to a scratch directory, the
+        # clean-up tasks only remove those files, and nothing is
+        # recorded in the manifest.
+        self._record_manifest = self.manifest is not None and dry_run is None
+        self._dry_run_psf_dir = None
+        if dry_run is not None:
+            self._dry_run_psf_dir = os.path.join(self.log_dir,
+                                                 'dry_run_atm_psf')
+            os.makedirs(self._dry_run_psf_dir, exist_ok=True)
+            app_type = parsl.python_app
+            funcs = (('psf', simulate_psf), ('ccd', simulate_ccds))
+        elif bash_app_executor in WARM_WORKER_EXECUTORS:
+            # Run the jobs in persistent worker processes that keep
+            # imsim imported and the parsed per-visit configs cached.
+            app_type = parsl.python_app
+            funcs = (('psf', generate_psf), ('ccd', render_ccds))
+        else:
+            app_type = parsl.bash_app
+            funcs = (('psf', galsim_psf_command), ('ccd', galsim_ccd_command))
+        self._apps = {}
+        self._retry_apps = {}
+        for job_type, func in funcs:
+            self._apps[job_type] = app_type(
+                func, executors=[bash_app_executor], cache=dry_run is None,
+                ignore_for_cache=self._ignore_for_cache(job_type))
+            # Parsl also memoizes failed tasks, and the memory request
+            # is not part of the hash, so the resubmissions with larger
+            # memory requests use uncached apps.
+            self._retry_apps[job_type] = app_type(
+                func, executors=[bash_app_executor], cache=False)
+        self._rm_atm_psf_app = parsl.python_app(
+            self._remove_atm_psf, executors=['thread_pool'])
+        self._record_ccds_app = parsl.python_app(
+            self._record_ccds, executors=['thread_pool'])
 
         self._visit_index = 0
+        self._register_index = 0
         self.current_visit = self.visits[self._visit_index]
         self._launched_jobs = 0
-        self._det_index = 0
+        self._job_index = 0
 
         self._psf_futures = {}
         self._ccd_futures = defaultdict(list)
         self._rm_atm_psf_futures = []
+        self._record_futures = []
+
+        # Event used to pause and resume streaming submission.
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    def _ignore_for_cache(self, job_type):
+        """
+        Keyword arguments to exclude from the memoization hash of the
+        app for job_type.  These are all passed by _submit.
+        """
+        ignore = list(_IGNORE_FOR_CACHE[job_type])
+        if self.bash_app_executor == "work_queue":
+            ignore.append('parsl_resource_specification')
+        if job_type == 'ccd' and self.node_cache_GB is not None:
+            ignore.extend(['staged_inputs', 'node_cache_GB'])
+        return ignore
 
     def _assemble_det_lists(self):
         self._det_lists = {}
+        if self.manifest is not None:
+            manifest_dets = self.manifest.finished_dets(self.visits)
         for visit in self.visits:
-            output_dir = self.output_dir_format % visit
-            raw_files = glob.glob(os.path.join(output_dir, 'amp*'))
-            finished_dets = []
-            for item in raw_files:
-                basename = os.path.basename(item)
-                index = basename.find('det')
-                finished_dets.append(int(basename[index+3:index+6]))
+            if self.manifest is not None:
+                finished_dets = manifest_dets[visit]
+            else:
+                output_dir = self.output_dir_format % visit
+                raw_files = glob.glob(os.path.join(output_dir, 'amp*'))
+                finished_dets = [det_num_from_filename(_) for _ in raw_files]
+            if self._catalog_det_lists is None:
+                target_dets = self.target_dets
+            else:
+                target_dets = self.target_dets.intersection(
+                    self._catalog_det_lists[visit].tolist())
             self._det_lists[visit] \
-                = sorted(self.target_dets.difference(finished_dets))
-        self.num_jobs = sum([len(_) for _ in self._det_lists.values()])
-
-    def find_psf_file(self, visit):
-        psf_files = glob.glob(os.path.join(self.atm_psf_dir, f"*{visit}*.pkl"))
+                = sorted(target_dets.difference(finished_dets))
+
+    def _assemble_job_lists(self):
+        self._job_lists = {}
+        for visit, det_list in self._det_lists.items():
+            if self.packing == 'balanced' and det_list:
+                wall_times, memories = self.cost_model.estimate(visit,
+                                                                det_list)
+                self._job_lists[visit] = balanced_jobs(
+                    det_list, wall_times, memories, self.nfiles, self.nproc)
+            else:
+                self._job_lists[visit] = consecutive_jobs(det_list,
+                                                          self.nfiles)
+        self.num_jobs = sum([len(_) for _ in self._job_lists.values()])
+
+    def find_psf_file(self, visit, use_manifest=True):
+        if use_manifest and self.manifest is not None:
+            return self.manifest.psf_file(visit)
+        psf_files = glob.glob(os.path.join(self.atm_psf_dir,
+                                           self._psf_file_pattern(visit)))
         if psf_files:
             return psf_files[0]
         else:
             return None
 
+    def _psf_file_pattern(self, visit):
+        """
+        Glob pattern of the atm_psf file names for visit, made from the
+        save_file format by filling in the first field, which is the
+        visit in the imSim configs, and replacing the others with
+        wildcards, e.g., atm_psf_00001234-*-*.pkl.
+        """
+        fields = iter(re.split(r'(%[-+ #0-9.]*[a-zA-Z])',
+                               self._psf_file_format))
+        pattern = next(fields)
+        for i, (field, text) in enumerate(zip(fields, fields)):
+            pattern += (field % visit if i == 0 else '*') + text
+        return pattern
+
+    def _psf_file_exists(self, visit):
+        """
+        True if the atm_psf file for visit is available, so that no
+        PSF job is needed.  A dry run ignores the files on disk unless
+        its use_existing_psf_files option is set.
+        """
+        if (self.dry_run is not None
+                and not self.dry_run.use_existing_psf_files):
+            return False
+        return self.find_psf_file(visit) is not None
+
+    def _record_psf(self, visit, future):
+        """Done callback to record a new atm_psf file in the manifest."""
+        if future.exception() is None:
+            psf_file = self.find_psf_file(visit, use_manifest=False)
+            if psf_file is not None:
+                self.manifest.record_psf(visit, psf_file)
+
+    def _record_ccds(self, visit, det_nums, inputs=()):
+        """
+        Record the rendered CCDs of a job in the manifest.  This runs
+        as a python_app that depends on the CCD job, so that the output
+        files are checked off the Parsl callback thread.  galsim can
+        exit successfully even if some of its output files were not
+        written, so only the CCDs of the job with valid amp files are
+        recorded.
+        """
+        rendered = job_rendered_dets(self.output_dir_format % visit,
+                                     det_nums)
+        self.manifest.record_ccds(visit, sorted(rendered))
+
+    def _submit(self, job_name, job_type, kwargs, memory, key,
+                inputs=(), observe=None):
+        """
+        Submit a job with the registered app for job_type and return
+        its future.  All of the app arguments are passed as keywords
+        so that the ignored ones can be dropped from the memoization
+        hash.  If adaptive memory requests are enabled, the
+        request is set by the resource tracker and the job is
+        resubmitted with a larger request if it fails on memory.
+        """
+        # Write stderr, stdout to log file in append mode.
+        stderr = (os.path.join(self.log_dir, job_name + ".log"), 'a')
+        stdout = stderr
+        start_file = None
+        if self.telemetry is not None:
+            start_file = os.path.join(self.log_dir, job_name + ".start")
+        kwargs = dict(kwargs, imsim_yaml=self.imsim_yaml,
+                      start_file=start_file)
+        visit = kwargs['visit']
+        if self.dry_run is not None:
+            if job_type == 'psf':
+                kwargs = dict(kwargs, duration=self.dry_run.psf_duration(
+                    visit), psf_file=self._dry_run_psf_file(visit))
+            else:
+                kwargs = dict(kwargs, duration=self.dry_run.ccd_duration(
+                    visit, kwargs['det_nums'], kwargs['nproc']))
+
+        def submit(memory, retry=False):
+            app = self._retry_apps[job_type] if retry \
+                else self._apps[job_type]
+            app_kwargs = dict(kwargs, inputs=inputs, stderr=stderr,
+                              stdout=stdout)
+            if self.bash_app_executor == "work_queue":
+                resource_spec = dict(memory=memory, cores=1, disk=0)
+                print(job_name, resource_spec, flush=True)
+                app_kwargs['parsl_resource_specification'] = resource_spec
+            return app(**app_kwargs)
+
+        if self.resource_tracker is None:
+            future = submit(memory)
+        else:
+            memory = self.resource_tracker.request(key, memory)
+            future = EscalatingFuture(submit, self.resource_tracker, key,
+                                      memory, observe=observe)
+        if self.dry_run is not None:
+            self.dry_run.watch(future, job_type, visit, memory)
+        if self.telemetry is not None:
+            ndets = len(kwargs['det_nums']) if job_type == 'ccd' else 0
+            self.telemetry.watch(future, job_name, job_type, visit,
+                                 band=self._visit_bands.get(visit),
+                                 ndets=ndets, start_file=start_file)
+        return future
+
+    def _ccd_peak_memory(self, visit, det_nums, nproc):
+        """
+        Peak memory in MB of a CCD job, estimated from the process_info
+        files of the nproc CCDs with the largest peak memory.
+        """
+        output_dir = self.output_dir_format % visit
+        peaks = []
+        for det_num in det_nums:
+            pattern = os.path.join(output_dir,
+                                   f"process_info_*det{det_num:03d}.txt*")
+            for filename in glob.glob(pattern):
+                peak = read_process_info(filename)[1]
+                if not math.isnan(peak):
+                    peaks.append(peak)
+        if not peaks:
+            return None
+        return 1024*sum(sorted(peaks, reverse=True)[:nproc])
+
+    @staticmethod
+    def _psf_peak_memory(log_file):
+        """
+        Peak memory in MB of a PSF job from the `/usr/bin/time -v`
+        output in its log file, or None if it is not available.
+        """
+        peak = None
+        with open(log_file) as fobj:
+            for line in fobj:
+                if "Maximum resident set size" in line:
+                    peak = int(line.split(':')[-1])/1024.
+        return peak
+
+    def _dry_run_psf_file(self, visit):
+        """Path of the simulated atm_psf file of a dry run."""
+        return os.path.join(self._dry_run_psf_dir,
+                            f"atm_psf_{visit:08d}_dry_run.pkl")
+
+    def _remove_atm_psf(self, visit):
+        """Remove the atm_psf file for visit."""
+        if self.dry_run is not None:
+            # Only remove the simulated file, if one was written.
+            psf_file = self._dry_run_psf_file(visit)
+            if os.path.isfile(psf_file):
+                os.remove(psf_file)
+            return
+        atm_psf_file = (self.find_psf_file(visit) or
+                        self.find_psf_file(visit, use_manifest=False))
+        if atm_psf_file is None:
+            # The PSF job failed, so there is no file to remove.
+            print(f"no atm_psf file to remove for visit {visit}", flush=True)
+            return
+        print("deleting", atm_psf_file, flush=True)
+        os.remove(atm_psf_file)
+        if self.manifest is not None:
+            self.manifest.record_psf(visit, atm_psf_file, status='removed')
+
     def get_atm_psf_future(self, visit):
         """
         Use `galsim {self.imsim_yaml} output.nfiles=0` to generate the atm
         psf file.
         """
-        if self.find_psf_file(visit) is not None:
+        if self._psf_file_exists(visit):
             # atm_psf_file already exists, so return an empty list of
             # prerequisite futures.
             return []
+        return [self._submit_psf_job(visit)]
+
+    def _submit_psf_job(self, visit):
+        """Submit the job to generate the atm psf file for visit."""
         job_name = f"{visit}_psf"
-        # Write stderr, stdout to log file in append mode.
-        stderr = (os.path.join(self.log_dir, job_name + ".log"), 'a')
-        stdout = stderr
+        log_file = os.path.join(self.log_dir, job_name + ".log")
+        psf_future = self._submit(
+            job_name, 'psf',
+            dict(visit=visit, config_hash=self.config_hash,
+                 time_command=self.time_command), self.GB_per_PSF*1024,
+            ('psf', 1),
+            observe=functools.partial(self._psf_peak_memory, log_file))
+        if self._record_manifest:
+            psf_future.add_done_callback(
+                functools.partial(self._record_psf, visit))
+        return psf_future
+
+    def _staged_inputs(self, visit):
+        """
+        (config_key, path pattern) pairs of the inputs to stage in the
+        node-local cache for the CCD jobs of visit.
+        """
+        psf_pattern = os.path.join(os.path.abspath(self.atm_psf_dir),
+                                   self._psf_file_pattern(visit))
+        return ((('input.atm_psf.save_file', psf_pattern),)
+                + tuple(self.stage_config_files.items()))
 
-        if self.bash_app_executor == "work_queue":
-            resource_spec = dict(memory=self.GB_per_PSF*1024, cores=1, disk=0)
+    def _release_psf(self, visit, future):
+        """
+        Done callback to release the PSF budget for visit.  The file
+        budget is only freed if the atm_psf file was removed.
+        """
+        removed = future.exception() is None
+        if not removed:
+            print(f"failed to remove the atm_psf file for visit {visit}: "
+                  f"{future.exception()!r}", flush=True)
+        self.psf_scheduler.release(visit, file_removed=removed)
 
-            def psf_command(command_line, inputs=(), stderr=None, stdout=None,
-                            parsl_resource_specification=resource_spec):
-                return command_line
-        else:
+    def _register_psf_visits(self):
+        """
+        Register the current visit and the upcoming visits that have
+        CCD jobs, up to the prefetch budget, with the PSF scheduler.
+        """
+        while (self._register_index < len(self.visits)
+               and (len(self._psf_futures) < self._psf_prefetch
+                    or self.current_visit not in self._psf_futures)):
+            visit = self.visits[self._register_index]
+            self._register_index += 1
+            if not self._job_lists[visit]:
+                continue
+            self._psf_futures[visit] = self.psf_scheduler.register(
+                visit, psf_file_exists=self._psf_file_exists(visit))
+
+    @staticmethod
+    def _when_all_done(futures, callback):
+        """Call callback() once all of the futures are done."""
+        lock = threading.Lock()
+        remaining = [len(futures)]
+
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                callback()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _clean_up_visit(self, visit, ccd_futures):
+        """
+        Return a future for the removal of the atm_psf file for visit,
+        which is run by the python_app once all of the ccd_futures are
+        done.  The CCD futures are not passed to the app as
+        dependencies, since Parsl would then fail the app, and leave
+        the file on disk, if any of the CCD jobs failed.
+        """
+        rm_future = Future()
 
-            def psf_command(command_line, inputs=(), stderr=None, stdout=None):
-                return command_line
-        psf_command.__name__ = job_name
+        def copy_outcome(app_future):
+            exception = app_future.exception()
+            if exception is None:
+                rm_future.set_result(app_future.result())
+            else:
+                rm_future.set_exception(exception)
 
-        get_future = self.bash_app(psf_command)
+        def remove():
+            self._rm_atm_psf_app(visit).add_done_callback(copy_outcome)
 
-        command = (f"time galsim -v 2 {self.imsim_yaml} output.nfiles=0 "
-                   f"input.opsim_data.visit={visit}")
-        return [get_future(command, stderr=stderr, stdout=stdout)]
+        self._when_all_done(ccd_futures, remove)
+        return rm_future
 
     def get_job_future(self):
-        if self._launched_jobs > self.num_jobs:
+        if self._visit_index >= len(self.visits):
             return None
 
-        if self._det_index >= len(self._det_lists[self.current_visit]):
+        while self._job_index >= len(self._job_lists[self.current_visit]):
             handled_visit = self.current_visit
 
-            if self.clean_up_atm_psfs:
-                # Create a python_app that removes the atm_psf file
-                # for the just-handled visit after the futures for
-                # each CCD in that visit have finished rendering.
-                @parsl.python_app(executors=['thread_pool'])
-                def remove_atm_psf(visit, inputs=()):
-                    atm_psf_file = self.find_psf_file(visit)
-                    print("deleting", atm_psf_file, flush=True)
-                    os.remove(atm_psf_file)
-
-                remove_atm_psf.__name__ = f"rm_atm_psf_{handled_visit}"
-                self._rm_atm_psf_futures.append(
-                    remove_atm_psf(handled_visit,
-                                   inputs=self._ccd_futures[handled_visit]))
+            if self.clean_up_atm_psfs and self._ccd_futures[handled_visit]:
+                # Remove the atm_psf file for the just-handled visit
+                # after the futures for each CCD in that visit have
+                # finished, whether or not they succeeded.
+                rm_future = self._clean_up_visit(
+                    handled_visit, self._ccd_futures[handled_visit])
+                self._rm_atm_psf_futures.append(rm_future)
+                if self.dry_run is not None:
+                    rm_future.add_done_callback(functools.partial(
+                        self.dry_run.psf_removed, handled_visit))
+                if self.psf_scheduler is not None:
+                    # Free the PSF file budget once the file is removed.
+                    # A file that could not be removed keeps its share
+                    # of the budget.
+                    rm_future.add_done_callback(functools.partial(
+                        self._release_psf, handled_visit))
+            elif (self.psf_scheduler is not None
+                  and self._ccd_futures[handled_visit]):
+                self._when_all_done(
+                    self._ccd_futures[handled_visit],
+                    functools.partial(self.psf_scheduler.release,
+                                      handled_visit, file_removed=False))
+
+            # Release the references to the futures of the handled visit.
+            # The clean-up future holds its own references to the CCD
+            # futures it depends on.
+            self._ccd_futures.pop(handled_visit, None)
+            self._psf_futures.pop(handled_visit, None)
 
             self._visit_index += 1
             try:
                 self.current_visit = self.visits[self._visit_index]
             except IndexError:
                 return None
-            self._det_index = 0
+            self._job_index = 0
 
-        if self.current_visit not in self._psf_futures:
+        if self.psf_scheduler is not None:
+            self._register_psf_visits()
+        elif self.current_visit not in self._psf_futures:
             self._psf_futures[self.current_visit] \
                 = self.get_atm_psf_future(self.current_visit)
         psf_futures = self._psf_futures[self.current_visit]
-        det_list = self._det_lists[self.current_visit]
-        det_start = det_list[self._det_index]
-        det_end_index = min(self._det_index + self.nfiles, len(det_list)) - 1
-        det_end = det_list[det_end_index]
+        job = self._job_lists[self.current_visit][self._job_index]
+        job_dets = job.det_nums
+        det_start = job_dets[0]
+        det_end = job_dets[-1]
         job_name = f"{self.current_visit:08d}_{det_start:03d}_{det_end:03d}"
 
-        # Write stderr, stdout to log file in append mode.
-        stderr = (os.path.join(self.log_dir, job_name + ".log"), 'a')
-        stdout = stderr
-
-        if self.bash_app_executor == "work_queue":
-            # Expected resource usage per galsim instance.  Parsl assumes
-            # memory has units of MB.
-            resource_spec = dict(memory=self.GB_per_CCD*1024*self.nproc,
-                                 cores=1, disk=0)
-            print(job_name, resource_spec, flush=True)
-
-            def bash_command(command_line, inputs=(), stderr=None, stdout=None,
-                             parsl_resource_specification=resource_spec):
-                return command_line
+        # Expected resource usage per galsim instance.  Parsl assumes
+        # memory has units of MB.
+        if job.memory_GB is None:
+            memory = self.GB_per_CCD*1024*self.nproc
         else:
+            memory = math.ceil(job.memory_GB*1024)
 
-            def bash_command(command_line, inputs=(), stderr=None, stdout=None):
-                return command_line
-        bash_command.__name__ = job_name
-
-        # The wrapped bash_app function returns a python future when
-        # called.
-        get_future = self.bash_app(bash_command)
-
-        nfiles = det_end_index - self._det_index + 1
-        nproc = min(nfiles, self.nproc)
-        my_det_list = ("[" +
-                       ", ".join([str(_) for _ in
-                                  det_list[self._det_index:det_end_index + 1]])
-                       + "]")
-        command = (f"galsim -v {self.verbosity} {self.imsim_yaml} "
-                   f"input.opsim_data.visit={self.current_visit} "
-                   f"output.nfiles={nfiles} "
-                   f"output.nproc={nproc} "
-                   "output.det_num='{type: List, items: " + my_det_list + "}'")
-
-        self._det_index += self.nfiles
+        nproc = min(len(job_dets), self.nproc)
+
+        self._job_index += 1
         self._launched_jobs += 1
 
-        ccd_future = get_future(command, inputs=psf_futures, stderr=stderr,
-                                stdout=stdout)
+        kwargs = dict(visit=self.current_visit, det_nums=tuple(job_dets),
+                      config_hash=self.config_hash, nproc=nproc,
+                      verbosity=self.verbosity)
+        if self.node_cache_GB is not None:
+            kwargs['staged_inputs'] = self._staged_inputs(self.current_visit)
+            kwargs['node_cache_GB'] = self.node_cache_GB
+        ccd_future = self._submit(
+            job_name, 'ccd', kwargs, memory,
+            ('ccd', nproc), inputs=psf_futures,
+            observe=functools.partial(self._ccd_peak_memory,
+                                      self.current_visit, job_dets, nproc))
+        if self._record_manifest:
+            # The recording app fails with a DependencyError if the CCD
+            # job fails, in which case there is nothing to record.
+            self._record_futures.append(self._record_ccds_app(
+                self.current_visit, job_dets, inputs=[ccd_future]))
         self._ccd_futures[self.current_visit].append(ccd_future)
         return ccd_future
 
-    def run(self, block=True):
+    def pause(self):
+        """Pause the submission of new jobs by a streaming run."""
+        self._resume_event.clear()
+
+    def resume(self):
+        """Resume the submission of new jobs by a streaming run."""
+        self._resume_event.set()
+
+    def _stream_jobs(self, slots):
+        """
+        Submit the CCD jobs as slots become available, releasing each
+        slot when its job finishes.
+        """
+        print("Streaming CCD job futures...", flush=True)
+        while True:
+            self._resume_event.wait()
+            slots.acquire()
+            ccd_future = self.get_job_future()
+            if ccd_future is None:
+                slots.release()
+                break
+            ccd_future.add_done_callback(lambda _: slots.release())
+            self._rm_atm_psf_futures = [_ for _ in self._rm_atm_psf_futures
+                                        if not _.done()]
+            self._record_futures = [_ for _ in self._record_futures
+                                    if not _.done()]
+
+    def _run_streaming(self, max_in_flight, block):
+        slots = threading.BoundedSemaphore(max_in_flight)
+        if not block:
+            thread = threading.Thread(target=self._stream_jobs, args=(slots,))
+            thread.start()
+            return thread
+        self._stream_jobs(slots)
+        # Wait for all of the in-flight jobs to finish.
+        for _ in range(max_in_flight):
+            slots.acquire()
+        if self._rm_atm_psf_futures:
+            print("Waiting for clean-up futures.", flush=True)
+            _ = [_.exception() for _ in self._rm_atm_psf_futures]
+        _ = [_.exception() for _ in self._record_futures]
+        if self.resource_tracker is not None:
+            print(self.resource_tracker.report(), flush=True)
+        if self.telemetry is not None:
+            print(self.telemetry.report(), flush=True)
+        if self.dry_run is not None:
+            print(self.dry_run.report(), flush=True)
+        return None
+
+    def run(self, block=True, max_in_flight=None):
+        """
+        Submit all of the CCD jobs.
+
+        Parameters
+        ----------
+        block : bool [True]
+            If True, wait for the jobs and clean-up tasks to finish.
+        max_in_flight : int [None]
+            If not None, stream the submissions so that at most this
+            many CCD jobs are in flight at once, and completed futures
+            are released.  Use pause() and resume() to control the
+            submission.  If block is False, the submission runs in a
+            thread, which is returned.
+        """
+        if max_in_flight is not None:
+            return self._run_streaming(max_in_flight, block)
         ccd_futures = []
         print("Generating CCD job futures...", flush=True)
         for index in range(self.num_jobs + 1):
@@ -208,3 +755,10 @@ class GalSimJobGenerator:
                 _ = [_.exception() for _ in self._rm_atm_psf_futures]
             else:
                 _ = [_.exception() for _ in ccd_futures]
+            _ = [_.exception() for _ in self._record_futures]
+            if self.resource_tracker is not None:
+                print(self.resource_tracker.report(), flush=True)
+            if self.telemetry is not None:
+                print(self.telemetry.report(), flush=True)
+            if self.dry_run is not None:
+                print(self.dry_run.report(), flush=True)
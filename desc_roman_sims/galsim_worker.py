@@ -0,0 +1,182 @@
+"""
+Functions for generating atm PSFs and rendering CCDs in long-lived
+worker processes, e.g., the workers of a Parsl HighThroughputExecutor.
+The parsed imsim config and the loaded input objects, e.g., the sky
+catalog and the atm PSF, for each visit are cached in each worker
+process so that consecutive CCD batches for the same visit do not
+re-import imsim, re-read the config, or reload the inputs.  Each job
+runs on a fresh copy of the unprocessed config, with only the output
+fields set for the job, to which the loaded inputs of the visit are
+attached.  galsim.config then reuses the input objects that it marked
+as safe, i.e., those that do not depend on the file being built, and
+reloads the others.
+"""
+import os
+import copy
+import time
+import logging
+import resource
+import contextlib
+from collections import OrderedDict
+
+
+__all__ = ['WARM_WORKER_EXECUTORS', 'generate_psf', 'render_ccds',
+           'clear_worker_cache']
+
+
+# Labels of the executors with persistent workers that run these
+# functions as python_apps instead of running `galsim` as bash_apps.
+WARM_WORKER_EXECUTORS = ('warm_pool',)
+
+# Maximum number of per-visit configs kept in each worker process.
+MAX_CACHED_VISITS = 2
+
+_BASE_CONFIGS = {}
+_VISIT_CONFIGS = OrderedDict()
+# Processed input fields and loaded input objects keyed like
+# _VISIT_CONFIGS.
+_VISIT_INPUTS = {}
+
+
+def clear_worker_cache():
+    """Clear the cached configs and input objects in this process."""
+    _BASE_CONFIGS.clear()
+    _VISIT_CONFIGS.clear()
+    _VISIT_INPUTS.clear()
+
+
+def _visit_config(imsim_yaml, visit, config_hash):
+    """
+    Return a copy of the unprocessed config for the visit, creating
+    the cached config from the base config for imsim_yaml if needed.
+    The input objects loaded by earlier jobs for the visit are
+    attached to the copy.
+    """
+    import galsim
+    key = (config_hash, visit)
+    if key in _VISIT_CONFIGS:
+        _VISIT_CONFIGS.move_to_end(key)
+    else:
+        if config_hash not in _BASE_CONFIGS:
+            _BASE_CONFIGS[config_hash] \
+                = galsim.config.ReadConfig(imsim_yaml)[0]
+        config = copy.deepcopy(_BASE_CONFIGS[config_hash])
+        galsim.config.UpdateConfig(config, {'input.opsim_data.visit': visit})
+        _VISIT_CONFIGS[key] = config
+        while len(_VISIT_CONFIGS) > MAX_CACHED_VISITS:
+            _VISIT_INPUTS.pop(_VISIT_CONFIGS.popitem(last=False)[0], None)
+    config = copy.deepcopy(_VISIT_CONFIGS[key])
+    if key in _VISIT_INPUTS:
+        config['input'], config['_input_objs'] = _VISIT_INPUTS[key]
+    return config
+
+
+def _save_inputs(visit, config_hash, config):
+    """
+    Keep the input fields, with their current input objects, and the
+    loaded input objects of a processed config for the next job of
+    the visit.  Inputs that were loaded through a multiprocessing
+    manager, i.e., for nproc > 1, are proxies for objects owned by
+    that job and so are not kept.
+    """
+    key = (config_hash, visit)
+    if key not in _VISIT_CONFIGS:
+        return
+    if '_input_manager' in config or '_input_objs' not in config:
+        _VISIT_INPUTS.pop(key, None)
+        return
+    _VISIT_INPUTS[key] = (config['input'], config['_input_objs'])
+
+
+def _write_start_time(start_file):
+    """Write the task start time for the telemetry."""
+    if start_file is not None:
+        with open(start_file, 'w') as fobj:
+            fobj.write(f"{time.time()}\n")
+
+
+def _log_spec(spec):
+    """Return the (path, mode) of a stderr or stdout log specification."""
+    return spec if isinstance(spec, tuple) else (spec, 'a')
+
+
+def _write_time_report(time_command, wall_time, stream):
+    """
+    Write the wall time of a job to stream in the format of the bash
+    `time` command, or, if time_command has the -v option, in the
+    format of `/usr/bin/time -v`.  The latter includes the peak memory
+    of the worker process, which is an upper bound on the peak memory
+    of the job.
+    """
+    if '-v' in time_command.split():
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stream.write(f"\tElapsed (wall clock) time (seconds): "
+                     f"{wall_time:.2f}\n"
+                     f"\tMaximum resident set size (kbytes): {max_rss}\n")
+    else:
+        minutes, seconds = divmod(wall_time, 60.)
+        stream.write(f"\nreal\t{int(minutes)}m{seconds:.3f}s\n")
+    stream.flush()
+
+
+def _process(config, new_params, stderr, stdout, verbosity,
+             time_command=None):
+    """
+    Run galsim.config.Process on config, logging to the stderr file
+    and redirecting the standard output to the stdout file.  If
+    time_command is not None, a report of the wall time is written to
+    the stderr file.  Returns the processed config.
+    """
+    import galsim
+    logger = logging.getLogger(f"galsim_worker.{os.getpid()}")
+    logger.setLevel({0: logging.CRITICAL, 1: logging.WARNING,
+                     2: logging.INFO}.get(verbosity, logging.DEBUG))
+    log_file, mode = _log_spec(stderr)
+    handler = logging.FileHandler(log_file, mode=mode) if log_file \
+        else logging.StreamHandler()
+    logger.addHandler(handler)
+    t0 = time.time()
+    try:
+        with contextlib.ExitStack() as stack:
+            if stdout is not None:
+                stack.enter_context(contextlib.redirect_stdout(
+                    stack.enter_context(open(*_log_spec(stdout)))))
+            galsim.config.UpdateConfig(config, new_params)
+            config = galsim.config.Process(config, logger,
+                                           except_abort=True)
+        if time_command:
+            _write_time_report(time_command, time.time() - t0,
+                               handler.stream)
+        return config
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def generate_psf(imsim_yaml, visit, config_hash, time_command=None,
+                 inputs=(), stderr=None, stdout=None, start_file=None):
+    """
+    python_app function to generate the atm psf file for a visit.  If
+    time_command is not None, e.g., "time" or "/usr/bin/time -v", a
+    report of the job's wall time, and for the latter, of the peak
+    memory, is written to the stderr file.
+    """
+    _write_start_time(start_file)
+    config = _visit_config(imsim_yaml, visit, config_hash)
+    config = _process(config, {'output.nfiles': 0}, stderr, stdout, 2,
+                      time_command=time_command)
+    _save_inputs(visit, config_hash, config)
+
+
+def render_ccds(imsim_yaml, visit, det_nums, config_hash, nproc=1,
+                verbosity=2, inputs=(), stderr=None, stdout=None,
+                start_file=None):
+    """python_app function to render a list of CCDs for a visit."""
+    _write_start_time(start_file)
+    config = _visit_config(imsim_yaml, visit, config_hash)
+    new_params = {'output.nfiles': len(det_nums),
+                  'output.nproc': nproc,
+                  'output.det_num': {'type': 'List',
+                                     'items': list(det_nums)}}
+    config = _process(config, new_params, stderr, stdout, verbosity)
+    _save_inputs(visit, config_hash, config)
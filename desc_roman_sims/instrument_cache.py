@@ -0,0 +1,197 @@
+"""
+Process-wide caches of the camera, telescope, and detector objects
+used by CcdRegionFactory, so that YAML parsing and camera construction
+are done once per process instead of once per visit.  imsim, batoid,
+and lsst.afw are imported when the first object is created.
+"""
+from collections import OrderedDict, namedtuple
+import threading
+import numpy as np
+
+
+__all__ = ['BoundedCache', 'CacheInfo', 'get_cached_camera',
+           'get_cached_telescope', 'get_science_ccds', 'RaftFootprint',
+           'get_raft_footprints', 'get_fov_radius', 'cache_info',
+           'clear_caches']
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions',
+                                     'size', 'maxsize'])
+
+RaftFootprint = namedtuple('RaftFootprint', ['corner_dets', 'det_names',
+                                             'pixel_corners'])
+
+
+class BoundedCache:
+    """
+    Thread-safe, least-recently-used cache with a bounded number of
+    entries and hit/miss statistics.
+    """
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, create):
+        """
+        Return the cached value for key, calling create() to make
+        it if it is not in the cache.
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+            value = create()
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return value
+
+    def invalidate(self, key=None):
+        """Remove key from the cache, or all entries if key is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             len(self._data), self.maxsize)
+
+    def __len__(self):
+        return len(self._data)
+
+
+_CAMERAS = BoundedCache(maxsize=4)
+_TELESCOPES = BoundedCache(maxsize=12)
+_SCIENCE_CCDS = BoundedCache(maxsize=4)
+_RAFT_FOOTPRINTS = BoundedCache(maxsize=4)
+_FOV_RADII = BoundedCache(maxsize=4)
+
+
+def get_cached_camera(camera_name="LsstCam"):
+    """Return the lsst.afw.cameraGeom.Camera object for camera_name."""
+    from imsim import get_camera
+    return _CAMERAS.get(camera_name, lambda: get_camera(camera_name))
+
+
+def get_cached_telescope(band, rottelpos=None, camera_optic="LSSTCamera"):
+    """
+    Return the batoid telescope model for the specified band.  The
+    unrotated telescope is cached for each band, and the rotator
+    angle, rottelpos in degrees, is applied to the cached telescope.
+    """
+    import batoid
+    from imsim import load_telescope
+    telescope = _TELESCOPES.get(band,
+                                lambda: load_telescope(f"LSST_{band}.yaml"))
+    if rottelpos is None:
+        return telescope
+    return telescope.withLocallyRotatedOptic(
+        camera_optic, batoid.RotZ(np.radians(rottelpos)))
+
+
+def get_science_ccds(camera_name="LsstCam"):
+    """Return a tuple of the names of the science CCDs of the camera."""
+    def science_ccds():
+        from lsst.afw import cameraGeom
+        camera = get_cached_camera(camera_name)
+        return tuple(det.getName() for det in camera
+                     if det.getType() == cameraGeom.DetectorType.SCIENCE)
+    return _SCIENCE_CCDS.get(camera_name, science_ccds)
+
+
+def get_raft_footprints(camera_name="LsstCam", pad_mm=2.):
+    """
+    Return a dict, keyed by raft name, of RaftFootprint tuples for the
+    rafts with science CCDs.  The footprint is the focal plane bounding
+    box of the raft's science CCDs, padded by pad_mm on each side.  Its
+    corners are given as an array of shape (4, 2), where each corner
+    is in the pixel coordinates of the CCD, listed in corner_dets,
+    whose center is closest to it.  The footprint on the sky is then
+    computed with the WCSs of the raft's corner CCDs, each evaluated
+    within pad_mm of its CCD, rather than by extrapolating a single
+    CCD's WCS across the raft.
+    """
+    def raft_footprints():
+        import lsst.geom
+        from lsst.afw import cameraGeom
+        camera = get_cached_camera(camera_name)
+        rafts = {}
+        for det_name in get_science_ccds(camera_name):
+            rafts.setdefault(det_name.split('_')[0], []).append(det_name)
+        footprints = {}
+        for raft, det_names in rafts.items():
+            corners = np.array([(corner.x, corner.y) for det_name
+                                in det_names for corner in
+                                camera[det_name].getCorners(
+                                    cameraGeom.FOCAL_PLANE)])
+            centers = np.array([tuple(camera[det_name].getCenter(
+                cameraGeom.FOCAL_PLANE)) for det_name in det_names])
+            xmin, ymin = corners.min(axis=0) - pad_mm
+            xmax, ymax = corners.max(axis=0) + pad_mm
+            corner_dets = []
+            pixel_corners = []
+            for x, y in ((xmin, ymin), (xmax, ymin), (xmax, ymax),
+                         (xmin, ymax)):
+                det_name = det_names[np.argmin(np.hypot(centers[:, 0] - x,
+                                                        centers[:, 1] - y))]
+                transform = camera[det_name].getTransform(
+                    cameraGeom.FOCAL_PLANE, cameraGeom.PIXELS)
+                pixel_corners.append(
+                    tuple(transform.applyForward(lsst.geom.Point2D(x, y))))
+                corner_dets.append(det_name)
+            footprints[raft] = RaftFootprint(tuple(corner_dets),
+                                             tuple(det_names),
+                                             np.array(pixel_corners))
+        return footprints
+    return _RAFT_FOOTPRINTS.get((camera_name, pad_mm), raft_footprints)
+
+
+def get_fov_radius(camera_name="LsstCam", margin=0.05):
+    """
+    Return the radius in degrees of a circle about the boresight that
+    encloses all of the science CCDs.  This is the largest field angle
+    of the science CCD corners, computed with the camera's focal plane
+    to field angle transform, plus margin degrees to allow for the
+    differences between that transform and the Batoid WCS.  For
+    LSSTCam, the outer corners of the CCDs in the rafts adjacent to
+    the corner rafts are about 2.05 degrees from the boresight.
+    """
+    def fov_radius():
+        import lsst.geom
+        from lsst.afw import cameraGeom
+        camera = get_cached_camera(camera_name)
+        transform = camera.getTransform(cameraGeom.FOCAL_PLANE,
+                                        cameraGeom.FIELD_ANGLE)
+        field_angles = [transform.applyForward(lsst.geom.Point2D(corner))
+                        for det_name in get_science_ccds(camera_name)
+                        for corner in camera[det_name].getCorners(
+                            cameraGeom.FOCAL_PLANE)]
+        return float(np.degrees(max(np.hypot(_.x, _.y)
+                                    for _ in field_angles))) + margin
+    return _FOV_RADII.get((camera_name, margin), fov_radius)
+
+
+def cache_info():
+    """Return a dict of CacheInfo tuples for each of the caches."""
+    return {'camera': _CAMERAS.info(),
+            'telescope': _TELESCOPES.info(),
+            'science_ccds': _SCIENCE_CCDS.info(),
+            'raft_footprints': _RAFT_FOOTPRINTS.info(),
+            'fov_radius': _FOV_RADII.info()}
+
+
+def clear_caches():
+    """Invalidate all of the cached objects."""
+    for cache in (_CAMERAS, _TELESCOPES, _SCIENCE_CCDS, _RAFT_FOOTPRINTS,
+                  _FOV_RADII):
+        cache.invalidate()
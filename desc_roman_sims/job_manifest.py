@@ -0,0 +1,193 @@
+"""
+Local sqlite manifest of completed CCD and atmospheric PSF outputs, so
+that restarting a campaign does not require globbing the output
+directories on a shared file system.
+"""
+import os
+import glob
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+import concurrent.futures
+
+
+__all__ = ['JobManifest', 'det_num_from_filename', 'rendered_dets',
+           'job_rendered_dets']
+
+
+def det_num_from_filename(filename):
+    """Extract the det_num from an imSim output filename."""
+    basename = os.path.basename(filename)
+    index = basename.find('det')
+    return int(basename[index+3:index+6])
+
+
+def _is_valid_fits(filename):
+    """Check that the file is non-empty and has a FITS header."""
+    try:
+        with open(filename, 'rb') as fobj:
+            return fobj.read(6) == b'SIMPLE'
+    except OSError:
+        return False
+
+
+def rendered_dets(output_dir, validate=True):
+    """
+    Return the det_nums of the amp files in output_dir.  If validate
+    is True, then only amp files with a valid FITS header are counted.
+    """
+    amp_files = glob.glob(os.path.join(output_dir, 'amp*'))
+    if validate:
+        amp_files = [_ for _ in amp_files if _is_valid_fits(_)]
+    return [det_num_from_filename(_) for _ in amp_files]
+
+
+def job_rendered_dets(output_dir, det_nums, validate=True):
+    """
+    Return the set of the det_nums with amp files in output_dir.  The
+    directory is listed once, without opening the files, and if
+    validate is True, only the amp files of det_nums are opened to
+    check their FITS headers.
+    """
+    det_nums = set(det_nums)
+    rendered = set()
+    try:
+        entries = list(os.scandir(output_dir))
+    except OSError:
+        return rendered
+    for entry in entries:
+        if not entry.name.startswith('amp'):
+            continue
+        det_num = det_num_from_filename(entry.name)
+        if det_num in det_nums and (not validate
+                                    or _is_valid_fits(entry.path)):
+            rendered.add(det_num)
+    return rendered
+
+
+class JobManifest:
+    """
+    sqlite database recording the CCDs that have been rendered and
+    the atm_psf files that have been generated for each visit.
+    """
+    def __init__(self, db_file='job_manifest.db'):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(db_file, check_same_thread=False)
+        with self._lock, self._con:
+            self._con.execute("create table if not exists ccds "
+                              "(visit integer, det_num integer, "
+                              "updated real, primary key (visit, det_num))")
+            self._con.execute("create table if not exists psfs "
+                              "(visit integer primary key, path text, "
+                              "status text, updated real)")
+
+    def close(self):
+        self._con.close()
+
+    def record_ccds(self, visit, det_nums):
+        """Record the CCDs for visit as rendered."""
+        now = time.time()
+        with self._lock, self._con:
+            self._con.executemany("insert or replace into ccds "
+                                  "values (?, ?, ?)",
+                                  [(int(visit), int(_), now)
+                                   for _ in det_nums])
+
+    def finished_dets(self, visits=None):
+        """
+        Return a dict of the sets of rendered det_nums keyed by visit.
+        """
+        with self._lock:
+            rows = self._con.execute("select visit, det_num "
+                                     "from ccds").fetchall()
+        finished = defaultdict(set)
+        if visits is not None:
+            visits = set(visits)
+        for visit, det_num in rows:
+            if visits is None or visit in visits:
+                finished[visit].add(det_num)
+        return finished
+
+    def record_psf(self, visit, path, status='done'):
+        """Record the atm_psf file for visit and its status."""
+        with self._lock, self._con:
+            self._con.execute("insert or replace into psfs "
+                              "values (?, ?, ?, ?)",
+                              (int(visit), path, status, time.time()))
+
+    def psf_status_counts(self):
+        """Return a dict of the number of atm_psf files by status."""
+        with self._lock:
+            rows = self._con.execute("select status, count(*) from psfs "
+                                     "group by status").fetchall()
+        return dict(rows)
+
+    def psf_file(self, visit):
+        """
+        Return the path to the atm_psf file for visit, or None if it
+        is not recorded as available.
+        """
+        with self._lock:
+            row = self._con.execute("select path from psfs where visit=? "
+                                    "and status='done'",
+                                    (int(visit),)).fetchone()
+        return None if row is None else row[0]
+
+    def reconcile(self, visits, output_dir_format, atm_psf_dir,
+                  max_workers=16, validate=True):
+        """
+        Scan the output directories and atm_psf directory in parallel
+        and update the manifest to match the files on disk.
+
+        Parameters
+        ----------
+        visits : list
+            Visits to check.
+        output_dir_format : str
+            Format string for the output directory of each visit.
+        atm_psf_dir : str
+            Directory containing the atm_psf files.
+        max_workers : int [16]
+            Number of threads used for the directory scans.
+        validate : bool [True]
+            If True, then only record amp files that have a valid
+            FITS header.
+
+        Returns
+        -------
+        int
+            Number of CCDs recorded as rendered.
+        """
+        def scan(visit):
+            return visit, rendered_dets(output_dir_format % visit,
+                                        validate=validate)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            results = list(executor.map(scan, visits))
+        with self._lock, self._con:
+            self._con.executemany("delete from ccds where visit=?",
+                                  [(int(_),) for _ in visits])
+        num_ccds = 0
+        for visit, det_nums in results:
+            self.record_ccds(visit, det_nums)
+            num_ccds += len(det_nums)
+
+        psf_files = glob.glob(os.path.join(atm_psf_dir, '*.pkl'))
+        psf_visits = {}
+        for psf_file in psf_files:
+            # atm_psf file names have the form atm_psf_%08d-%1d-%s.pkl
+            try:
+                visit = int(os.path.basename(psf_file).split('_')[-1][:8])
+            except ValueError:
+                continue
+            psf_visits[visit] = psf_file
+        with self._lock, self._con:
+            self._con.executemany("update psfs set status='removed' "
+                                  "where visit=?",
+                                  [(int(_),) for _ in visits
+                                   if _ not in psf_visits])
+        for visit, psf_file in psf_visits.items():
+            self.record_psf(visit, psf_file)
+        return num_ccds
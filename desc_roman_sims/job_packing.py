@@ -0,0 +1,200 @@
+"""
+Cost model for CCD rendering jobs, based on the process_info files
+written by imSim, and packing of detectors into jobs with balanced
+predicted wall times.
+"""
+import os
+import glob
+import gzip
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from .job_manifest import det_num_from_filename
+
+
+__all__ = ['CcdJobSpec', 'read_process_info', 'CcdCostModel',
+           'consecutive_jobs', 'balanced_jobs']
+
+
+CcdJobSpec = namedtuple('CcdJobSpec', ['det_nums', 'wall_time', 'memory_GB'])
+
+
+def read_process_info(filename):
+    """
+    Read an imSim process_info file and return the elapsed time in
+    seconds and the peak memory in GB for rendering that CCD.  The
+    columns are identified from the header line, falling back to the
+    last column for the elapsed time if no time column is named.
+    """
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'rt') as fobj:
+        lines = fobj.readlines()
+    header = [_ for _ in lines if _.startswith('#')]
+    rows = [_.split() for _ in lines if _.strip() and not _.startswith('#')]
+    if not rows:
+        return np.nan, np.nan
+    data = np.array(rows, dtype=float)
+    columns = header[-1].lstrip('#').split() if header else []
+    if len(columns) != data.shape[1]:
+        columns = [''] * data.shape[1]
+    columns = [_.lower() for _ in columns]
+    time_cols = [i for i, _ in enumerate(columns) if 'time' in _]
+    mem_cols = [i for i, _ in enumerate(columns)
+                if 'rss' in _ or 'mem' in _]
+    wall_time = np.max(data[:, time_cols[0] if time_cols else -1])
+    peak_memory = np.max(data[:, mem_cols[0]]) if mem_cols else np.nan
+    return wall_time, peak_memory
+
+
+class CcdCostModel:
+    """
+    Estimates of the wall time and peak memory for rendering each CCD,
+    based on measurements from the process_info files of current and
+    prior runs.
+    """
+    columns = ['visit', 'det_num', 'wall_time', 'memory_GB']
+
+    def __init__(self, default_wall_time=600., default_memory_GB=6.):
+        """
+        Parameters
+        ----------
+        default_wall_time : float [600.]
+            Wall time estimate in seconds when there are no
+            measurements.
+        default_memory_GB : float [6.]
+            Memory estimate in GB when there are no measurements.
+        """
+        self.default_wall_time = default_wall_time
+        self.default_memory_GB = default_memory_GB
+        self.df = pd.DataFrame(columns=self.columns)
+        self._stats = None
+
+    def add_measurements(self, df):
+        """Add measurements in a data frame with the class columns."""
+        df = pd.concat([self.df, df[self.columns]], ignore_index=True)
+        self.df = df.drop_duplicates(['visit', 'det_num'], keep='last')
+        self._stats = None
+
+    def scan_output_dirs(self, visits, output_dir_format):
+        """
+        Read the process_info files in the output directories of the
+        specified visits.
+        """
+        data = []
+        for visit in visits:
+            pattern = os.path.join(output_dir_format % visit,
+                                   'process_info_*.txt*')
+            for filename in glob.glob(pattern):
+                wall_time, memory = read_process_info(filename)
+                data.append((visit, det_num_from_filename(filename),
+                             wall_time, memory))
+        if data:
+            self.add_measurements(pd.DataFrame(data, columns=self.columns))
+        return len(data)
+
+    def save(self, outfile):
+        """Write the measurements to a parquet file."""
+        self.df.to_parquet(outfile, index=False)
+
+    def load(self, infile):
+        """Add the measurements from a parquet file of a prior run."""
+        self.add_measurements(pd.read_parquet(infile))
+
+    def _compute_stats(self):
+        df = self.df.astype({'visit': int, 'det_num': int,
+                             'wall_time': float, 'memory_GB': float})
+        self._stats = dict(
+            ccd=df.set_index(['visit', 'det_num'])[
+                ['wall_time', 'memory_GB']],
+            det=df.groupby('det_num')[['wall_time', 'memory_GB']].median(),
+            visit=df.groupby('visit')[['wall_time', 'memory_GB']].median())
+
+    def estimate(self, visit, det_nums):
+        """
+        Return arrays of the estimated wall time in seconds and peak
+        memory in GB for the specified CCDs.  Measurements for the
+        CCD-visit itself are used if available; otherwise the median
+        of the measurements for the visit, then for the detector, are
+        used, and finally the default values.
+        """
+        if self._stats is None:
+            self._compute_stats()
+        wall_times = np.full(len(det_nums), np.nan)
+        memories = np.full(len(det_nums), np.nan)
+        ccd, det, visit_stats = (self._stats['ccd'], self._stats['det'],
+                                 self._stats['visit'])
+        for i, det_num in enumerate(det_nums):
+            for table, key in ((ccd, (visit, det_num)),
+                               (visit_stats, visit), (det, det_num)):
+                if key in table.index:
+                    row = table.loc[key]
+                    if np.isnan(wall_times[i]):
+                        wall_times[i] = row['wall_time']
+                    if np.isnan(memories[i]):
+                        memories[i] = row['memory_GB']
+        wall_times[np.isnan(wall_times)] = self.default_wall_time
+        memories[np.isnan(memories)] = self.default_memory_GB
+        return wall_times, memories
+
+
+def consecutive_jobs(det_list, nfiles):
+    """
+    Divide det_list into consecutive chunks of nfiles detectors.  The
+    wall time and memory of the returned job specs are None.
+    """
+    return [CcdJobSpec(list(det_list[i:i + nfiles]), None, None)
+            for i in range(0, len(det_list), nfiles)]
+
+
+def _process_makespan(wall_times, nproc):
+    """Makespan of the CCDs run greedily on nproc processes."""
+    loads = np.zeros(max(1, nproc))
+    for wall_time in sorted(wall_times, reverse=True):
+        loads[loads.argmin()] += wall_time
+    return loads.max()
+
+
+def balanced_jobs(det_list, wall_times, memories, nfiles, nproc,
+                  memory_margin=1.2):
+    """
+    Pack detectors into ceil(len(det_list)/nfiles) jobs of at most
+    nfiles detectors each, using longest-processing-time-first
+    assignment so that the predicted wall times are balanced.
+
+    Parameters
+    ----------
+    det_list : list
+        det_num values to render.
+    wall_times : array
+        Estimated wall time in seconds for each detector.
+    memories : array
+        Estimated peak memory in GB for each detector.
+    nfiles : int
+        Maximum number of detectors per job.
+    nproc : int
+        Number of processes per job.
+    memory_margin : float [1.2]
+        Factor applied to the summed peak memory of the nproc
+        largest CCDs in each job.
+
+    Returns
+    -------
+    list of CcdJobSpec
+    """
+    num_jobs = int(np.ceil(len(det_list)/nfiles))
+    members = [[] for _ in range(num_jobs)]
+    loads = np.zeros(num_jobs)
+    for index in np.argsort(-np.asarray(wall_times), kind='stable'):
+        open_jobs = [i for i in range(num_jobs) if len(members[i]) < nfiles]
+        job = min(open_jobs, key=lambda i: loads[i])
+        members[job].append(index)
+        loads[job] += wall_times[index]
+    jobs = []
+    for indexes in members:
+        job_nproc = min(nproc, len(indexes))
+        job_memories = sorted((memories[_] for _ in indexes), reverse=True)
+        jobs.append(CcdJobSpec(
+            sorted(det_list[_] for _ in indexes),
+            _process_makespan([wall_times[_] for _ in indexes], job_nproc),
+            memory_margin*sum(job_memories[:job_nproc])))
+    return jobs
@@ -0,0 +1,174 @@
+"""
+Node-local cache of job input files, such as the atm PSF pickles, so
+that the CCD jobs for a visit that run on the same node copy each file
+from the shared filesystem once instead of every galsim process
+reading it there.  Cached files are evicted in least-recently-used
+order to keep the cache under a size limit.
+"""
+import os
+import sys
+import glob
+import fcntl
+import shutil
+import hashlib
+import argparse
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+__all__ = ['CACHE_DIR_ENV', 'default_cache_dir', 'NodeCache']
+
+
+# Environment variable, set in the worker_init of the Parsl provider,
+# giving the node-local cache directory.
+CACHE_DIR_ENV = 'DESC_ROMAN_SIMS_CACHE'
+
+
+def default_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV,
+                          os.path.join(tempfile.gettempdir(),
+                                       'desc_roman_sims_cache'))
+
+
+@contextmanager
+def _file_lock(lock_file, blocking=True):
+    """
+    Hold an exclusive lock on lock_file, yielding True.  Since a lock
+    file is removed by the process that evicts its cached file, the
+    lock is retaken until it is held on the file currently at that
+    path.  If blocking is False and the lock is held by another
+    process, yield False without waiting.
+    """
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    while True:
+        with open(lock_file, 'a') as fobj:
+            try:
+                fcntl.flock(fobj, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                try:
+                    current = os.path.samestat(os.fstat(fobj.fileno()),
+                                               os.stat(lock_file))
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    yield True
+                    return
+            finally:
+                fcntl.flock(fobj, fcntl.LOCK_UN)
+
+
+class NodeCache:
+    """
+    Directory of local copies of input files with LRU eviction.
+    Access is coordinated between the processes on a node with file
+    locks, so concurrent tasks staging the same file copy it once.
+    """
+    def __init__(self, cache_dir=None, max_GB=50., protect_seconds=600.):
+        """
+        Parameters
+        ----------
+        cache_dir : str [None]
+            Cache directory.  If None, use default_cache_dir().
+        max_GB : float [50.]
+            Maximum total size of the cached files.
+        protect_seconds : float [600.]
+            Files used within this many seconds are not evicted, since
+            they may still be opened by running jobs.
+        """
+        self.cache_dir = default_cache_dir() if cache_dir is None \
+            else cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_GB*1024**3
+        self.protect_seconds = protect_seconds
+        self._lock_file = os.path.join(self.cache_dir, '.lock')
+
+    def local_path(self, src):
+        """Path of the cached copy of src."""
+        digest = hashlib.sha1(os.path.abspath(src).encode()).hexdigest()
+        return os.path.join(self.cache_dir,
+                            f"{digest[:12]}_{os.path.basename(src)}")
+
+    def cached_files(self):
+        """Return (mtime, size, path) tuples of the cached files."""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if (entry.name.startswith('.')
+                    or entry.name.endswith(('.lock', '.tmp'))):
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def usage_GB(self):
+        return sum(_[1] for _ in self.cached_files())/1024**3
+
+    def _evict(self, needed):
+        """
+        Remove the least recently used files, and their lock files,
+        to make room.  Files that are being staged by other processes
+        are skipped.
+        """
+        files = sorted(self.cached_files())
+        total = sum(_[1] for _ in files)
+        now = time.time()
+        for mtime, size, path in files:
+            if total + needed <= self.max_bytes:
+                break
+            if now - mtime < self.protect_seconds:
+                break
+            lock_file = path + '.lock'
+            with _file_lock(lock_file, blocking=False) as locked:
+                if not locked:
+                    continue
+                os.remove(path)
+                os.remove(lock_file)
+            total -= size
+
+    def _is_current(self, src, local):
+        if not os.path.isfile(local):
+            return False
+        return os.path.getsize(local) == os.path.getsize(src)
+
+    def stage(self, src):
+        """
+        Return the path of the local copy of src, copying it to the
+        cache if needed.  The file's modification time is updated on
+        each use to record its LRU position.
+        """
+        local = self.local_path(src)
+        with _file_lock(local + '.lock'):
+            if not self._is_current(src, local):
+                with _file_lock(self._lock_file):
+                    self._evict(os.path.getsize(src))
+                tmp_file = f"{local}.{os.getpid()}.tmp"
+                shutil.copyfile(src, tmp_file)
+                os.replace(tmp_file, local)
+            os.utime(local)
+        return local
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stage a file in the node-local cache and print the "
+        "path of the local copy.")
+    parser.add_argument('command', choices=('stage',))
+    parser.add_argument('pattern', type=str,
+                        help='file path or glob pattern matching one file')
+    parser.add_argument('--cache_dir', type=str, default=None)
+    parser.add_argument('--max_GB', type=float, default=50.)
+    args = parser.parse_args(argv)
+    matches = sorted(glob.glob(args.pattern))
+    if len(matches) != 1:
+        print(f"{len(matches)} files match {args.pattern}", file=sys.stderr)
+        return 1
+    cache = NodeCache(args.cache_dir, max_GB=args.max_GB)
+    print(cache.stage(matches[0]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Pipeline stage to find the CCD-visits that overlap a survey region.
+Visits are distributed in chunks over a process pool or Parsl workers,
+and the results for each chunk are written to disk as they complete so
+that an interrupted run can be resumed.
+"""
+import os
+import glob
+import time
+import argparse
+import functools
+from collections import defaultdict
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from .survey_region_ccds import SurveyRegion, OpSimData, CcdRegionFactory, \
+    ObsInfo, unit_vectors
+
+
+__all__ = ['mjd_selection', 'process_visits', 'completed_visits',
+           'consolidate', 'OverlapPipeline', 'main']
+
+
+def mjd_selection(mjd_range=None):
+    """
+    Return the sql WHERE clause selecting the OpSim visits in
+    mjd_range, or None if mjd_range is None.
+    """
+    if not mjd_range:
+        return None
+    return (f"where {mjd_range[0]} < observationStartMJD "
+            f"and observationStartMJD < {mjd_range[1]} ")
+
+
+def process_visits(visits, obs_infos, region_pars, fov_radius=None,
+                   template=None):
+    """
+    Find the CCDs overlapping the survey region for each visit.
+
+    Parameters
+    ----------
+    visits : list
+        OpSim observationId values.
+    obs_infos : list
+        ObsInfo tuples for each visit.
+    region_pars : tuple
+        (ra0, dec0, lon_size, lat_size) parameters of the SurveyRegion.
+    fov_radius : float [None]
+        Field-of-view radius passed to CcdRegionFactory.
+    template : FocalPlaneTemplates [None]
+        Focal plane templates.  If given, the CCD corners of all of
+        the visits are computed and tested against the region with
+        array operations instead of a CcdRegionFactory per visit.
+
+    Returns
+    -------
+    (list, pandas.DataFrame)
+        The processed visits and a data frame with visit, band, and
+        det_name columns for the overlapping CCDs.
+    """
+    region = SurveyRegion(*region_pars)
+    if template is not None:
+        return list(visits), _select_ccds_batch(visits, obs_infos, region,
+                                                template)
+    data = defaultdict(list)
+    for visit, obs_info in zip(visits, obs_infos):
+        factory = CcdRegionFactory(*obs_info, fov_radius=fov_radius,
+                                   template=template)
+        for det_name in sorted(factory.select_ccds(region)):
+            data['visit'].append(visit)
+            data['band'].append(obs_info.band)
+            data['det_name'].append(det_name)
+    return list(visits), pd.DataFrame(data, columns=['visit', 'band',
+                                                     'det_name'])
+
+
+def _select_ccds_batch(visits, obs_infos, region, template):
+    """
+    Select the overlapping CCDs for all of the visits with array
+    operations, using the focal plane template corners for the visits
+    in each band.
+    """
+    dfs = [pd.DataFrame(columns=['visit', 'band', 'det_name'])]
+    if len(visits) == 0:
+        return dfs[0]
+    visits = np.asarray(visits)
+    mjd, ra, dec, band, rottelpos \
+        = (np.asarray(_) for _ in zip(*obs_infos))
+    for band_value in np.unique(band):
+        index = np.where(band == band_value)[0]
+        det_names, corner_ra, corner_dec = template.corners(
+            mjd[index], ra[index], dec[index], band_value, rottelpos[index])
+        selected = region.engine.intersects(unit_vectors(corner_ra,
+                                                         corner_dec))
+        visit_index, det_index = np.nonzero(selected)
+        dfs.append(pd.DataFrame(
+            dict(visit=visits[index][visit_index], band=band_value,
+                 det_name=np.asarray(det_names)[det_index])))
+    return pd.concat(dfs, ignore_index=True) \
+        .sort_values(['visit', 'det_name'], ignore_index=True)
+
+
+def _write_parquet(df, outfile):
+    """Write the data frame atomically to outfile."""
+    tmp_file = outfile + '.tmp'
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, outfile)
+
+
+def completed_visits(outdir):
+    """Return the set of visits recorded as processed in outdir."""
+    visit_files = glob.glob(os.path.join(outdir, 'visits_*.parquet'))
+    if not visit_files:
+        return set()
+    return set(pd.concat([pd.read_parquet(_) for _ in visit_files])['visit'])
+
+
+def consolidate(outdir, outfile=None):
+    """
+    Concatenate the chunked CCD-visit results in outdir into a single
+    data frame, optionally writing it to outfile.
+    """
+    ccd_files = sorted(glob.glob(os.path.join(outdir, 'ccd_visits_*.parquet')))
+    if ccd_files:
+        df = pd.concat([pd.read_parquet(_) for _ in ccd_files],
+                       ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=['visit', 'band', 'det_name'])
+    df = df.sort_values(['visit', 'det_name'], ignore_index=True)
+    if outfile is not None:
+        _write_parquet(df, outfile)
+    return df
+
+
+class OverlapPipeline:
+    """
+    Find the CCD-visits overlapping a survey region in parallel,
+    streaming the results in chunks to an output directory.
+    """
+    def __init__(self, opsim_db_file, region_pars, outdir, mjd_range=None,
+                 fov_radius=None, chunk_size=100, template=None,
+                 index_file=None):
+        """
+        Parameters
+        ----------
+        opsim_db_file : str
+            OpSim db file.
+        region_pars : tuple
+            (ra0, dec0, lon_size, lat_size) in degrees.
+        outdir : str
+            Directory for the chunked output files.
+        mjd_range : tuple [None]
+            Range of observationStartMJD values to consider.
+        fov_radius : float [None]
+            Field-of-view radius in degrees.  If None, use the
+            CcdRegionFactory default.
+        chunk_size : int [100]
+            Number of visits per task and output file.
+        template : FocalPlaneTemplates [None]
+            Focal plane templates to use for approximate CCD corners.
+        index_file : str [None]
+            sqlite file for the OpSim spatial index.
+        """
+        self.region_pars = tuple(region_pars)
+        self.outdir = outdir
+        self.fov_radius = fov_radius
+        self.chunk_size = chunk_size
+        self.template = template
+        os.makedirs(self.outdir, exist_ok=True)
+
+        self.opsim_data = OpSimData(
+            opsim_db_file, mjd_selection(mjd_range),
+            region=SurveyRegion(*self.region_pars),
+            fov_radius=2.1 if fov_radius is None else fov_radius,
+            index_file=index_file)
+
+    def _chunks(self):
+        done = completed_visits(self.outdir)
+        df = self.opsim_data.df
+        df = df[~df['observationId'].isin(done)]
+        visits = list(df['observationId'])
+        obs_infos = [ObsInfo(*_) for _ in
+                     zip(*self.opsim_data.obs_infos(visits))]
+        if self.template is not None:
+            # Build the templates before they are sent to the workers.
+            for band in set(_.band for _ in obs_infos):
+                self.template[band]
+        for i in range(0, len(visits), self.chunk_size):
+            yield (visits[i:i + self.chunk_size],
+                   obs_infos[i:i + self.chunk_size])
+
+    def _next_chunk_index(self):
+        visit_files = glob.glob(os.path.join(self.outdir, 'visits_*.parquet'))
+        indexes = [int(os.path.basename(_)[len('visits_'):-len('.parquet')])
+                   for _ in visit_files]
+        return max(indexes, default=-1) + 1
+
+    def _write_chunk(self, index, visits, df):
+        _write_parquet(df, os.path.join(self.outdir,
+                                        f'ccd_visits_{index:06d}.parquet'))
+        # The visits file is written last since it marks the chunk
+        # as complete.
+        _write_parquet(pd.DataFrame(dict(visit=visits)),
+                       os.path.join(self.outdir,
+                                    f'visits_{index:06d}.parquet'))
+
+    def run(self, processes=None, parsl_executor=None):
+        """
+        Process all of the visits not already recorded in outdir.
+
+        Parameters
+        ----------
+        processes : int [None]
+            Number of worker processes for the process pool.  If None,
+            use os.cpu_count().
+        parsl_executor : str [None]
+            Label of a Parsl executor to use instead of the process
+            pool.  Parsl must already be loaded with a config that
+            includes this executor.
+
+        Returns
+        -------
+        int
+            Number of visits processed.
+        """
+        chunks = list(self._chunks())
+        num_visits = sum(len(_[0]) for _ in chunks)
+        print(f"{num_visits} visits to process in {len(chunks)} chunks",
+              flush=True)
+        if parsl_executor is not None:
+            import parsl
+            app = parsl.python_app(executors=[parsl_executor])(process_visits)
+            submit = app
+            pool = None
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes)
+            submit = functools.partial(pool.submit, process_visits)
+        t0 = time.time()
+        num_done = 0
+        index = self._next_chunk_index()
+        try:
+            futures = [submit(visits, obs_infos, self.region_pars,
+                              fov_radius=self.fov_radius,
+                              template=self.template)
+                       for visits, obs_infos in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                visits, df = future.result()
+                self._write_chunk(index, visits, df)
+                index += 1
+                num_done += len(visits)
+                dt = time.time() - t0
+                print(f"{num_done}/{num_visits} visits, "
+                      f"{num_done/dt:.2f} visits/s", flush=True)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return num_done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find the CCD-visits overlapping a survey region.")
+    parser.add_argument('ra0', type=float, help='RA of region center (deg)')
+    parser.add_argument('dec0', type=float, help='Dec of region center (deg)')
+    parser.add_argument('size', type=float,
+                        help='Side length of the square region (deg)')
+    parser.add_argument('--opsim_db_file', type=str,
+                        default=os.environ.get('OPSIM_DB_FILE'),
+                        help='OpSim db file [$OPSIM_DB_FILE]')
+    parser.add_argument('--mjd_range', type=float, nargs=2, default=None,
+                        help='Range of observationStartMJD values')
+    parser.add_argument('--fov_radius', type=float, default=None,
+                        help='Field-of-view radius (deg)')
+    parser.add_argument('--outdir', type=str, default='ccd_visits',
+                        help='Directory for the chunked output')
+    parser.add_argument('--outfile', type=str, default=None,
+                        help='Consolidated output parquet file')
+    parser.add_argument('--catalog_dir', type=str, default=None,
+                        help='CcdVisitCatalog directory to append to')
+    parser.add_argument('--chunk_size', type=int, default=100,
+                        help='Number of visits per chunk')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('--index_file', type=str, default=None,
+                        help='sqlite file for the OpSim spatial index')
+    parser.add_argument('--use_template', action='store_true', default=False,
+                        help='Use focal plane templates for CCD corners')
+    args = parser.parse_args(argv)
+
+    template = None
+    if args.use_template:
+        from .focal_plane_template import FocalPlaneTemplates
+        template = FocalPlaneTemplates()
+
+    pipeline = OverlapPipeline(args.opsim_db_file,
+                               (args.ra0, args.dec0, args.size, args.size),
+                               args.outdir, mjd_range=args.mjd_range,
+                               fov_radius=args.fov_radius,
+                               chunk_size=args.chunk_size, template=template,
+                               index_file=args.index_file)
+    pipeline.run(processes=args.processes)
+    if args.outfile is not None or args.catalog_dir is not None:
+        df = consolidate(args.outdir, args.outfile)
+    if args.outfile is not None:
+        print(f"wrote {len(df)} CCD-visits to {args.outfile}")
+    if args.catalog_dir is not None:
+        from .ccd_visit_catalog import CcdVisitCatalog
+        num_added = CcdVisitCatalog(args.catalog_dir).append(df)
+        print(f"added {num_added} CCD-visits to {args.catalog_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,181 @@
 import parsl
+import parsl.providers
 from parsl.addresses import address_by_hostname
 from parsl.config import Config
-from parsl.executors import WorkQueueExecutor, ThreadPoolExecutor
+from parsl.executors import WorkQueueExecutor, ThreadPoolExecutor, \
+    HighThroughputExecutor
 from parsl.monitoring.monitoring import MonitoringHub
 from parsl.providers import LocalProvider
+from desc_roman_sims.node_cache import CACHE_DIR_ENV
 
 
-__all__ = ["load_wq_config"]
+__all__ = ["load_wq_config", "load_dry_run_config", "make_provider",
+           "tasks_per_node", "scaling_parallelism"]
+
+
+# Provider classes that can be selected by name in make_provider.
+_PROVIDER_CLASSES = {'local': 'LocalProvider',
+                     'slurm': 'SlurmProvider',
+                     'pbspro': 'PBSProProvider'}
 
 
 def work_queue_executor(label="work_queue",
                         worker_options="--memory=182000",  # Theta max - 10GB
                         port=9000,
-                        provider=None):
+                        provider=None,
+                        max_retries=1,
+                        shared_fs=True):
     return WorkQueueExecutor(
-        label="work_queue",
+        label=label,
         port=port,
-        shared_fs=True,
+        shared_fs=shared_fs,
         autolabel=False,
-        max_retries=1,
+        max_retries=max_retries,
         worker_options=worker_options,
         provider=provider)
 
 
-def local_provider(nodes_per_block=1):
-    provider_options = dict(nodes_per_block=nodes_per_block,
-                            init_blocks=0,
-                            min_blocks=0,
-                            max_blocks=1,
-                            parallelism=0,
-                            cmd_timeout=300)
-    return LocalProvider(**provider_options)
+def warm_worker_executor(label="warm_pool", max_workers=1, provider=None,
+                         mem_per_worker=None):
+    """
+    HighThroughputExecutor whose persistent worker processes run the
+    galsim_worker functions, keeping imsim imported and the parsed
+    per-visit configs cached between jobs.  If mem_per_worker (in GB) is given,
+    the number of workers per node is also limited by the node memory.
+    """
+    if provider is None:
+        provider = LocalProvider(init_blocks=1, min_blocks=1, max_blocks=1)
+    return HighThroughputExecutor(label=label,
+                                  max_workers_per_node=max_workers,
+                                  mem_per_worker=mem_per_worker,
+                                  provider=provider)
+
+
+def tasks_per_node(node_memory, task_memory, cores=None):
+    """
+    Number of tasks that fit on a node, given the node memory and
+    the memory per task in the same units, and optionally the number
+    of cores.
+    """
+    ntasks = max(1, int(node_memory // task_memory))
+    if cores is not None:
+        ntasks = min(ntasks, cores)
+    return ntasks
+
+
+def scaling_parallelism(node_memory, task_memory, cores=None):
+    """
+    Parallelism for the Parsl scaling strategy of a WorkQueue executor
+    such that one block is requested for each block's worth of queued
+    tasks.  The strategy counts workers_per_node*nodes_per_block task
+    slots per block, and a WorkQueue executor has one worker per node
+    that runs tasks_per_node tasks, so the number of nodes per block
+    is already accounted for by the strategy.
+    """
+    return 1./tasks_per_node(node_memory, task_memory, cores=cores)
+
+
+def make_provider(name='local', nodes_per_block=1, init_blocks=0,
+                  min_blocks=0, max_blocks=1, parallelism=0,
+                  **provider_options):
+    """
+    Create a Parsl execution provider with the specified block
+    scaling parameters.
+
+    Parameters
+    ----------
+    name : str ['local']
+        Provider type: 'local', 'slurm', or 'pbspro'.
+    nodes_per_block : int [1]
+        Nodes per block.
+    init_blocks : int [0]
+        Number of blocks to start with.
+    min_blocks : int [0]
+        Minimum number of blocks to keep.
+    max_blocks : int [1]
+        Maximum number of blocks.
+    parallelism : float [0]
+        Ratio of requested task slots to outstanding tasks used by the
+        Parsl scaling strategy.
+    provider_options : dict
+        Additional provider-specific options, e.g., account, walltime,
+        launcher, or worker_init for batch-scheduler providers.
+    """
+    provider_class = getattr(parsl.providers, _PROVIDER_CLASSES[name])
+    if name == 'local':
+        provider_options.setdefault('cmd_timeout', 300)
+    return provider_class(nodes_per_block=nodes_per_block,
+                          init_blocks=init_blocks,
+                          min_blocks=min_blocks,
+                          max_blocks=max_blocks,
+                          parallelism=parallelism,
+                          **provider_options)
+
+
+def local_provider(nodes_per_block=1, init_blocks=0, min_blocks=0,
+                   max_blocks=1, parallelism=0):
+    return make_provider('local', nodes_per_block=nodes_per_block,
+                         init_blocks=init_blocks, min_blocks=min_blocks,
+                         max_blocks=max_blocks, parallelism=parallelism)
 
 
 def load_wq_config(memory=182000, port=9001, hub_port=None,
                    monitor=True, monitoring_interval=3*60,
                    max_threads=1, use_work_queue=True,
-                   run_dir='runinfo'):
+                   run_dir='runinfo', warm_workers=0, provider=None,
+                   nodes_per_block=1, init_blocks=0, min_blocks=0,
+                   max_blocks=1, parallelism=None, task_memory=None,
+                   max_idletime=120., provider_options=None,
+                   node_cache_dir=None):
+    """
+    Load a Parsl config with a thread pool executor and, optionally,
+    a WorkQueue executor and a warm-worker executor.
+
+    The WorkQueue workers are launched in blocks by the provider,
+    which can be a provider object or the name of a provider type
+    (see make_provider).  Blocks are added as the task backlog grows,
+    up to max_blocks, and idle blocks are released after max_idletime
+    seconds, down to min_blocks.  If task_memory (in MB) is given and
+    parallelism is None, the parallelism is set so that one block is
+    requested for each block's worth of queued tasks, where the number
+    of tasks per node is set by memory/task_memory.  Multiple
+    LocalProvider blocks can be used to test the scaling on a single
+    host.
+
+    If node_cache_dir is given, e.g., a node-local scratch directory,
+    the workers' DESC_ROMAN_SIMS_CACHE variable is set to it, via the
+    worker_init of a provider created here, for the node-local staging
+    of the GalSimJobGenerator inputs.
+    """
     executors = [ThreadPoolExecutor(max_threads=max(1, max_threads),
                                     label="thread_pool")]
 
     if use_work_queue:
-        provider = local_provider()
+        if parallelism is None:
+            parallelism = 0
+            if task_memory is not None:
+                parallelism = scaling_parallelism(memory, task_memory)
+        if provider is None or isinstance(provider, str):
+            provider_options = dict(provider_options or {})
+            if node_cache_dir is not None:
+                provider_options['worker_init'] = (
+                    f"export {CACHE_DIR_ENV}={node_cache_dir}; "
+                    + provider_options.get('worker_init', ''))
+            provider = make_provider(provider or 'local',
+                                     nodes_per_block=nodes_per_block,
+                                     init_blocks=init_blocks,
+                                     min_blocks=min_blocks,
+                                     max_blocks=max_blocks,
+                                     parallelism=parallelism,
+                                     **provider_options)
         worker_options = f"--memory={memory}"
         executors.append(work_queue_executor(worker_options=worker_options,
                                              port=port,
                                              provider=provider))
 
+    if warm_workers > 0:
+        executors.append(warm_worker_executor(max_workers=warm_workers))
+
     if monitor:
         monitoring = MonitoringHub(
             hub_address=address_by_hostname(),
@@ -56,6 +185,39 @@ def load_wq_config(memory=182000, port=9001, hub_port=None,
         monitoring = None
 
     config = Config(executors=executors, monitoring=monitoring,
-                    run_dir=run_dir)
+                    run_dir=run_dir, strategy='simple',
+                    max_idletime=max_idletime)
 
     return parsl.load(config)
+
+
+def load_dry_run_config(max_workers=8, use_processes=False,
+                        label="dry_run", run_dir='runinfo'):
+    """
+    Load a Parsl config for GalSimJobGenerator dry runs, with the
+    thread pool executor for the clean-up tasks and a local executor,
+    labeled by label, for the simulated tasks.  Pass the label as the
+    bash_app_executor of the GalSimJobGenerator.
+
+    Parameters
+    ----------
+    max_workers : int [8]
+        Number of task slots of the local executor.
+    use_processes : bool [False]
+        If True, run the simulated tasks in a HighThroughputExecutor
+        with local worker processes; otherwise use a thread pool.
+    label : str ['dry_run']
+        Label of the local executor.
+    run_dir : str ['runinfo']
+        Parsl run directory.
+    """
+    executors = [ThreadPoolExecutor(max_threads=1, label="thread_pool")]
+    if use_processes:
+        executors.append(HighThroughputExecutor(
+            label=label, max_workers_per_node=max_workers,
+            provider=LocalProvider(init_blocks=1, min_blocks=1,
+                                   max_blocks=1)))
+    else:
+        executors.append(ThreadPoolExecutor(max_threads=max_workers,
+                                            label=label))
+    return parsl.load(Config(executors=executors, run_dir=run_dir))
@@ -0,0 +1,145 @@
+"""
+Vectorized intersection and containment tests of many convex spherical
+polygons, e.g., the CCDs of many visits, against a convex region
+polygon.  The polygons are given by the unit vectors of their vertices
+in arrays of shape (..., n_vertices, 3), with the vertices in order
+around each polygon, so that the tests run as array operations instead
+of one lsst.sphgeom.ConvexPolygon at a time.
+"""
+import numpy as np
+
+
+__all__ = ['polygon_vertices', 'interior_normals', 'ConvexPolygonEngine',
+           'validate_against_sphgeom']
+
+
+def polygon_vertices(polygon):
+    """
+    Return the vertices of an lsst.sphgeom.ConvexPolygon as an array
+    of shape (n_vertices, 3).
+    """
+    return np.array([(_.x(), _.y(), _.z()) for _ in polygon.getVertices()])
+
+
+def interior_normals(vertices):
+    """
+    Return the normals of the great circles through the consecutive
+    vertices of each polygon, oriented toward the polygon interiors.
+    The input has shape (..., n_vertices, 3), as does the output.
+    """
+    normals = np.cross(vertices, np.roll(vertices, -1, axis=-2))
+    centroids = vertices.sum(axis=-2, keepdims=True)
+    signs = np.sign(np.sum(normals*centroids, axis=-1, keepdims=True))
+    return normals*np.where(signs == 0, 1., signs)
+
+
+class ConvexPolygonEngine:
+    """
+    Bulk relationship tests of convex polygons against a convex region
+    polygon.  Two convex polygons intersect if a vertex of either one
+    lies inside the other or if a pair of their edges cross; the
+    region contains a polygon if all of the polygon's vertices lie
+    inside it.  Points on the boundary count as inside.
+    """
+    def __init__(self, region, chunk_size=100000):
+        """
+        Parameters
+        ----------
+        region : SurveyRegion, lsst.sphgeom.ConvexPolygon, or np.ndarray
+            The region polygon, or its vertices as an array of shape
+            (n_vertices, 3).
+        chunk_size : int [100000]
+            Number of polygons processed per array operation, which
+            bounds the memory of the temporary arrays.
+        """
+        if hasattr(region, 'polygon'):
+            region = region.polygon
+        if not isinstance(region, np.ndarray):
+            region = polygon_vertices(region)
+        self.vertices = np.asarray(region, dtype=float)
+        self.next_vertices = np.roll(self.vertices, -1, axis=0)
+        self.normals = interior_normals(self.vertices)
+        self.edge_planes = np.cross(self.vertices, self.next_vertices)
+        self.chunk_size = chunk_size
+
+    def contains_points(self, vectors):
+        """
+        Return a boolean array indicating which unit vectors, given
+        as an array with final axis of length 3, lie in the region.
+        """
+        return np.all(np.dot(vectors, self.normals.T) >= 0, axis=-1)
+
+    def _relate(self, vectors):
+        # vectors has shape (n, k, 3).
+        inside = self.contains_points(vectors)
+        contains = np.all(inside, axis=-1)
+        intersects = np.any(inside, axis=-1)
+
+        # Region vertices inside the polygons.
+        normals = interior_normals(vectors)
+        region_inside = np.all(
+            np.einsum('mj,nkj->nmk', self.vertices, normals) >= 0, axis=-1)
+        intersects |= np.any(region_inside, axis=-1)
+
+        # Edge crossings, using the predicates of S2's SimpleCrossing
+        # for the edges (a, b) of the polygons and (c, d) of the region.
+        a = vectors
+        b = np.roll(vectors, -1, axis=-2)
+        ab = np.cross(a, b)
+        acb = -np.einsum('nkj,mj->nkm', ab, self.vertices)
+        bda = np.einsum('nkj,mj->nkm', ab, self.next_vertices)
+        cbd = -np.einsum('mj,nkj->nkm', self.edge_planes, b)
+        dac = np.einsum('mj,nkj->nkm', self.edge_planes, a)
+        crossing = (acb*bda > 0) & (acb*cbd > 0) & (acb*dac > 0)
+        intersects |= np.any(crossing, axis=(-2, -1))
+        return intersects, contains
+
+    def relate(self, vectors):
+        """
+        Return boolean arrays of the intersection and containment flags
+        of the polygons with vertices given by vectors, an array of
+        shape (..., n_vertices, 3), e.g., (n_visits, n_ccds, 4, 3).
+        The output arrays have the shape of the leading axes.
+        """
+        vectors = np.asarray(vectors, dtype=float)
+        shape = vectors.shape[:-2]
+        flat = vectors.reshape((-1,) + vectors.shape[-2:])
+        intersects = np.zeros(len(flat), dtype=bool)
+        contains = np.zeros(len(flat), dtype=bool)
+        for start in range(0, len(flat), self.chunk_size):
+            end = start + self.chunk_size
+            intersects[start:end], contains[start:end] \
+                = self._relate(flat[start:end])
+        return intersects.reshape(shape), contains.reshape(shape)
+
+    def intersects(self, vectors):
+        """Return the intersection flags.  See relate."""
+        return self.relate(vectors)[0]
+
+    def contains(self, vectors):
+        """Return the containment flags.  See relate."""
+        return self.relate(vectors)[1]
+
+
+def validate_against_sphgeom(engine, vectors):
+    """
+    Compare the engine's flags with lsst.sphgeom relate for each
+    polygon in vectors, an array of shape (..., n_vertices, 3), and
+    return the number of polygons for which they differ.
+    """
+    import lsst.sphgeom
+    intersects, contains = engine.relate(vectors)
+    region = lsst.sphgeom.ConvexPolygon(
+        [lsst.sphgeom.UnitVector3d(*_) for _ in engine.vertices])
+    vectors = np.asarray(vectors).reshape((-1,) + np.shape(vectors)[-2:])
+    mismatches = 0
+    for polygon_vectors, intersect, contain in zip(
+            vectors, intersects.ravel(), contains.ravel()):
+        polygon = lsst.sphgeom.ConvexPolygon(
+            [lsst.sphgeom.UnitVector3d(*_) for _ in polygon_vectors])
+        relationship = region.relate(polygon)
+        expected_contains = bool(relationship & lsst.sphgeom.CONTAINS)
+        expected_intersects = not relationship & lsst.sphgeom.DISJOINT
+        if (intersect, contain) != (expected_intersects, expected_contains):
+            mismatches += 1
+    return mismatches
@@ -0,0 +1,168 @@
+"""
+Scheduler for the atmospheric PSF jobs that limits the number of
+visits ahead of the CCD queue for which PSFs are generated and the
+number of PSF files that are being generated or kept on disk.
+"""
+import heapq
+import threading
+from concurrent.futures import Future
+
+
+__all__ = ['PsfScheduler']
+
+
+class PsfScheduler:
+    """
+    Submit PSF jobs in the order of the visits in the CCD queue,
+    subject to a lookahead window and caps on the number of PSF jobs
+    running and on the number of PSF files in flight.  The CCD jobs
+    for a visit depend on a gate future that is resolved when the PSF
+    job for that visit finishes.  If the PSF file budget is held only
+    by files of finished visits that could not be removed, so that no
+    more PSF jobs can be submitted, the pending gates are failed with
+    a RuntimeError rather than left unresolved.
+    """
+    def __init__(self, submit, visits, lookahead=None, max_psf_jobs=None,
+                 max_psf_files=None):
+        """
+        Parameters
+        ----------
+        submit : callable
+            Function that takes a visit and returns the future of the
+            job that generates the PSF file for that visit.
+        visits : list
+            Visits in CCD queue order.
+        lookahead : int [None]
+            Maximum number of visits, starting from the earliest visit
+            with unfinished CCDs, for which PSFs can be generated.  If
+            None, there is no limit.
+        max_psf_jobs : int [None]
+            Maximum number of PSF jobs running at once.  If None, there
+            is no limit.
+        max_psf_files : int [None]
+            Maximum number of PSF files being generated or on disk.
+            Files are counted until their visit is released after the
+            atm_psf clean-up.  If None, there is no limit.
+        """
+        self._submit = submit
+        self._positions = {visit: i for i, visit in enumerate(visits)}
+        self.lookahead = lookahead
+        self.max_psf_jobs = max_psf_jobs
+        self.max_psf_files = max_psf_files
+        self._lock = threading.RLock()
+        self._pending = []
+        self._unfinished = []
+        self._finished = set()
+        self._gates = {}
+        self._holds_file = set()
+        self.running_jobs = 0
+        self.psf_files = 0
+        self.peak_psf_files = 0
+        self.submitted = 0
+
+    def register(self, visit, psf_file_exists=False):
+        """
+        Register a visit whose CCD jobs are being created and return
+        the list of futures that those jobs should depend on.
+        """
+        with self._lock:
+            position = self._positions[visit]
+            heapq.heappush(self._unfinished, position)
+            if psf_file_exists:
+                self._add_file(visit)
+                return []
+            gate = Future()
+            self._gates[visit] = gate
+            heapq.heappush(self._pending, (position, visit))
+            stalled = self._pump()
+        self._fail(stalled)
+        return [gate]
+
+    def release(self, visit, file_removed=True):
+        """
+        Mark the CCDs of visit as finished and, if file_removed is
+        True, its PSF file as removed from disk.
+        """
+        with self._lock:
+            self._finished.add(self._positions[visit])
+            if file_removed and visit in self._holds_file:
+                self._holds_file.remove(visit)
+                self.psf_files -= 1
+            stalled = self._pump()
+        self._fail(stalled)
+
+    def _add_file(self, visit):
+        self._holds_file.add(visit)
+        self.psf_files += 1
+        self.peak_psf_files = max(self.peak_psf_files, self.psf_files)
+
+    def _window_start(self):
+        while self._unfinished and self._unfinished[0] in self._finished:
+            heapq.heappop(self._unfinished)
+        return self._unfinished[0] if self._unfinished else 0
+
+    def _can_submit(self, position):
+        if (self.max_psf_jobs is not None
+                and self.running_jobs >= self.max_psf_jobs):
+            return False
+        if (self.max_psf_files is not None
+                and self.psf_files >= self.max_psf_files):
+            return False
+        if (self.lookahead is not None
+                and position >= self._window_start() + self.lookahead):
+            return False
+        return True
+
+    def _pump(self):
+        """
+        Submit the pending PSF jobs allowed by the caps, and return the
+        gates of the pending visits if the scheduler has stalled.
+        """
+        while self._pending and self._can_submit(self._pending[0][0]):
+            _, visit = heapq.heappop(self._pending)
+            self.running_jobs += 1
+            self.submitted += 1
+            self._add_file(visit)
+            future = self._submit(visit)
+            future.add_done_callback(
+                lambda future, visit=visit: self._job_done(visit, future))
+        if not self._is_stalled():
+            return []
+        gates = []
+        while self._pending:
+            _, visit = heapq.heappop(self._pending)
+            gates.append(self._gates.pop(visit))
+        return gates
+
+    def _is_stalled(self):
+        """
+        True if there are pending visits, but the file budget is used
+        up by visits whose CCDs have finished, so it can never be
+        freed.
+        """
+        return (bool(self._pending) and self.running_jobs == 0
+                and self.max_psf_files is not None
+                and self.psf_files >= self.max_psf_files
+                and all(self._positions[_] in self._finished
+                        for _ in self._holds_file))
+
+    def _fail(self, gates):
+        for gate in gates:
+            gate.set_exception(RuntimeError(
+                "The PSF file budget is used up by atm_psf files that "
+                "could not be removed."))
+
+    def _job_done(self, visit, future):
+        with self._lock:
+            self.running_jobs -= 1
+            exception = future.exception()
+            if exception is not None and visit in self._holds_file:
+                self._holds_file.remove(visit)
+                self.psf_files -= 1
+            stalled = self._pump()
+            gate = self._gates.pop(visit)
+        self._fail(stalled)
+        if exception is None:
+            gate.set_result(future.result())
+        else:
+            gate.set_exception(exception)
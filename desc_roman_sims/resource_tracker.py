@@ -0,0 +1,186 @@
+"""
+Adaptive memory requests for the PSF and CCD jobs.  Observed peak
+memory is used to lower the requests over time, and jobs that fail on
+memory are resubmitted with larger requests up to a cap.
+"""
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+
+
+__all__ = ['ResourceTracker', 'EscalatingFuture', 'is_memory_failure']
+
+
+# Failure reason given by the WorkQueue executor for a task that was
+# stopped for exceeding its resource request.
+RESOURCE_EXHAUSTION_REASON = "task used more resources than requested"
+
+
+def is_memory_failure(exception):
+    """
+    Return True if the exception from an app future indicates that
+    the task ran out of memory, i.e., a python_app raised MemoryError,
+    a bash_app was killed with SIGKILL, or the WorkQueue executor
+    reported resource exhaustion.  The exceptions wrapped by the
+    executor are also checked.
+    """
+    while exception is not None:
+        if isinstance(exception, MemoryError):
+            return True
+        if getattr(exception, 'exitcode', None) in (137, -9):
+            return True
+        reason = getattr(exception, 'reason', None)
+        if isinstance(reason, str) and RESOURCE_EXHAUSTION_REASON in reason:
+            return True
+        exception = exception.__cause__
+    return False
+
+
+class ResourceTracker:
+    """
+    Track the requested and observed peak memory, in MB, of jobs keyed
+    by (job_type, ndets), where ndets is the number of detectors that
+    are rendered concurrently.
+    """
+    def __init__(self, cap_MB=None, margin=1.2, min_samples=5,
+                 escalation_factor=1.5):
+        """
+        Parameters
+        ----------
+        cap_MB : float [None]
+            Maximum memory request in MB.  If None, then there is no cap.
+        margin : float [1.2]
+            Factor applied to the largest observed peak memory when
+            computing a request.
+        min_samples : int [5]
+            Number of observations needed before the requests for a
+            key are lowered from the default.
+        escalation_factor : float [1.5]
+            Factor by which a request is increased after a job fails
+            on memory.
+        """
+        self.cap_MB = cap_MB
+        self.margin = margin
+        self.min_samples = min_samples
+        self.escalation_factor = escalation_factor
+        self._lock = threading.Lock()
+        self._peaks = defaultdict(list)
+        self._floors = defaultdict(int)
+        self.reserved_MB = 0
+        self.observed_MB = 0
+        self.escalations = []
+
+    def request(self, key, default_MB):
+        """Return the memory request in MB for a new job."""
+        with self._lock:
+            peaks = self._peaks[key]
+            memory = default_MB
+            if len(peaks) >= self.min_samples:
+                memory = min(default_MB, math.ceil(self.margin*max(peaks)))
+            memory = max(memory, self._floors[key])
+        if self.cap_MB is not None:
+            memory = min(memory, self.cap_MB)
+        return int(memory)
+
+    def record(self, key, requested_MB, peak_MB=None):
+        """Record a successful job and, if available, its peak memory."""
+        with self._lock:
+            if peak_MB is not None:
+                self._peaks[key].append(peak_MB)
+                self.reserved_MB += requested_MB
+                self.observed_MB += peak_MB
+
+    def escalate(self, key, requested_MB):
+        """
+        Return the memory request for resubmitting a job that failed
+        on memory, or None if the request is already at the cap.
+        """
+        memory = math.ceil(requested_MB*self.escalation_factor)
+        if self.cap_MB is not None:
+            if requested_MB >= self.cap_MB:
+                return None
+            memory = min(memory, self.cap_MB)
+        with self._lock:
+            self._floors[key] = max(self._floors[key], memory)
+            self.escalations.append((key, requested_MB, memory))
+        return int(memory)
+
+    @property
+    def efficiency(self):
+        """Ratio of observed peak memory to reserved memory."""
+        if self.reserved_MB == 0:
+            return None
+        return self.observed_MB/self.reserved_MB
+
+    def report(self):
+        """Return a summary of the escalations and reservation efficiency."""
+        lines = [f"memory escalations: {len(self.escalations)}"]
+        for (job_type, ndets), old, new in self.escalations:
+            lines.append(f"  {job_type} ndets={ndets}: {old} -> {new} MB")
+        efficiency = self.efficiency
+        if efficiency is not None:
+            lines.append(f"reservation efficiency: {efficiency:.2f}")
+        for (job_type, ndets), peaks in sorted(self._peaks.items()):
+            lines.append(f"  {job_type} ndets={ndets}: {len(peaks)} jobs, "
+                         f"max peak {max(peaks):.0f} MB")
+        return "\n".join(lines)
+
+
+class EscalatingFuture(Future):
+    """
+    Future for a job that is resubmitted with a larger memory request
+    each time it fails on memory, until it succeeds or the request
+    reaches the cap of the ResourceTracker.
+    """
+    def __init__(self, submit, tracker, key, memory_MB, observe=None):
+        """
+        Parameters
+        ----------
+        submit : callable
+            Function that takes the memory request in MB and a retry
+            flag, which is True for resubmissions, and returns the
+            future for a job attempt.  Parsl memoizes failed tasks,
+            so retries should be submitted through an uncached app.
+        tracker : ResourceTracker
+            Tracker to record the outcome of each attempt.
+        key : tuple
+            (job_type, ndets) key for the tracker.
+        memory_MB : int
+            Memory request for the first attempt.
+        observe : callable [None]
+            Function returning the peak memory in MB of a successful
+            attempt, or None if it is not available.
+        """
+        super().__init__()
+        self._submit = submit
+        self._tracker = tracker
+        self._key = key
+        self._observe = observe
+        self.attempts = []
+        self._launch(memory_MB)
+
+    def _launch(self, memory_MB):
+        self.memory_MB = memory_MB
+        attempt = self._submit(memory_MB, retry=bool(self.attempts))
+        self.attempts.append(attempt)
+        attempt.add_done_callback(self._attempt_done)
+
+    def _attempt_done(self, attempt):
+        exception = attempt.exception()
+        if exception is None:
+            try:
+                peak = self._observe() if self._observe is not None else None
+            except (OSError, ValueError):
+                peak = None
+            self._tracker.record(self._key, self.memory_MB, peak)
+            self.set_result(attempt.result())
+            return
+        if is_memory_failure(exception):
+            memory = self._tracker.escalate(self._key, self.memory_MB)
+            if memory is not None:
+                print(f"resubmitting {self._key} job with {memory} MB",
+                      flush=True)
+                self._launch(memory)
+                return
+        self.set_exception(exception)
@@ -0,0 +1,150 @@
+"""
+Ordering of visits by sky position and band so that consecutive jobs
+read the same skyCatalogs files, which are partitioned by HEALPix
+pixel, and so hit a warm page cache or node-local cache.
+"""
+from collections import OrderedDict
+import numpy as np
+
+
+__all__ = ['ang2pix_ring', 'fov_tiles', 'catalog_reuse_rate',
+           'sky_order', 'order_visits']
+
+
+def ang2pix_ring(nside, ra, dec):
+    """
+    HEALPix RING-scheme pixel indexes of the positions, given in
+    degrees, for the specified nside.
+    """
+    ra, dec = np.broadcast_arrays(np.asarray(ra, dtype=float),
+                                  np.asarray(dec, dtype=float))
+    z = np.sin(np.radians(dec))
+    za = np.abs(z)
+    tt = (np.radians(ra) % (2.*np.pi))/(np.pi/2.)
+    pix = np.zeros(z.shape, dtype=np.int64)
+
+    # Equatorial region.
+    eq = za <= 2./3.
+    temp1 = nside*(0.5 + tt[eq])
+    temp2 = nside*z[eq]*0.75
+    jp = (temp1 - temp2).astype(np.int64)
+    jm = (temp1 + temp2).astype(np.int64)
+    ir = nside + 1 + jp - jm
+    kshift = 1 - (ir & 1)
+    ip = ((jp + jm - nside + kshift + 1)//2) % (4*nside)
+    pix[eq] = 2*nside*(nside - 1) + (ir - 1)*4*nside + ip
+
+    # Polar caps.
+    cap = ~eq
+    tp = tt[cap] - np.floor(tt[cap])
+    tmp = nside*np.sqrt(3.*(1. - za[cap]))
+    jp = (tp*tmp).astype(np.int64)
+    jm = ((1. - tp)*tmp).astype(np.int64)
+    ir = jp + jm + 1
+    ip = (tt[cap]*ir).astype(np.int64) % (4*ir)
+    pix[cap] = np.where(z[cap] > 0, 2*ir*(ir - 1) + ip,
+                        12*nside**2 - 2*ir*(ir + 1) + ip)
+    return pix
+
+
+def fov_tiles(ra, dec, fov_radius=2.1, nside=32, spacing=0.25):
+    """
+    Return a list of the sets of HEALPix pixels overlapping the FOV of
+    each pointing, found by sampling the FOV on a grid of points
+    spaced by spacing degrees.  nside=32 is the skyCatalogs
+    partitioning.
+    """
+    # Rings of points out to the FOV edge, spaced by at most spacing.
+    radii = np.linspace(0., fov_radius,
+                        int(np.ceil(fov_radius/spacing)) + 1)
+    points = [(0., 0.)]
+    for radius in radii[1:]:
+        num = int(np.ceil(2.*np.pi*radius/spacing))
+        points.extend((radius, 2.*np.pi*_/num) for _ in range(num))
+    points = np.array(points)
+    r = np.radians(points[:, 0])
+    p = points[:, 1]
+    ra0 = np.radians(np.atleast_1d(ra))[:, None]
+    dec0 = np.radians(np.atleast_1d(dec))[:, None]
+    dec1 = np.arcsin(np.sin(dec0)*np.cos(r)
+                     + np.cos(dec0)*np.sin(r)*np.cos(p))
+    ra1 = ra0 + np.arctan2(np.sin(p)*np.sin(r)*np.cos(dec0),
+                           np.cos(r) - np.sin(dec0)*np.sin(dec1))
+    pixels = ang2pix_ring(nside, np.degrees(ra1), np.degrees(dec1))
+    return [set(_) for _ in pixels]
+
+
+def catalog_reuse_rate(tile_sets, cache_size=32):
+    """
+    Fraction of the catalog-file reads for the sequence of visits,
+    given by their sets of tiles, that hit an LRU cache holding the
+    files of cache_size tiles.
+    """
+    cache = OrderedDict()
+    hits = 0
+    reads = 0
+    for tiles in tile_sets:
+        for tile in tiles:
+            reads += 1
+            if tile in cache:
+                hits += 1
+                cache.move_to_end(tile)
+            else:
+                cache[tile] = True
+                if len(cache) > cache_size:
+                    cache.popitem(last=False)
+    return hits/reads if reads else 0.
+
+
+def sky_order(visits, ra, dec, band, mjd=None, nside=32):
+    """
+    Return the visits sorted by HEALPix tile of the boresight, with
+    the tiles traversed in a serpentine order in rows of Dec, then by
+    band, then by mjd.
+    """
+    visits = np.asarray(visits)
+    ra, dec = np.asarray(ra, dtype=float), np.asarray(dec, dtype=float)
+    mjd = np.zeros(len(visits)) if mjd is None else np.asarray(mjd)
+    tiles = ang2pix_ring(nside, ra, dec)
+    tile_ids, tile_index = np.unique(tiles, return_inverse=True)
+    # Mean tile positions from the boresights, with RA unwrapped about
+    # the first visit.
+    ra_unwrapped = (ra - ra[0] + 180.) % 360. - 180. + ra[0]
+    counts = np.bincount(tile_index)
+    tile_ra = np.bincount(tile_index, weights=ra_unwrapped)/counts
+    tile_dec = np.bincount(tile_index, weights=dec)/counts
+    row_height = np.degrees(np.sqrt(np.pi/3.)/nside)
+    rows = np.floor((tile_dec + 90.)/row_height).astype(int)
+    serpentine = np.where(rows % 2 == 0, tile_ra, -tile_ra)
+    tile_rank = np.empty(len(tile_ids), dtype=int)
+    tile_rank[np.lexsort((serpentine, rows))] = np.arange(len(tile_ids))
+    order = np.lexsort((mjd, np.asarray(band, dtype=str),
+                       tile_rank[tile_index]))
+    return list(visits[order])
+
+
+def order_visits(visits, opsim_data, nside=32, fov_radius=2.1,
+                 cache_size=32, verbose=True):
+    """
+    Order the visits by sky position and band using the pointings in
+    an OpSimData object.
+
+    Returns
+    -------
+    (list, dict)
+        The ordered visits and the expected catalog-file reuse rates
+        for the input and sky orders.
+    """
+    obs = opsim_data.obs_infos(visits)
+    ordered = sky_order(visits, obs.ra, obs.dec, obs.band, mjd=obs.mjd,
+                        nside=nside)
+    tiles = dict(zip(visits, fov_tiles(obs.ra, obs.dec,
+                                       fov_radius=fov_radius, nside=nside)))
+    reuse = {key: catalog_reuse_rate([tiles[_] for _ in order],
+                                     cache_size=cache_size)
+             for key, order in (('input', visits), ('sky', ordered))}
+    if verbose:
+        print(f"Expected catalog-file reuse rate for {len(visits)} visits: "
+              f"input order {reuse['input']:.2f}, "
+              f"sky order {reuse['sky']:.2f}", flush=True)
+    return ordered, reuse
@@ -1,28 +1,31 @@
+"""
+Selection of the CCDs of OpSim visits that overlap a survey region.
+matplotlib, astropy, galsim, imsim, and lsst.afw are imported by the
+code that uses them, so that the OpSim queries and the region
+geometry do not pay for loading them.
+"""
 import os
 from collections import namedtuple
 from functools import wraps
 import warnings
 import sqlite3
-from erfa import ErfaWarning
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.path import Path
-from matplotlib import patches
-from astropy.time import Time
 import pandas as pd
-import galsim
-from lsst.afw import cameraGeom
-import lsst.geom
-from imsim import load_telescope, BatoidWCSBuilder, get_camera
+import lsst.sphgeom
+from .polygon_engine import ConvexPolygonEngine
+from .instrument_cache import get_cached_camera, get_cached_telescope, \
+    get_science_ccds, get_raft_footprints, get_fov_radius
 
 
 __all__ = ['ignore_erfa_warnings', 'SurveyRegion', 'CcdRegionFactory',
-           'lonlat']
+           'lonlat', 'unit_vectors', 'ObsInfo', 'OpSimSpatialIndex',
+           'OpSimData']
 
 
 def ignore_erfa_warnings(func):
     @wraps(func)
     def call_func(*args, **kwargs):
+        from erfa import ErfaWarning
         with warnings.catch_warnings():
             warnings.filterwarnings('ignore', 'ERFA', ErfaWarning)
             return func(*args, **kwargs)
@@ -34,7 +37,20 @@ def lonlat(unit_vector):
             lsst.sphgeom.LonLat.latitudeOf(unit_vector).asDegrees())
 
 
+def unit_vectors(ra, dec):
+    """
+    Convert RA, Dec values in degrees to Cartesian unit vectors.  The
+    returned array has shape ra.shape + (3,).
+    """
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.stack((cos_dec*np.cos(ra), cos_dec*np.sin(ra), np.sin(dec)),
+                    axis=-1)
+
+
 def make_patch(sky_polygon):
+    from matplotlib.path import Path
     vertices = []
     for vertex in sky_polygon.getVertices():
         vertices.append(
@@ -51,6 +67,18 @@ def make_patch(sky_polygon):
     return Path(vertices, codes)
 
 
+ObsInfo = namedtuple('ObsInfo', ['mjd', 'ra', 'dec', 'band', 'rottelpos'])
+
+
+def make_polygon(vectors):
+    """
+    Create a ConvexPolygon from an array of unit vectors with shape
+    (n_vertices, 3).
+    """
+    return lsst.sphgeom.ConvexPolygon(
+        [lsst.sphgeom.UnitVector3d(*vector) for vector in vectors])
+
+
 class SurveyRegion:
     """
     Class to define a survey region and provide functions to find
@@ -63,10 +91,16 @@ class SurveyRegion:
         self.dec_min = dec0 - lat_size/2.
         self.dec_max = dec0 + lat_size/2.
         self._make_polygon()
-        self.center = galsim.CelestialCoord(ra0*galsim.degrees,
-                                            dec0*galsim.degrees)
+        self._center = (ra0, dec0)
         self.size = min(lon_size, lat_size)
 
+    @property
+    def center(self):
+        """The region center as a galsim.CelestialCoord."""
+        import galsim
+        return galsim.CelestialCoord(self._center[0]*galsim.degrees,
+                                     self._center[1]*galsim.degrees)
+
     def _make_polygon(self):
         corners = [(self.ra_min, self.dec_min),
                    (self.ra_max, self.dec_min),
@@ -75,14 +109,38 @@ class SurveyRegion:
         vertices = [lsst.sphgeom.UnitVector3d(
             lsst.sphgeom.LonLat.fromDegrees(*corner)) for corner in corners]
         self.polygon = lsst.sphgeom.ConvexPolygon(vertices)
+        self.engine = ConvexPolygonEngine(self.polygon)
 
     def intersects(self, polygon):
         return self.polygon.intersects(polygon)
 
+    def relate(self, region):
+        """
+        Return 'contains' if the region polygon contains the specified
+        sphgeom region, 'disjoint' if they do not overlap, and
+        'intersects' otherwise, including the cases where sphgeom
+        cannot determine the relationship exactly.
+        """
+        relationship = self.polygon.relate(region)
+        if relationship & lsst.sphgeom.CONTAINS:
+            return 'contains'
+        if relationship & lsst.sphgeom.DISJOINT:
+            return 'disjoint'
+        return 'intersects'
+
+    def relate_polygons(self, vectors):
+        """
+        Return boolean arrays of the intersection and containment flags
+        for the convex polygons with vertices given by vectors, an
+        array of shape (..., n_vertices, 3).  See ConvexPolygonEngine.
+        """
+        return self.engine.relate(vectors)
+
     def draw_boundary(self, color=None):
         ra = (self.ra_min, self.ra_max, self.ra_max, self.ra_min, self.ra_min)
         dec = (self.dec_min, self.dec_min, self.dec_max, self.dec_max,
                self.dec_min)
+        import matplotlib.pyplot as plt
         plt.plot(ra, dec, color=color)
 
 
@@ -92,7 +150,7 @@ class CcdRegionFactory:
     """
     @ignore_erfa_warnings
     def __init__(self, mjd, ra, dec, band, rottelpos, camera_name="LsstCam",
-                 fov_radius=None):
+                 fov_radius=None, template=None):
         """
         Parameters
         ----------
@@ -110,22 +168,137 @@ class CcdRegionFactory:
             Camera class name.
         fov_radius : float [None]
             Radius of field-of-view, enclosing all CCDS, in degrees.
-            If None, the use LSSTCam FOV radius of 1.76 degrees
-            (Ref. LCA-13381).
+            If None, then use the radius computed from the science
+            CCD corners by instrument_cache.get_fov_radius.  Note that
+            the 1.76 degree LSSTCam FOV radius of LCA-13381 does not
+            enclose the outer corners of the CCDs in the rafts next to
+            the corner rafts.
+        template : FocalPlaneTemplates [None]
+            If not None, compute the CCD corners by rotating and
+            projecting the precomputed focal plane template for this
+            band instead of building the Batoid WCS for this pointing.
+        """
+        self.obs_info = ObsInfo(mjd, ra, dec, band, rottelpos)
+        self.template = template
+        if template is None:
+            from astropy.time import Time
+            from imsim import BatoidWCSBuilder
+            obstime = Time(mjd, format='mjd')
+            telescope = get_cached_telescope(band, rottelpos)
+            self.factory = BatoidWCSBuilder().makeWCSFactory(
+                self.boresight, obstime, telescope, bandpass=band,
+                camera=camera_name)
+        else:
+            self.factory = None
+
+        self.camera_name = camera_name
+        self.camera = get_cached_camera(camera_name)
+        self.fov_radius = fov_radius if fov_radius is not None \
+            else get_fov_radius(camera_name)
+        self._corners = {}
+        self._wcs = {}
+        self._raft_polygons = None
+        # Number of detector WCSs computed for this pointing, and the
+        # statistics of the last select_ccds call.
+        self.wcs_evaluations = 0
+        self.selection_stats = {}
+
+    @property
+    def boresight(self):
+        """The pointing direction as a galsim.CelestialCoord."""
+        import galsim
+        return galsim.CelestialCoord(self.obs_info.ra*galsim.degrees,
+                                     self.obs_info.dec*galsim.degrees)
+
+    def science_ccds(self):
+        """Return the names of the science CCDs in the camera."""
+        return list(get_science_ccds(self.camera_name))
+
+    def get_wcs(self, det_name):
+        """Return the cached WCS of the named detector."""
+        if det_name not in self._wcs:
+            self._wcs[det_name] = self.factory.getWCS(self.camera[det_name])
+            self.wcs_evaluations += 1
+        return self._wcs[det_name]
+
+    def fov_circle(self):
+        """
+        Return the FOV as an lsst.sphgeom.Circle, which encloses all
+        of the science CCDs.
         """
-        obstime = Time(mjd, format='mjd')
-        self.boresight \
-            = galsim.CelestialCoord(ra*galsim.degrees, dec*galsim.degrees)
-        telescope = load_telescope(f"LSST_{band}.yaml",
-                                   rotTelPos=rottelpos*galsim.degrees)
-        self.factory = BatoidWCSBuilder().makeWCSFactory(
-            self.boresight, obstime, telescope, bandpass=band,
-            camera=camera_name)
+        center = lsst.sphgeom.UnitVector3d(
+            lsst.sphgeom.LonLat.fromDegrees(self.obs_info.ra,
+                                            self.obs_info.dec))
+        return lsst.sphgeom.Circle(
+            center, lsst.sphgeom.Angle.fromDegrees(self.fov_radius))
 
-        self.camera = get_camera(camera_name)
-        self.fov_radius = fov_radius if fov_radius is not None else 1.76
+    @ignore_erfa_warnings
+    def raft_polygons(self):
+        """
+        Return a dict, keyed by raft name, of (ConvexPolygon, det_names)
+        tuples for the padded raft footprints.  See
+        instrument_cache.get_raft_footprints.  Each footprint corner is
+        computed with the WCS of the raft's CCD nearest to it.
+        """
+        import galsim
+        if self._raft_polygons is None:
+            self._raft_polygons = {}
+            for raft, footprint in \
+                    get_raft_footprints(self.camera_name).items():
+                ra, dec = np.array(
+                    [self.get_wcs(det_name).toWorld(x, y,
+                                                    units=galsim.degrees)
+                     for det_name, (x, y) in zip(footprint.corner_dets,
+                                                 footprint.pixel_corners)]).T
+                self._raft_polygons[raft] = (
+                    make_polygon(unit_vectors(ra, dec)), footprint.det_names)
+        return self._raft_polygons
 
     @ignore_erfa_warnings
+    def ccd_corners(self, det_names=None):
+        """Return the sky coordinates of the corners of the specified
+        detectors.  The WCS of each detector is evaluated at all four
+        pixel corners in a single call, and the results are cached so
+        that subsequent calls to `create` or `select_ccds` for this
+        pointing reuse them.
+
+        Parameters
+        ----------
+        det_names : list [None]
+            Names of the detectors.  If None, then use all of the
+            science CCDs.
+
+        Returns
+        -------
+        (list, np.ndarray, np.ndarray)
+            The detector names and the RA, Dec values, in degrees, of
+            the detector corners as arrays of shape (n_dets, 4).
+        """
+        if det_names is None:
+            det_names = self.science_ccds()
+        if self.template is not None and not self._corners:
+            names, ra, dec = self.template.corners(*self.obs_info)
+            self._corners.update(zip(names, zip(ra, dec)))
+        for det_name in det_names:
+            if det_name in self._corners:
+                continue
+            if self.factory is None:
+                raise KeyError(f"{det_name} is not in the focal plane "
+                               "template")
+            self._corners[det_name] = self._wcs_corners(det_name)
+        ra = np.array([self._corners[_][0] for _ in det_names])
+        dec = np.array([self._corners[_][1] for _ in det_names])
+        return list(det_names), ra.reshape(-1, 4), dec.reshape(-1, 4)
+
+    def _wcs_corners(self, det_name):
+        """RA, Dec arrays of the detector's pixel corners from its WCS."""
+        import galsim
+        from lsst.afw import cameraGeom
+        corners = self.camera[det_name].getCorners(cameraGeom.PIXELS)
+        x = np.array([corner.x for corner in corners])
+        y = np.array([corner.y for corner in corners])
+        return self.get_wcs(det_name).toWorld(x, y, units=galsim.degrees)
+
     def create(self, det):
         """Return a ConvexPolygon corresponding to the sky region for the
         specified Detector object.
@@ -139,92 +312,327 @@ class CcdRegionFactory:
         -------
         lsst.sphgeom.ConvexPolygon
         """
-        if isinstance(det, str):
-            det = self.camera[det]
-        wcs = self.factory.getWCS(det)
-        vertices = []
-        for corner in det.getCorners(cameraGeom.PIXELS):
-            sky_coord = wcs.toWorld(galsim.PositionD(corner.x, corner.y))
-            lonlat = lsst.sphgeom.LonLat.fromDegrees(sky_coord.ra.deg,
-                                                     sky_coord.dec.deg)
-            vertices.append(lsst.sphgeom.UnitVector3d(lonlat))
-        return lsst.sphgeom.ConvexPolygon(vertices)
+        det_name = det if isinstance(det, str) else det.getName()
+        _, ra, dec = self.ccd_corners([det_name])
+        return make_polygon(unit_vectors(ra[0], dec[0]))
 
     def draw_focal_plane(self, ax, ccds=None, region=None, color=None):
         """
-        Draw the selected CCDs on the specified matplotlib axes.
+        Draw the selected CCDs on the specified matplotlib axes as a
+        single PolyCollection.
         """
         if ccds is None:
             ccds = self.select_ccds(region)
-        for det_name in ccds:
-            polygon = self.create(det_name)
-            self.draw_sky_polygon(ax, polygon, color=color)
+        _, ra, dec = self.ccd_corners(sorted(ccds))
+        return self.draw_polygons(ax, ra, dec, color=color)
 
-    def select_ccds(self, region=None):
+    def select_ccds(self, region=None, use_rafts=True):
         """
         Return the set of science CCDs within the specified region.
         If region is None, return all science CCDs.
+
+        The CCDs are selected from coarse to fine: the FOV circle is
+        tested against the region polygon, then the footprint of each
+        raft, computed from the WCSs of its corner CCDs, and finally
+        the individual CCDs of the rafts that straddle the region
+        boundary.  If use_rafts is False, the raft footprints are
+        skipped and every CCD is tested, e.g., to check the raft
+        pre-filter.  The numbers of rafts in each class and the numbers
+        of WCS evaluations done and avoided are saved in
+        selection_stats.
         """
-        select_all = region is None
-        if not select_all:
-            # Check the offset of the broresight to the region center
-            # to test if the FOV is entirely enclosed in the
-            # region. If so, select all of the science CCDs.
-            offset = region.center.distanceTo(self.boresight)/galsim.degrees
-            if offset < (region.size/2. - self.fov_radius):
-                select_all = True
-
-        ccds = set()
-        for det in self.camera:
-            if det.getType() != cameraGeom.DetectorType.SCIENCE:
-                # Skip non-science CCDs
-                continue
-            if select_all or region.intersects(self.create(det)):
-                ccds.add(det.getName())
+        science_ccds = self.science_ccds()
+        wcs_evaluations = self.wcs_evaluations
+        stats = dict(fov='contains', rafts_inside=0, rafts_outside=0,
+                     rafts_straddling=0)
+        if region is not None:
+            stats['fov'] = region.relate(self.fov_circle())
+        if stats['fov'] == 'contains':
+            ccds = set(science_ccds)
+        elif stats['fov'] == 'disjoint':
+            ccds = set()
+        elif self.factory is None:
+            # The template corners of all of the CCDs are computed
+            # at once, so test them in bulk.
+            ccds = self.select_ccds_bulk(region)
+        elif not use_rafts:
+            ccds = {_ for _ in science_ccds
+                    if region.intersects(self.create(_))}
+        else:
+            ccds = set()
+            for polygon, det_names in self.raft_polygons().values():
+                relation = region.relate(polygon)
+                if relation == 'contains':
+                    stats['rafts_inside'] += 1
+                    ccds.update(det_names)
+                elif relation == 'disjoint':
+                    stats['rafts_outside'] += 1
+                else:
+                    stats['rafts_straddling'] += 1
+                    ccds.update(_ for _ in det_names
+                                if region.intersects(self.create(_)))
+        stats['wcs_evaluations'] = self.wcs_evaluations - wcs_evaluations
+        stats['wcs_avoided'] = len(science_ccds) - stats['wcs_evaluations']
+        self.selection_stats = stats
         return ccds
 
+    def select_ccds_bulk(self, region=None, det_names=None):
+        """
+        Return the set of CCDs within the specified region, using the
+        corner arrays from `ccd_corners` and the vectorized polygon
+        tests of the region's ConvexPolygonEngine.
+        """
+        names, ra, dec = self.ccd_corners(det_names)
+        if region is None:
+            return set(names)
+        selected = region.engine.intersects(unit_vectors(ra, dec))
+        return set(np.array(names)[selected])
+
+    @staticmethod
+    def draw_polygons(ax, ra, dec, alpha=0.2, lw=1, color=None):
+        """
+        Draw polygons with vertex RA, Dec arrays of shape
+        (n_polygons, n_vertices) as a single PolyCollection.
+        """
+        from matplotlib.collections import PolyCollection
+        collection = PolyCollection(np.stack((ra, dec), axis=-1),
+                                    alpha=alpha, lw=lw, color=color)
+        ax.add_collection(collection)
+        ax.autoscale_view()
+        return collection
+
     @staticmethod
     def draw_sky_polygon(ax, polygon, alpha=0.2, lw=1, color=None):
         """
         Draw the patch corresponding to the convex polygon.
         """
+        from matplotlib import patches
         path = make_patch(polygon)
         ax.add_patch(patches.PathPatch(path, alpha=alpha, lw=lw, color=color))
 
 
-ObsInfo = namedtuple('ObsInfo', ['mjd', 'ra', 'dec', 'band', 'rottelpos'])
+class OpSimSpatialIndex:
+    """
+    Persistent sqlite R*Tree index of the OpSim pointings.  Each
+    pointing is stored as its Cartesian unit vector, so that queries
+    are not affected by the RA=0/360 wrap or by the poles.
+    """
+    def __init__(self, opsim_db_file, index_file=None):
+        """
+        Parameters
+        ----------
+        opsim_db_file : str
+            OpSim db file.
+        index_file : str [None]
+            sqlite file to contain the index.  If None, then use
+            `<opsim_db_file>.rtree.db`, or the same basename in the
+            current directory if the OpSim db directory is not writable.
+        """
+        self.opsim_db_file = opsim_db_file
+        if index_file is None:
+            index_file = opsim_db_file + '.rtree.db'
+            if not os.access(os.path.dirname(os.path.abspath(index_file)),
+                             os.W_OK):
+                index_file = os.path.basename(index_file)
+        self.index_file = index_file
+        if not self._is_current():
+            self.build()
+
+    def _db_signature(self):
+        stat = os.stat(self.opsim_db_file)
+        return f"{os.path.abspath(self.opsim_db_file)}:{stat.st_size}:" \
+            f"{stat.st_mtime_ns}"
+
+    def _is_current(self):
+        if not os.path.isfile(self.index_file):
+            return False
+        try:
+            with sqlite3.connect(self.index_file) as con:
+                signature = con.execute("select value from metadata where "
+                                        "key='signature'").fetchone()
+        except sqlite3.DatabaseError:
+            return False
+        return signature is not None and signature[0] == self._db_signature()
+
+    def build(self):
+        """Build the index from the OpSim observations table."""
+        with sqlite3.connect(self.opsim_db_file) as con:
+            df = pd.read_sql("select observationId, fieldRA, fieldDec "
+                             "from observations", con)
+        xyz = unit_vectors(df['fieldRA'].to_numpy(),
+                           df['fieldDec'].to_numpy())
+        rows = ((int(visit), x, x, y, y, z, z) for visit, (x, y, z)
+                in zip(df['observationId'], xyz.tolist()))
+        with sqlite3.connect(self.index_file) as con:
+            con.execute("drop table if exists pointings")
+            con.execute("drop table if exists metadata")
+            con.execute("create virtual table pointings using "
+                        "rtree(id, xmin, xmax, ymin, ymax, zmin, zmax)")
+            con.executemany("insert into pointings values "
+                            "(?, ?, ?, ?, ?, ?, ?)", rows)
+            con.execute("create table metadata (key text primary key, "
+                        "value text)")
+            con.execute("insert into metadata values ('signature', ?)",
+                        (self._db_signature(),))
 
+    @staticmethod
+    def search_circle(region, fov_radius):
+        """
+        Return the sphgeom Circle that contains all pointings within
+        fov_radius degrees of the region polygon.
+        """
+        return region.polygon.getBoundingCircle().dilatedBy(
+            lsst.sphgeom.Angle.fromDegrees(fov_radius))
 
-class OpSimData:
-    def __init__(self, opsim_db_file, query_conditions=None):
-        query = "select * from observations"
+    def candidates_query(self, region, fov_radius):
+        """
+        Return the sql query, to be run on a connection with the index
+        attached as `spatial_index`, that selects the observations
+        whose pointings are in the 3D bounding box of the search
+        circle for the region.
+        """
+        box = self.search_circle(region, fov_radius).getBoundingBox3d()
+        bounds = []
+        for axis, interval in zip('xyz', (box.x(), box.y(), box.z())):
+            bounds.append(f"r.{axis}max >= {interval.getA()} and "
+                          f"r.{axis}min <= {interval.getB()}")
+        return ("select o.* from observations o join "
+                "spatial_index.pointings r on o.observationId = r.id where "
+                + " and ".join(bounds))
+
+    def query(self, region, fov_radius, query_conditions=None, columns=None):
+        """
+        Return a data frame of the observations with pointings within
+        fov_radius degrees of the region polygon.
+
+        Parameters
+        ----------
+        region : SurveyRegion
+            Survey region.
+        fov_radius : float
+            Field-of-view radius in degrees.
+        query_conditions : str [None]
+            Additional sql conditions, e.g., "where filter='i'", to
+            apply to the selected observations.
+        columns : list [None]
+            Columns to return.  If None, return all columns.
+        """
+        query = (f"select {_column_list(columns, ('fieldRA', 'fieldDec'))} "
+                 f"from ({self.candidates_query(region, fov_radius)}) "
+                 "as candidates")
         if query_conditions is not None:
             query += f" {query_conditions}"
+        with sqlite3.connect(self.opsim_db_file) as con:
+            con.execute("attach database ? as spatial_index",
+                        (self.index_file,))
+            df = pd.read_sql(query, con)
+        # Exact test of each field-of-view against the region polygon.
+        radius = lsst.sphgeom.Angle.fromDegrees(fov_radius)
+        keep = []
+        for ra, dec in zip(df['fieldRA'], df['fieldDec']):
+            center = lsst.sphgeom.UnitVector3d(
+                lsst.sphgeom.LonLat.fromDegrees(ra, dec))
+            keep.append(not region.polygon.isDisjointFrom(
+                lsst.sphgeom.Circle(center, radius)))
+        return df[np.array(keep, dtype=bool)].reset_index(drop=True)
+
+
+def _column_list(columns, required=()):
+    """
+    Return the sql column list for a query, including any required
+    columns that are not in columns.
+    """
+    if columns is None:
+        return '*'
+    columns = list(columns)
+    columns.extend(_ for _ in required if _ not in columns)
+    return ', '.join(columns)
+
+
+class OpSimData:
+    # Columns needed for the CCD selection and their compact dtypes.
+    COLUMN_DTYPES = {'observationId': 'int64',
+                     'observationStartMJD': 'float64',
+                     'fieldRA': 'float64',
+                     'fieldDec': 'float64',
+                     'filter': 'category',
+                     'rotTelPos': 'float32'}
+
+    def __init__(self, opsim_db_file, query_conditions=None, region=None,
+                 fov_radius=2.1, index_file=None,
+                 columns=tuple(COLUMN_DTYPES)):
+        """
+        Parameters
+        ----------
+        opsim_db_file : str
+            OpSim db file.
+        query_conditions : str [None]
+            sql conditions, e.g., "where observationStartMJD < 60800",
+            for selecting the observations.
+        region : SurveyRegion [None]
+            If not None, then select only the visits with pointings
+            within fov_radius of the region, using the persistent
+            spatial index of the pointings.
+        fov_radius : float [2.1]
+            Field-of-view radius in degrees for region selections.  The
+            default encloses the outer corners of all of the LSSTCam
+            science CCDs.
+        index_file : str [None]
+            sqlite file for the spatial index.  See OpSimSpatialIndex.
+        columns : list [OpSimData.COLUMN_DTYPES]
+            Columns of the observations table to load.  The columns
+            needed for obs_info are always loaded.  If None, then load
+            all columns.
+        """
         assert os.path.isfile(opsim_db_file)
-        with sqlite3.connect(opsim_db_file) as con:
-            self.df = pd.read_sql(query, con)
+        if columns is not None:
+            columns = list(columns)
+            columns.extend(_ for _ in self.COLUMN_DTYPES if _ not in columns)
+        if region is not None:
+            spatial_index = OpSimSpatialIndex(opsim_db_file,
+                                              index_file=index_file)
+            df = spatial_index.query(region, fov_radius,
+                                     query_conditions=query_conditions,
+                                     columns=columns)
+        else:
+            query = f"select {_column_list(columns)} from observations"
+            if query_conditions is not None:
+                query += f" {query_conditions}"
+            with sqlite3.connect(opsim_db_file) as con:
+                df = pd.read_sql(query, con)
+        self.df = df.astype({key: value for key, value
+                             in self.COLUMN_DTYPES.items()
+                             if key in df})
+        self._visit_index = pd.Index(self.df['observationId'])
+        if not self._visit_index.is_unique:
+            raise ValueError("observationId values are not unique.")
+        self._columns = self.obs_infos()
 
     def obs_info(self, visit):
-        row = self.df.query(f"observationId == {visit}").iloc[0]
-        return ObsInfo(row['observationStartMJD'], row['fieldRA'],
-                       row['fieldDec'], row['filter'], row['rotTelPos'])
+        index = self._visit_index.get_loc(visit)
+        return ObsInfo(*(column[index] for column in self._columns))
 
-    def ccd_region_factory(self, visit, fov_radius=None):
-        return CcdRegionFactory(*self.obs_info(visit), fov_radius=fov_radius)
+    def obs_infos(self, visits=None):
+        """
+        Return an ObsInfo tuple of arrays for the specified visits.
+        If visits is None, return the values for all visits.
+        """
+        if visits is None:
+            df = self.df
+        else:
+            indexes = self._visit_index.get_indexer(visits)
+            if np.any(indexes < 0):
+                raise KeyError("Some visits are not in the OpSim data.")
+            df = self.df.iloc[indexes]
+        return ObsInfo(df['observationStartMJD'].to_numpy(),
+                       df['fieldRA'].to_numpy(),
+                       df['fieldDec'].to_numpy(),
+                       df['filter'].to_numpy(dtype=object),
+                       df['rotTelPos'].to_numpy(dtype=float))
+
+    def ccd_region_factory(self, visit, fov_radius=None, template=None):
+        return CcdRegionFactory(*self.obs_info(visit), fov_radius=fov_radius,
+                                template=template)
 
     def __len__(self):
         return len(self.df)
-
-
-if __name__ == '__main__':
-    ra0, dec0 = 55, -39
-    mjd = 60800.
-    band = 'i'
-    rottelpos = 0.
-    camera_name = 'LsstCam'
-
-    polygon_factory = CcdRegionFactory(mjd, ra0, dec0, band, rottelpos,
-                                       camera_name)
-
-    det_name = 'R22_S11'
-    polygon = polygon_factory.create(det_name)
@@ -0,0 +1,172 @@
+"""
+Lightweight task telemetry for GalSimJobGenerator campaigns.  The
+submit, launch, start, and end times of each PSF and CCD task are
+recorded in a local sqlite database, from which throughput and
+latency summaries can be computed without the Parsl monitoring db.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+import pandas as pd
+
+
+__all__ = ['TaskTelemetry', 'task_times', 'read_start_time']
+
+
+def task_times(future):
+    """
+    Return the launch and end times of a Parsl AppFuture from its task
+    record, or None for times that are not available.  The launch time
+    is when the task was handed to the executor after its dependencies
+    were resolved.
+    """
+    attempts = getattr(future, 'attempts', None)
+    if attempts:
+        # EscalatingFuture: use the final attempt.
+        future = attempts[-1]
+    record = getattr(future, 'task_record', None) or {}
+    launch = record.get('try_time_launched')
+    end = record.get('time_returned')
+    return (launch.timestamp() if launch is not None else None,
+            end.timestamp() if end is not None else None)
+
+
+def read_start_time(start_file):
+    """Read the task start time written by the job command."""
+    try:
+        with open(start_file) as fobj:
+            return float(fobj.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+class TaskTelemetry:
+    """
+    sqlite store of the timing of each task.  The start time of a task
+    is read from the start file written by the task itself, so that the
+    wait for the task's dependencies, e.g., the PSF job of a CCD task,
+    the queue wait for a worker after the dependencies were resolved,
+    and the run time can be separated.
+    """
+    def __init__(self, db_file='telemetry.db'):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(db_file, check_same_thread=False)
+        with self._lock, self._con:
+            self._con.execute("create table if not exists tasks "
+                              "(task_name text, job_type text, "
+                              "visit integer, band text, ndets integer, "
+                              "submit real, launch real, start real, "
+                              "end real, status text)")
+
+    def close(self):
+        self._con.close()
+
+    def record(self, task_name, job_type, visit, band, ndets, submit,
+               launch, start, end, status):
+        """Record the times, in unix seconds, for a finished task."""
+        with self._lock, self._con:
+            self._con.execute("insert into tasks values "
+                              "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (task_name, job_type, int(visit), band,
+                               int(ndets), submit, launch, start, end,
+                               status))
+
+    def watch(self, future, task_name, job_type, visit, band=None, ndets=0,
+              start_file=None):
+        """
+        Record the submission time of a task now, and its remaining
+        times when its future is done.
+        """
+        submit = time.time()
+
+        def done(future):
+            launch, end = task_times(future)
+            end = end or time.time()
+            start = None
+            if start_file is not None:
+                start = read_start_time(start_file)
+            status = 'ok' if future.exception() is None else 'failed'
+            self.record(task_name, job_type, visit, band, ndets, submit,
+                        launch, start, end, status)
+
+        future.add_done_callback(done)
+
+    def tasks(self):
+        """Return a data frame of the recorded tasks."""
+        with self._lock:
+            return pd.read_sql("select * from tasks", self._con)
+
+    def summary(self):
+        """
+        Return a dict of data frames summarizing dependency wait
+        times (submit to launch), queue wait times (launch to start),
+        run times, PSF-to-first-CCD latency, and CCD rendering rates
+        per visit and per band.  Tasks without a recorded start time
+        are counted in `missing_start` and are excluded from the queue
+        wait and run time statistics.
+        """
+        df = self.tasks()
+        df['dependency_wait'] = df['launch'] - df['submit']
+        df['queue_wait'] = df['start'] - df['launch']
+        df['run_time'] = df['end'] - df['start']
+        by_type = df.groupby(['job_type', 'status']).agg(
+            ntasks=('task_name', 'count'),
+            missing_start=('start', lambda _: _.isna().sum()),
+            median_dependency_wait=('dependency_wait', 'median'),
+            max_dependency_wait=('dependency_wait', 'max'),
+            median_queue_wait=('queue_wait', 'median'),
+            max_queue_wait=('queue_wait', 'max'),
+            median_run_time=('run_time', 'median'),
+            max_run_time=('run_time', 'max'))
+
+        ok = df.query("status == 'ok'")
+        psfs = ok.query("job_type == 'psf'").groupby('visit')['end'].max()
+        ccds = ok.query("job_type == 'ccd'")
+        first_ccd = ccds.groupby('visit')['start'].min()
+        psf_latency = (first_ccd - psfs).dropna().rename('psf_latency')
+
+        def rate(group):
+            span = group['end'].max() - group['start'].min()
+            return pd.Series(dict(nccds=group['ndets'].sum(),
+                                  ccds_per_hour=(3600.*group['ndets'].sum()
+                                                 / span if span > 0
+                                                 else float('nan'))))
+
+        per_visit = ccds.groupby(['visit', 'band'], dropna=False).apply(rate)
+        per_band = ccds.groupby('band', dropna=False).apply(rate)
+        return dict(by_type=by_type, psf_latency=psf_latency,
+                    per_visit=per_visit, per_band=per_band)
+
+    def report(self):
+        """Return a text report of the summary."""
+        summary = self.summary()
+        latency = summary['psf_latency']
+        lines = ["Tasks:", summary['by_type'].to_string(), ""]
+        if len(latency) > 0:
+            lines.append(f"PSF-to-first-CCD latency (s): median "
+                         f"{latency.median():.1f}, max {latency.max():.1f}")
+        lines.extend(["", "CCDs per hour by band:",
+                      summary['per_band'].to_string(), "",
+                      "CCDs per hour by visit:",
+                      summary['per_visit'].to_string()])
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarize the task telemetry of a campaign.")
+    parser.add_argument('db_file', type=str, help='telemetry sqlite file')
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.db_file):
+        print(f"{args.db_file} not found", file=sys.stderr)
+        return 1
+    print(TaskTelemetry(args.db_file).report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Dry run of GalSimJobGenerator with simulated tasks on a local thread
+pool.  Each modeled second of task wall time takes 1 ms, and the
+summary of the makespan, idle time, and peak atm psf disk usage is
+printed at the end.  Usage:
+
+    python dry_run_local.py <imsim_yaml> <first visit> <last visit>
+"""
+import sys
+from desc_roman_sims import GalSimJobGenerator, DryRun
+from desc_roman_sims.parsl.parsl_config import load_dry_run_config
+
+
+imsim_yaml = sys.argv[1]
+visits = list(range(int(sys.argv[2]), int(sys.argv[3]) + 1))
+slots = 8
+
+load_dry_run_config(max_workers=slots)
+
+dry_run = DryRun(psf_wall_time=300., psf_size_GB=1., time_scale=1e-3,
+                 slots=slots)
+generator = GalSimJobGenerator(imsim_yaml, visits, nfiles=10, nproc=4,
+                               bash_app_executor='dry_run',
+                               log_dir='logging_dry_run', dry_run=dry_run)
+generator.run()
@@ -0,0 +1,30 @@
+"""
+Plot the per-band visit-count maps of the CCD-visits selected for the
+ELAIS-S1 region by desc_roman_ccds.py, with the region boundary.
+"""
+import sys
+import matplotlib.pyplot as plt
+import pandas as pd
+from desc_roman_sims.survey_region_ccds import SurveyRegion, OpSimData
+from desc_roman_sims.coverage_map import CoverageMap
+from desc_roman_sims.focal_plane_template import FocalPlaneTemplates
+
+
+opsim_db_file = sys.argv[1]
+ccd_visits = pd.read_parquet(sys.argv[2])
+
+region = SurveyRegion(9.5, -44, 10, 10)
+opsim_data = OpSimData(opsim_db_file, region=region,
+                       columns=tuple(OpSimData.COLUMN_DTYPES)
+                       + ('visitExposureTime', 'fiveSigmaDepth'))
+coverage = CoverageMap.from_region(region)
+coverage.add_ccd_visits(ccd_visits, opsim_data,
+                        template=FocalPlaneTemplates())
+
+fig, axes = plt.subplots(2, 3, figsize=(15, 9))
+for ax, band in zip(axes.ravel(), coverage.bands):
+    mesh = coverage.plot(ax, band=band, region=region)
+    fig.colorbar(mesh, ax=ax, label='visits')
+    ax.set_title(band)
+plt.tight_layout()
+plt.savefig('ccd_visit_coverage.png')
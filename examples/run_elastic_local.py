@@ -0,0 +1,34 @@
+"""
+Exercise the elastic scaling of the WorkQueue executor on a single
+host using multiple LocalProvider blocks.
+"""
+import os
+import parsl
+from desc_roman_sims.parsl.parsl_config import load_wq_config
+
+
+# Each block runs a work_queue_worker with 4000 MB, and each task
+# requests 1000 MB, so a new block is requested for every 4 queued
+# tasks, up to 3 blocks.
+load_wq_config(memory=4000, port=9123, monitor=False, max_blocks=3,
+               task_memory=1000, max_idletime=30)
+
+resource_spec = dict(memory=1000, cores=1, disk=0)
+
+
+@parsl.bash_app(executors=['work_queue'])
+def sleeper(index, stderr=None, stdout=None,
+            parsl_resource_specification=resource_spec):
+    return f"sleep 20; echo {index} `hostname` $$"
+
+
+if __name__ == '__main__':
+    log_dir = 'logging'
+    os.makedirs(log_dir, exist_ok=True)
+    futures = []
+    for index in range(24):
+        outfile = os.path.join(log_dir, f'sleeper_{index:02d}.log')
+        futures.append(sleeper(index, stderr=outfile, stdout=outfile))
+
+    # Force python to wait for futures to return in non-interactive sessions.
+    _ = [_.exception() for _ in futures]
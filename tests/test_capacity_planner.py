@@ -0,0 +1,92 @@
+"""
+Tests of the campaign simulation of CapacityPlanner.
+"""
+import pytest
+
+pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from desc_roman_sims.capacity_planner import (  # noqa: E402
+    CapacityPlanner, NodeProfile)
+from desc_roman_sims.job_packing import CcdCostModel  # noqa: E402
+
+
+def test_consecutive_job_memory():
+    """
+    Consecutive jobs request GB_per_CCD*nproc, as GalSimJobGenerator
+    does.
+    """
+    planner = CapacityPlanner({1: list(range(10))}, GB_per_CCD=5.)
+    tasks = planner.make_tasks(nfiles=4, nproc=2)
+    assert [_[1] for _ in tasks] == [True, False, False, False]
+    assert [_[3] for _ in tasks[1:]] == [5*1024*2]*3
+    # Each job requests one core, as in the WorkQueue resource
+    # specifications of GalSimJobGenerator.
+    assert [_.cores for _ in tasks] == [1]*4
+    assert [_.processes for _ in tasks] == [1, 2, 2, 2]
+
+
+def test_suggested_GB_per_CCD():
+    """
+    Without a GB_per_CCD setting, the consecutive jobs request the
+    memory needed by the nproc largest CCDs of the largest job.
+    """
+    cost_model = CcdCostModel(default_memory_GB=4.)
+    cost_model.add_measurements(pd.DataFrame(
+        dict(visit=[2], det_num=[5], wall_time=[600.], memory_GB=[7.])))
+    planner = CapacityPlanner({1: list(range(10))}, cost_model=cost_model)
+    # The second job, with CCDs 4-7, has the largest peak memory.
+    assert planner.suggest_GB_per_CCD(nfiles=4, nproc=2) \
+        == pytest.approx(1.2*(7. + 4.)/2, abs=0.1)
+    GB_per_CCD = planner.suggest_GB_per_CCD(nfiles=4, nproc=2)
+    tasks = planner.make_tasks(nfiles=4, nproc=2)
+    assert [_.memory_MB for _ in tasks[1:]] == [GB_per_CCD*1024*2]*3
+    result = planner.evaluate(1, nfiles=4, nproc=2)
+    assert result.GB_per_CCD == GB_per_CCD
+
+
+def test_oversubscribed_cores():
+    """
+    The makespan is at least the process-seconds divided by the
+    number of cores when the jobs run more processes than cores.
+    """
+    planner = CapacityPlanner({1: list(range(8))},
+                              node_profile=NodeProfile(2, 10**6),
+                              cost_model=CcdCostModel(default_wall_time=100.),
+                              psf_wall_time=300., job_overhead=0.)
+    # One PSF job, then four 2-process CCD jobs that run two at a time.
+    tasks = planner.make_tasks(nfiles=2, nproc=2)
+    assert planner.simulate(tasks, nodes=1) == (500., 300. + 4*2*100.)
+    result = planner.evaluate(1, nfiles=2, nproc=2)
+    assert result.makespan == 550.
+    assert result.core_utilization == 1.
+
+
+def test_simulate():
+    planner = CapacityPlanner({}, node_profile=NodeProfile(2, 1000))
+    tasks = [(1, True, 1, 100, 10.),
+             (1, False, 1, 600, 20.),
+             (1, False, 1, 600, 20.),
+             (2, True, 1, 100, 5.)]
+    # The CCD jobs wait for the PSF job of visit 1, and the second CCD
+    # job waits for memory, while the PSF job of visit 2 runs at once.
+    makespan, busy = planner.simulate(tasks, nodes=1)
+    assert makespan == 50.
+    assert busy == 55.
+    # With two nodes, the CCD jobs run at the same time.
+    assert planner.simulate(tasks, nodes=2) == (30., 55.)
+
+
+def test_simulate_window():
+    """Tasks beyond the window are not started ahead of blocked ones."""
+    tasks = [(1, True, 1, 100, 10.),
+             (1, False, 1, 100, 10.),
+             (2, True, 1, 100, 10.),
+             (2, False, 1, 100, 10.)]
+    planner = CapacityPlanner({}, node_profile=NodeProfile(4, 1000),
+                              window=2)
+    assert planner.simulate(tasks, nodes=1)[0] == 20.
+    # With a window of one task, the PSF job of visit 2 waits behind
+    # the CCD job of visit 1.
+    planner.window = 1
+    assert planner.simulate(tasks, nodes=1)[0] == 30.
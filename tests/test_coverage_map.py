@@ -0,0 +1,77 @@
+"""
+Tests of the rasterized coverage maps of CoverageMap.  These need the
+LSST stack.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('lsst.sphgeom')
+
+from desc_roman_sims.coverage_map import CoverageMap  # noqa: E402
+from desc_roman_sims.survey_region_ccds import OpSimData  # noqa: E402
+
+
+@pytest.fixture
+def coverage_map():
+    coverage_map = CoverageMap(10., 0., 2., 2., pixel_scale=0.1, margin=0.)
+    ra = np.array([[9.5, 10.5, 10.5, 9.5]])
+    dec = np.array([[-0.5, -0.5, 0.5, 0.5]])
+    coverage_map.add('i', ra, dec, exptime=[30.], m5=[24.])
+    coverage_map.add('r', ra, dec, exptime=[15.], m5=[24.5])
+    return coverage_map
+
+
+def test_band_totals(coverage_map):
+    assert coverage_map.counts('i').sum() == 100
+    assert coverage_map.counts().max() == 2
+    assert coverage_map.exptime().max() == 45.
+    assert np.nanmax(coverage_map.depth('i')) == pytest.approx(24.)
+
+
+def test_depth_needs_band(coverage_map):
+    with pytest.raises(ValueError, match='band'):
+        coverage_map.depth(None)
+    with pytest.raises(ValueError, match='band'):
+        coverage_map.depth('u')
+
+
+class _Template:
+    """Focal plane template with a single 1x1 degree CCD."""
+    def corners(self, mjd, ra, dec, band, rottelpos):
+        ra = np.asarray(ra)[:, None, None] + np.array([-0.5, 0.5, 0.5, -0.5])
+        dec = (np.asarray(dec)[:, None, None]
+               + np.array([-0.5, -0.5, 0.5, 0.5]))
+        return ['R22_S11'], ra, dec
+
+
+def _opsim_data(**columns):
+    opsim_data = OpSimData.__new__(OpSimData)
+    opsim_data.df = pd.DataFrame(dict(
+        observationId=[1, 2], observationStartMJD=[60800., 60801.],
+        fieldRA=[10., 10.], fieldDec=[0., 0.], filter=['i', 'i'],
+        rotTelPos=[0., 0.], **columns))
+    opsim_data._visit_index = pd.Index(opsim_data.df['observationId'])
+    return opsim_data
+
+
+def test_add_ccd_visits():
+    """
+    The exposure times and depths come from the OpSim data, and a
+    warning is issued if those columns were not loaded.
+    """
+    ccd_visits = pd.DataFrame(dict(visit=[1, 2], band='i',
+                                   det_name='R22_S11'))
+    coverage_map = CoverageMap(10., 0., 2., 2., pixel_scale=0.1, margin=0.)
+    coverage_map.add_ccd_visits(
+        ccd_visits, _opsim_data(visitExposureTime=[30., 30.],
+                                fiveSigmaDepth=[24., 24.]),
+        template=_Template())
+    assert coverage_map.counts('i').max() == 2
+    assert coverage_map.exptime('i').max() == 60.
+
+    coverage_map = CoverageMap(10., 0., 2., 2., pixel_scale=0.1, margin=0.)
+    with pytest.warns(UserWarning, match='fiveSigmaDepth'):
+        coverage_map.add_ccd_visits(ccd_visits, _opsim_data(),
+                                    template=_Template())
+    assert coverage_map.counts('i').max() == 2
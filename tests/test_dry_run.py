@@ -0,0 +1,45 @@
+"""
+Tests of the dry-run bookkeeping of DryRun.
+"""
+from concurrent.futures import Future
+import pytest
+
+pytest.importorskip('numpy')
+
+from desc_roman_sims.dry_run import DryRun  # noqa: E402
+
+
+def _done_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_psf_disk_events():
+    """
+    Removals of psf files that were not written by simulated psf jobs
+    do not reduce the psf disk usage.
+    """
+    dry_run = DryRun(psf_size_GB=2., time_scale=1.)
+    dry_run.psf_removed(0)
+    dry_run.watch(_done_future((0., 1.)), 'psf', 1, 1000)
+    dry_run.watch(_done_future((0., 2.)), 'psf', 2, 1000)
+    dry_run.watch(_done_future((2., 4.)), 'ccd', 1, 6000)
+    assert dry_run.summary()['peak_psf_disk_GB'] == 4.
+    dry_run.psf_removed(1)
+    dry_run.psf_removed(1)
+    assert [_[1] for _ in dry_run.psf_events] == [1, 1, -1]
+
+
+def test_idle_time():
+    tasks = [('psf', 1, 0., 1.), ('ccd', 1, 1., 3.), ('ccd', 1, 1., 2.)]
+    summaries = []
+    for slots in (None, 2):
+        dry_run = DryRun(time_scale=1., slots=slots)
+        for job_type, visit, start, end in tasks:
+            dry_run.watch(_done_future((start, end)), job_type, visit, 100)
+        summaries.append(dry_run.summary())
+    assert 'idle_time' not in summaries[0]
+    assert summaries[1]['makespan'] == 3.
+    assert summaries[1]['idle_time'] == 2.
+    assert summaries[1]['peak_memory_MB'] == 200
@@ -0,0 +1,69 @@
+"""
+Tests of the focal plane templates.  These need the LSST stack, and
+the comparisons with the exact WCS also need imsim.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('lsst.sphgeom')
+
+from desc_roman_sims.focal_plane_template import (  # noqa: E402
+    FocalPlaneTemplate, FocalPlaneTemplates, airmass, local_sidereal_time)
+
+
+def test_default_validation_airmass():
+    """The default validation pointings are at moderate airmass."""
+    template = FocalPlaneTemplate.__new__(FocalPlaneTemplate)
+    template.rottelpos_grid = np.arange(-90., 91., 5.)
+    template.ref_mjd = 60800.
+    template.ref_ra = float(local_sidereal_time(template.ref_mjd))
+    pointings = template._default_validation_pointings()
+    assert len(pointings) == 4
+    for mjd, ra, dec, _ in pointings:
+        assert 1. <= airmass(mjd, ra, dec) \
+            <= FocalPlaneTemplate.MAX_DEFAULT_AIRMASS
+
+
+@pytest.mark.parametrize('band', 'ugrizy')
+def test_default_tolerance(band):
+    """
+    The templates built with the default settings pass their
+    validation against the Batoid WCS in all six bands.
+    """
+    pytest.importorskip('imsim')
+    template = FocalPlaneTemplate(band)
+    assert template.max_deviation < template.tolerance
+
+
+def test_exact_corners_above_max_airmass(monkeypatch):
+    """
+    The corners of pointings above the validated airmass range of a
+    template are computed with the exact WCS.
+    """
+    template = FocalPlaneTemplate.__new__(FocalPlaneTemplate)
+    template.rottelpos_grid = np.array([0.])
+    template.angles = np.array([0.])
+    template.xi = np.zeros((1, 2, 4))
+    template.eta = np.zeros((1, 2, 4))
+    template.q_sign = 1.
+    template.ref_q = 0.
+    template.det_names = ['R22_S11', 'R22_S12']
+    template.max_airmass = FocalPlaneTemplate.MAX_DEFAULT_AIRMASS
+    monkeypatch.setattr(template, 'exact_corners', lambda *args: (
+        template.det_names, np.full((2, 4), -1.), np.full((2, 4), -1.)))
+    templates = FocalPlaneTemplates()
+    templates._templates['r'] = template
+
+    mjd = 60800.
+    ra = (local_sidereal_time(mjd) - np.array([0., 60.])) % 360.
+    dec = np.array([-30., -30.])
+    assert airmass(mjd, ra[1], dec[1]) > template.max_airmass
+    det_names, corner_ra, corner_dec = templates.corners(mjd, ra, dec, 'r',
+                                                         0.)
+    assert det_names == template.det_names
+    np.testing.assert_allclose(corner_ra[0], ra[0])
+    np.testing.assert_allclose(corner_dec[0], dec[0])
+    assert np.all(corner_ra[1] == -1.) and np.all(corner_dec[1] == -1.)
+
+    _, corner_ra, _ = templates.corners(mjd, ra[1], dec[1], 'r', 0.)
+    assert np.all(corner_ra == -1.)
@@ -0,0 +1,268 @@
+"""
+Tests of GalSimJobGenerator job submission with local Parsl executors
+and a stub `galsim` executable that writes the atm_psf and amp files
+that the generator looks for.  These need parsl and galsim.
+"""
+import os
+import sys
+import glob
+import shutil
+import pytest
+
+parsl = pytest.importorskip('parsl')
+pytest.importorskip('galsim')
+
+from parsl.config import Config  # noqa: E402
+from parsl.executors import ThreadPoolExecutor  # noqa: E402
+from desc_roman_sims.galsim_job_generator import (  # noqa: E402
+    GalSimJobGenerator)
+from desc_roman_sims.job_manifest import JobManifest  # noqa: E402
+from desc_roman_sims.dry_run import DryRun  # noqa: E402
+
+
+_IMSIM_YAML = """output.dir:
+    type: FormattedStr
+    format: {tmp_dir}/output/%08d
+input.atm_psf.save_file:
+    type: FormattedStr
+    format: {tmp_dir}/atm_psf_files/atm_psf_%08d-%1d-%s.pkl
+"""
+
+# The stub writes an atm_psf file for output.nfiles=0 and otherwise an
+# amp file for each det_num, except for the ones in SKIPPED_DETS, and
+# appends its command-line arguments to a log of the calls.  Jobs that
+# include a det_num in FAILED_DETS exit with an error.
+_STUB_GALSIM = """#!{python}
+import os
+import re
+import sys
+args = dict(_.split('=', 1) for _ in sys.argv[1:] if '=' in _)
+with open({calls_file!r}, 'a') as fobj:
+    fobj.write(' '.join(sys.argv[1:]) + '\\n')
+visit = int(args['input.opsim_data.visit'])
+if args['output.nfiles'] == '0':
+    psf_file = os.path.join({psf_dir!r}, f'atm_psf_{{visit:08d}}-0-i.pkl')
+    open(psf_file, 'w').close()
+    sys.exit(0)
+det_nums = list(map(int, re.findall(r'[0-9]+', args['output.det_num'])))
+if set(det_nums).intersection({failed_dets!r}):
+    sys.exit(1)
+output_dir = {output_dir_format!r} % visit
+os.makedirs(output_dir, exist_ok=True)
+for det_num in det_nums:
+    if det_num in {skipped_dets!r}:
+        continue
+    amp_file = os.path.join(output_dir,
+                            f'amp_{{visit:08d}}-0-i-det{{det_num:03d}}.fits')
+    with open(amp_file, 'wb') as fobj:
+        fobj.write(b'SIMPLE')
+"""
+
+SKIPPED_DETS = (3,)
+FAILED_DETS = (9,)
+
+
+@pytest.fixture
+def imsim_yaml(tmp_path):
+    imsim_yaml = str(tmp_path / 'imsim.yaml')
+    with open(imsim_yaml, 'w') as fobj:
+        fobj.write(_IMSIM_YAML.format(tmp_dir=tmp_path))
+    return imsim_yaml
+
+
+@pytest.fixture
+def stub_galsim(tmp_path, monkeypatch):
+    """Put the stub galsim on the PATH and return its calls file."""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    calls_file = str(tmp_path / 'galsim_calls.txt')
+    script = bin_dir / 'galsim'
+    script.write_text(_STUB_GALSIM.format(
+        python=sys.executable, calls_file=calls_file,
+        psf_dir=str(tmp_path / 'atm_psf_files'),
+        output_dir_format=str(tmp_path / 'output' / '%08d'),
+        skipped_dets=SKIPPED_DETS, failed_dets=FAILED_DETS))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep
+                       + os.environ['PATH'])
+    return calls_file
+
+
+@pytest.fixture
+def local_parsl(tmp_path):
+    parsl.load(Config(executors=[
+        ThreadPoolExecutor(label='thread_pool', max_threads=1),
+        ThreadPoolExecutor(label='local', max_threads=2)],
+                      run_dir=str(tmp_path / 'runinfo')))
+    yield
+    parsl.dfk().cleanup()
+    parsl.clear()
+
+
+def _num_calls(calls_file):
+    with open(calls_file) as fobj:
+        return len(fobj.readlines())
+
+
+def test_memoized_submission(tmp_path, imsim_yaml, stub_galsim,
+                             local_parsl):
+    """
+    The memoized galsim bash_apps run, only the CCDs with output files
+    are recorded in the manifest, and resubmitted jobs are served from
+    the memoization cache.
+    """
+    manifest = JobManifest(str(tmp_path / 'manifest.db'))
+    generator = GalSimJobGenerator(imsim_yaml, [1, 2], nfiles=2,
+                                   default_det_list=[0, 1, 2, 3],
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local',
+                                   manifest=manifest)
+    ccd_futures = list(iter(generator.get_job_future, None))
+    assert len(ccd_futures) == 4
+    assert [_.exception() for _ in ccd_futures] == [None]*4
+    assert [_.exception() for _ in generator._rm_atm_psf_futures] \
+        == [None]*2
+    assert [_.exception() for _ in generator._record_futures] == [None]*4
+    assert _num_calls(stub_galsim) == 6
+
+    # The atm_psf files were removed after the CCDs were rendered.
+    assert not glob.glob(str(tmp_path / 'atm_psf_files' / '*.pkl'))
+    assert manifest.psf_status_counts() == {'removed': 2}
+    finished = manifest.finished_dets([1, 2])
+    assert finished == {1: {0, 1, 2}, 2: {0, 1, 2}}
+
+    # Resubmitting the same PSF job returns the memoized result
+    # without running galsim.
+    psf_future = generator._submit_psf_job(1)
+    assert psf_future.exception() is None
+    assert _num_calls(stub_galsim) == 6
+    manifest.close()
+
+
+def test_memo_key_ignores_config_path(tmp_path, imsim_yaml, stub_galsim,
+                                      local_parsl):
+    """
+    A copy of the config at a different path has the same memoization
+    key, so its jobs are served from the cache.
+    """
+    generator = GalSimJobGenerator(imsim_yaml, [1], nfiles=1,
+                                   default_det_list=[0],
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local')
+    assert generator._submit_psf_job(1).exception() is None
+    assert _num_calls(stub_galsim) == 1
+
+    copied_yaml = str(tmp_path / 'copied.yaml')
+    shutil.copy(imsim_yaml, copied_yaml)
+    generator = GalSimJobGenerator(copied_yaml, [1], nfiles=1,
+                                   default_det_list=[0],
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local')
+    assert generator._submit_psf_job(1).exception() is None
+    assert _num_calls(stub_galsim) == 1
+
+
+def test_psf_clean_up_after_failed_ccds(tmp_path, imsim_yaml, stub_galsim,
+                                        local_parsl):
+    """
+    The atm_psf files are removed and the PSF file budget is released
+    even if some of the CCD jobs of a visit fail.
+    """
+    generator = GalSimJobGenerator(imsim_yaml, [1, 2, 3], nfiles=2,
+                                   default_det_list=[0, 1, 8, 9],
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local',
+                                   max_psf_files=1)
+    generator.run()
+    assert generator.psf_scheduler.submitted == 3
+    assert generator.psf_scheduler.psf_files == 0
+    assert [_.exception() for _ in generator._rm_atm_psf_futures] \
+        == [None]*3
+    assert not glob.glob(str(tmp_path / 'atm_psf_files' / '*.pkl'))
+
+
+def test_ccd_visit_catalog_input(tmp_path, imsim_yaml):
+    """
+    The visits, bands, and det lists are taken from a CcdVisitCatalog.
+    """
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    from desc_roman_sims.ccd_visit_catalog import CcdVisitCatalog
+    catalog = CcdVisitCatalog(str(tmp_path / 'ccd_visits'))
+    catalog.append(pd.DataFrame(dict(visit=[2, 1, 1, 2],
+                                     band=['r', 'i', 'i', 'r'],
+                                     det_num=[3, 5, 0, 8])))
+    generator = GalSimJobGenerator(imsim_yaml, catalog, nfiles=2,
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local')
+    assert sorted(generator.visits) == [1, 2]
+    assert generator._visit_bands == {1: 'i', 2: 'r'}
+    assert generator._det_lists == {1: [0, 5], 2: [3, 8]}
+    assert generator.num_jobs == 2
+
+
+@pytest.mark.parametrize('use_existing_psf_files, num_tasks',
+                         [(False, 6), (True, 5)])
+def test_dry_run_isolation(tmp_path, imsim_yaml, local_parsl,
+                           use_existing_psf_files, num_tasks):
+    """
+    A dry run leaves the real atm_psf files and the manifest as they
+    were, and only skips the psf job of a visit with an existing file
+    if use_existing_psf_files is set.
+    """
+    psf_dir = tmp_path / 'atm_psf_files'
+    psf_dir.mkdir()
+    psf_file = str(psf_dir / 'atm_psf_00000001-0-i.pkl')
+    with open(psf_file, 'wb') as fobj:
+        fobj.write(b'psf')
+    manifest = JobManifest(str(tmp_path / 'manifest.db'))
+    manifest.record_psf(1, psf_file)
+
+    log_dir = tmp_path / 'logging'
+    generator = GalSimJobGenerator(imsim_yaml, [1, 2], nfiles=2,
+                                   default_det_list=[0, 1, 2, 3],
+                                   log_dir=str(log_dir),
+                                   bash_app_executor='local',
+                                   manifest=manifest,
+                                   dry_run=DryRun(
+                                       time_scale=1e-6,
+                                       use_existing_psf_files=(
+                                           use_existing_psf_files)))
+    generator.run()
+    assert len(generator.dry_run.tasks) == num_tasks
+
+    assert os.path.isfile(psf_file)
+    assert glob.glob(str(psf_dir / '*')) == [psf_file]
+    assert not os.listdir(log_dir / 'dry_run_atm_psf')
+    assert manifest.psf_file(1) == psf_file
+    assert manifest.psf_status_counts() == {'done': 1}
+    assert manifest.finished_dets([1, 2]) == {}
+    manifest.close()
+
+
+def test_psf_files_of_colliding_visits(tmp_path, imsim_yaml):
+    """
+    The atm_psf file of a visit is not confused with that of a visit
+    whose number contains it, e.g., 1234 and 12345.
+    """
+    psf_dir = tmp_path / 'atm_psf_files'
+    psf_dir.mkdir()
+    for visit in (1234, 12345):
+        (psf_dir / f'atm_psf_{visit:08d}-0-i.pkl').write_bytes(b'psf')
+    generator = GalSimJobGenerator(imsim_yaml, [12345, 1234], nfiles=2,
+                                   default_det_list=[0, 1],
+                                   log_dir=str(tmp_path / 'logging'),
+                                   bash_app_executor='local',
+                                   node_cache_GB=1.)
+    for visit in (1234, 12345):
+        psf_file = str(psf_dir / f'atm_psf_{visit:08d}-0-i.pkl')
+        assert generator.find_psf_file(visit) == psf_file
+        (_, pattern), = generator._staged_inputs(visit)
+        assert glob.glob(pattern) == [psf_file]
+
+
+def test_adaptive_memory_needs_work_queue(tmp_path, imsim_yaml):
+    with pytest.raises(ValueError, match='work_queue'):
+        GalSimJobGenerator(imsim_yaml, [1], nfiles=2,
+                           log_dir=str(tmp_path / 'logging'),
+                           bash_app_executor='local', adaptive_memory=True)
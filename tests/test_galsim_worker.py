@@ -0,0 +1,112 @@
+"""
+Tests of the config caching and timing reports of the warm-worker
+functions.
+"""
+import io
+import pytest
+
+from desc_roman_sims import galsim_worker
+
+
+def test_time_report():
+    stream = io.StringIO()
+    galsim_worker._write_time_report("time", 75.5, stream)
+    assert "real\t1m15.500s" in stream.getvalue()
+
+
+def test_verbose_time_report(tmp_path):
+    """
+    The `/usr/bin/time -v` style report gives the peak memory that
+    GalSimJobGenerator reads for the adaptive memory requests.
+    """
+    log_file = tmp_path / 'psf.log'
+    with open(log_file, 'w') as fobj:
+        galsim_worker._write_time_report("/usr/bin/time -v", 10., fobj)
+    job_generator = pytest.importorskip('desc_roman_sims.galsim_job_generator')
+    peak = job_generator.GalSimJobGenerator._psf_peak_memory(str(log_file))
+    assert peak is not None and peak > 0
+
+
+def test_visit_config_copies(tmp_path):
+    """
+    Each call returns a fresh copy of the unprocessed visit config, so
+    that processing one CCD batch does not change the config of the
+    next one.
+    """
+    pytest.importorskip('galsim')
+    imsim_yaml = tmp_path / 'imsim.yaml'
+    imsim_yaml.write_text("input:\n  opsim_data:\n    visit: 0\n"
+                          "output:\n  nfiles: 1\n")
+    galsim_worker.clear_worker_cache()
+    config = galsim_worker._visit_config(str(imsim_yaml), 12, 'hash')
+    assert config['input']['opsim_data']['visit'] == 12
+    config['output']['nfiles'] = 5
+    config['_input_objs'] = {}
+    config = galsim_worker._visit_config(str(imsim_yaml), 12, 'hash')
+    assert config['output']['nfiles'] == 1
+    assert '_input_objs' not in config
+    galsim_worker.clear_worker_cache()
+
+
+class _VisitInput:
+    """Stand-in for the imsim opsim_data input that counts its loads."""
+    _req_params = {'visit': int}
+    _opt_params = {}
+    _single_params = []
+    _takes_rng = False
+    loads = 0
+
+    def __init__(self, visit):
+        _VisitInput.loads += 1
+
+
+def test_visit_inputs_reused(tmp_path):
+    """
+    A second CCD batch for the same visit reuses the input objects
+    loaded by the first one.
+    """
+    galsim = pytest.importorskip('galsim')
+    if 'opsim_data' in galsim.config.valid_input_types:
+        pytest.skip('opsim_data input type is already registered')
+    galsim.config.RegisterInputType(
+        'opsim_data', galsim.config.InputLoader(_VisitInput))
+
+    class DetListBuilder(galsim.config.OutputBuilder):
+        """Fits output that accepts the det_num list of render_ccds."""
+        def buildImages(self, config, base, file_num, image_num, obj_num,
+                        ignore, logger):
+            return super().buildImages(config, base, file_num, image_num,
+                                       obj_num, ignore + ['det_num'],
+                                       logger)
+
+    galsim.config.RegisterOutputType('det_list', DetListBuilder())
+    imsim_yaml = tmp_path / 'imsim.yaml'
+    imsim_yaml.write_text(f"""input:
+    opsim_data:
+        visit: 0
+gal:
+    type: Gaussian
+    sigma: 1.
+image:
+    size: 8
+    pixel_scale: 0.2
+output:
+    type: det_list
+    dir: {tmp_path}
+    file_name:
+        type: NumberedFile
+        root: det
+        digits: 3
+        ext: .fits
+""")
+    galsim_worker.clear_worker_cache()
+    try:
+        for det_nums in ([0, 1], [2]):
+            galsim_worker.render_ccds(str(imsim_yaml), 12, det_nums, 'hash')
+        assert _VisitInput.loads == 1
+        assert sorted(_.name for _ in tmp_path.glob('det*.fits')) \
+            == ['det000.fits', 'det001.fits']
+    finally:
+        galsim_worker.clear_worker_cache()
+        del galsim.config.valid_input_types['opsim_data']
+        del galsim.config.valid_output_types['det_list']
@@ -0,0 +1,34 @@
+"""
+Tests of the CCD output checks and the sqlite manifest of JobManifest.
+"""
+from desc_roman_sims.job_manifest import JobManifest, job_rendered_dets
+
+
+def _write_amp_file(output_dir, det_num, contents=b'SIMPLE'):
+    amp_file = output_dir / f'amp_00000001-0-i-R22_S11-det{det_num:03d}.fits'
+    amp_file.write_bytes(contents)
+
+
+def test_job_rendered_dets(tmp_path):
+    _write_amp_file(tmp_path, 0)
+    _write_amp_file(tmp_path, 1, contents=b'')
+    _write_amp_file(tmp_path, 2)
+    _write_amp_file(tmp_path, 5)
+    (tmp_path / 'process_info_00000001-0-i-R22_S11-det003.txt').write_text('')
+    assert job_rendered_dets(tmp_path, [0, 1, 2, 3]) == {0, 2}
+    assert job_rendered_dets(tmp_path, [0, 1], validate=False) == {0, 1}
+    assert job_rendered_dets(tmp_path / 'missing', [0]) == set()
+
+
+def test_manifest(tmp_path):
+    manifest = JobManifest(str(tmp_path / 'manifest.db'))
+    manifest.record_ccds(1, [0, 2])
+    manifest.record_ccds(2, [4])
+    assert manifest.finished_dets() == {1: {0, 2}, 2: {4}}
+    assert manifest.finished_dets([2]) == {2: {4}}
+    manifest.record_psf(1, 'atm_psf_00000001-0-i.pkl')
+    assert manifest.psf_file(1) == 'atm_psf_00000001-0-i.pkl'
+    manifest.record_psf(1, 'atm_psf_00000001-0-i.pkl', status='removed')
+    assert manifest.psf_file(1) is None
+    assert manifest.psf_status_counts() == {'removed': 1}
+    manifest.close()
@@ -0,0 +1,44 @@
+"""
+Tests of the packing of CCDs into jobs.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from desc_roman_sims.job_packing import (  # noqa: E402
+    consecutive_jobs, balanced_jobs)
+
+
+DET_LIST = [0, 1, 2, 3, 4, 5]
+WALL_TIMES = np.array([10., 9., 8., 3., 2., 1.])
+MEMORIES = np.array([1., 2., 3., 4., 5., 6.])
+
+
+def test_consecutive_jobs():
+    jobs = consecutive_jobs(DET_LIST[:5], 2)
+    assert [_.det_nums for _ in jobs] == [[0, 1], [2, 3], [4]]
+    assert {(_.wall_time, _.memory_GB) for _ in jobs} == {(None, None)}
+
+
+def test_balanced_jobs():
+    jobs = balanced_jobs(DET_LIST, WALL_TIMES, MEMORIES, 3, 1)
+    assert [_.det_nums for _ in jobs] == [[0, 3, 4], [1, 2, 5]]
+    assert [_.wall_time for _ in jobs] == [15., 18.]
+    assert [_.memory_GB for _ in jobs] == pytest.approx([6., 7.2])
+
+
+def test_balanced_jobs_nproc():
+    jobs = balanced_jobs(DET_LIST, WALL_TIMES, MEMORIES, 3, 2,
+                         memory_margin=1.)
+    # The wall time of each job is the makespan of its CCDs on nproc
+    # processes, and its memory covers the nproc largest CCDs.
+    assert [_.wall_time for _ in jobs] == [10., 9.]
+    assert [_.memory_GB for _ in jobs] == [9., 9.]
+
+
+def test_balanced_jobs_nfiles():
+    jobs = balanced_jobs(list(range(7)), np.ones(7), np.ones(7), 3, 1)
+    assert len(jobs) == 3
+    assert all(len(_.det_nums) <= 3 for _ in jobs)
+    assert sorted(sum((_.det_nums for _ in jobs), [])) == list(range(7))
@@ -0,0 +1,36 @@
+"""
+Tests of the LRU eviction of NodeCache.
+"""
+import os
+
+from desc_roman_sims.node_cache import NodeCache, _file_lock
+
+
+def _write_file(path, nbytes):
+    with open(path, 'wb') as fobj:
+        fobj.write(b'x'*nbytes)
+    return str(path)
+
+
+def test_eviction_removes_lock_files(tmp_path):
+    cache = NodeCache(str(tmp_path / 'cache'), max_GB=1500/1024**3,
+                      protect_seconds=0)
+    src_files = [_write_file(tmp_path / f'src_{i}.pkl', 1000)
+                 for i in range(3)]
+    local_files = [cache.stage(_) for _ in src_files]
+    assert [os.path.isfile(_) for _ in local_files] == [False, False, True]
+    lock_files = sorted(_ for _ in os.listdir(cache.cache_dir)
+                        if _.endswith('.lock') and _ != '.lock')
+    assert lock_files == [os.path.basename(local_files[-1]) + '.lock']
+
+
+def test_eviction_skips_files_being_staged(tmp_path):
+    cache = NodeCache(str(tmp_path / 'cache'), max_GB=1500/1024**3,
+                      protect_seconds=0)
+    src_files = [_write_file(tmp_path / f'src_{i}.pkl', 1000)
+                 for i in range(2)]
+    first = cache.stage(src_files[0])
+    with _file_lock(first + '.lock'):
+        second = cache.stage(src_files[1])
+    assert os.path.isfile(first) and os.path.isfile(second)
+    assert os.path.isfile(first + '.lock')
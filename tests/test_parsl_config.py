@@ -0,0 +1,36 @@
+"""
+Tests of the block scaling parameters of the Parsl configuration.
+These need parsl.
+"""
+import math
+import pytest
+
+pytest.importorskip('parsl')
+
+from desc_roman_sims.parsl.parsl_config import (  # noqa: E402
+    scaling_parallelism, tasks_per_node)
+
+
+def strategy_blocks(outstanding_tasks, parallelism, nodes_per_block,
+                    workers_per_node=1):
+    """
+    Number of blocks requested from an idle executor by Parsl's simple
+    scaling strategy.  WorkQueue executors report one worker per node.
+    """
+    slots = math.ceil(outstanding_tasks*parallelism)
+    return math.ceil(slots/(workers_per_node*nodes_per_block))
+
+
+@pytest.mark.parametrize('nodes_per_block', [1, 2, 4])
+def test_blocks_per_task(nodes_per_block):
+    """One block is requested per block's worth of queued tasks."""
+    node_memory, task_memory = 182000, 6*1024
+    ntasks = tasks_per_node(node_memory, task_memory)
+    assert ntasks == 29
+    parallelism = scaling_parallelism(node_memory, task_memory)
+    tasks_per_block = ntasks*nodes_per_block
+    for nblocks in (1, 3, 10):
+        assert strategy_blocks(nblocks*tasks_per_block, parallelism,
+                               nodes_per_block) == nblocks
+    assert strategy_blocks(tasks_per_block + 1, parallelism,
+                           nodes_per_block) == 2
@@ -0,0 +1,53 @@
+"""
+Tests of the vectorized convex polygon relationships of
+ConvexPolygonEngine.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from desc_roman_sims.polygon_engine import (  # noqa: E402
+    interior_normals, ConvexPolygonEngine)
+
+
+def _box(ra_min, ra_max, dec_min, dec_max):
+    """Unit vectors of the corners of an RA, Dec box, in degrees."""
+    ra = np.radians([ra_min, ra_max, ra_max, ra_min])
+    dec = np.radians([dec_min, dec_min, dec_max, dec_max])
+    return np.array([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra),
+                     np.sin(dec)]).T
+
+
+@pytest.fixture
+def engine():
+    return ConvexPolygonEngine(_box(-1, 1, -1, 1), chunk_size=2)
+
+
+def test_interior_normals():
+    # The orientation does not depend on the order of the vertices.
+    vertices = _box(-1, 1, -1, 1)
+    for normals in (interior_normals(vertices),
+                    interior_normals(vertices[::-1])):
+        assert np.all(normals @ np.array([1., 0., 0.]) > 0)
+
+
+def test_relate(engine):
+    polygons = np.array([_box(-0.5, 0.5, -0.5, 0.5),   # contained
+                         _box(2, 3, 2, 3),             # disjoint
+                         _box(0.5, 2, 0.5, 2),         # corner overlap
+                         _box(-2, 2, -0.1, 0.1),       # edges cross only
+                         _box(-2, 2, -2, 2)])          # contains region
+    intersects, contains = engine.relate(polygons)
+    np.testing.assert_array_equal(intersects, [True, False, True, True,
+                                               True])
+    np.testing.assert_array_equal(contains, [True, False, False, False,
+                                             False])
+
+
+def test_relate_shapes(engine):
+    polygons = np.array([[_box(-0.5, 0.5, -0.5, 0.5), _box(2, 3, 2, 3),
+                          _box(0.5, 2, 0.5, 2)]]*2)
+    intersects, contains = engine.relate(polygons)
+    assert intersects.shape == contains.shape == (2, 3)
+    np.testing.assert_array_equal(engine.intersects(polygons), intersects)
+    np.testing.assert_array_equal(engine.contains(polygons), contains)
@@ -0,0 +1,91 @@
+"""
+Tests of the PSF job scheduling caps of PsfScheduler.
+"""
+from concurrent.futures import Future
+import pytest
+
+from desc_roman_sims.psf_scheduler import PsfScheduler
+
+
+class Submitter:
+    """Record the submitted visits and hold their futures."""
+    def __init__(self):
+        self.futures = {}
+
+    def __call__(self, visit):
+        self.futures[visit] = Future()
+        return self.futures[visit]
+
+    def finish(self, visit, exception=None):
+        if exception is None:
+            self.futures[visit].set_result(0)
+        else:
+            self.futures[visit].set_exception(exception)
+
+
+def test_max_psf_jobs():
+    submit = Submitter()
+    scheduler = PsfScheduler(submit, range(4), max_psf_jobs=2)
+    gates = [scheduler.register(_)[0] for _ in range(4)]
+    assert list(submit.futures) == [0, 1]
+    submit.finish(0)
+    assert gates[0].result() == 0
+    assert list(submit.futures) == [0, 1, 2]
+    assert scheduler.running_jobs == 2
+
+
+def test_lookahead():
+    submit = Submitter()
+    scheduler = PsfScheduler(submit, range(4), lookahead=2)
+    for visit in range(4):
+        scheduler.register(visit)
+    assert list(submit.futures) == [0, 1]
+    submit.finish(0)
+    submit.finish(1)
+    # The window only advances when the CCDs of visit 0 are released.
+    assert list(submit.futures) == [0, 1]
+    scheduler.release(0)
+    assert list(submit.futures) == [0, 1, 2]
+
+
+def test_max_psf_files():
+    submit = Submitter()
+    scheduler = PsfScheduler(submit, range(3), max_psf_files=1)
+    gates = [scheduler.register(_)[0] for _ in range(3)]
+    submit.finish(0)
+    assert list(submit.futures) == [0]
+    scheduler.release(0)
+    assert list(submit.futures) == [0, 1]
+    # A failed PSF job frees its share of the file budget.
+    submit.finish(1, RuntimeError('psf job failed'))
+    with pytest.raises(RuntimeError, match='psf job failed'):
+        gates[1].result()
+    assert list(submit.futures) == [0, 1, 2]
+    assert scheduler.peak_psf_files == 1
+
+
+def test_existing_psf_file():
+    submit = Submitter()
+    scheduler = PsfScheduler(submit, range(2), max_psf_files=1)
+    assert scheduler.register(0, psf_file_exists=True) == []
+    scheduler.register(1)
+    assert not submit.futures
+    scheduler.release(0)
+    assert list(submit.futures) == [1]
+
+
+def test_unremoved_files_fail_pending_gates():
+    """
+    If the file budget is held by files that could not be removed,
+    the pending gates fail instead of waiting forever.
+    """
+    submit = Submitter()
+    scheduler = PsfScheduler(submit, range(3), max_psf_files=1)
+    gates = [scheduler.register(_)[0] for _ in range(3)]
+    submit.finish(0)
+    assert not gates[1].done()
+    scheduler.release(0, file_removed=False)
+    for gate in gates[1:]:
+        with pytest.raises(RuntimeError, match='PSF file budget'):
+            gate.result(timeout=0)
+    assert list(submit.futures) == [0]
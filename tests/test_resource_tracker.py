@@ -0,0 +1,100 @@
+"""
+Tests of the adaptive memory requests of ResourceTracker and the
+resubmission of out-of-memory jobs by EscalatingFuture.
+"""
+from concurrent.futures import Future
+import pytest
+
+from desc_roman_sims.resource_tracker import (
+    ResourceTracker, EscalatingFuture, is_memory_failure)
+
+
+KEY = ('ccd', 4)
+
+
+class MemoryError137(RuntimeError):
+    """Stand-in for a bash_app failure of a job killed with SIGKILL."""
+    exitcode = 137
+
+
+class Submitter:
+    """Record the memory requests and hold the attempt futures."""
+    def __init__(self):
+        self.calls = []
+        self.futures = []
+
+    def __call__(self, memory_MB, retry=False):
+        self.calls.append((memory_MB, retry))
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+class TaskFailure(RuntimeError):
+    """Stand-in for the WorkQueue executor's task failures."""
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def test_is_memory_failure():
+    assert is_memory_failure(MemoryError137('killed'))
+    assert is_memory_failure(MemoryError())
+    assert is_memory_failure(TaskFailure(
+        'work queue result: task used more resources than requested'))
+    # A MemoryError raised by a python_app and wrapped by the executor.
+    failure = TaskFailure('Task execution raises an exception')
+    failure.__cause__ = MemoryError()
+    assert is_memory_failure(failure)
+    assert not is_memory_failure(RuntimeError('exit code 1'))
+    assert not is_memory_failure(RuntimeError('shared memory segment '
+                                              'not found'))
+
+
+def test_request():
+    tracker = ResourceTracker(cap_MB=20000, min_samples=2, margin=1.5)
+    assert tracker.request(KEY, 24000) == 20000
+    tracker.record(KEY, 16000, 3000)
+    assert tracker.request(KEY, 16000) == 16000
+    tracker.record(KEY, 16000, 4000)
+    # The request is lowered once min_samples peaks are observed.
+    assert tracker.request(KEY, 16000) == 6000
+    assert tracker.efficiency == pytest.approx(7000/32000)
+    # An escalation sets a floor for later requests.
+    assert tracker.escalate(KEY, 6000) == 9000
+    assert tracker.request(KEY, 16000) == 9000
+    assert tracker.escalate(KEY, 16000) == 20000
+    assert tracker.escalate(KEY, 20000) is None
+
+
+def test_escalating_future():
+    submit = Submitter()
+    tracker = ResourceTracker(cap_MB=10000)
+    future = EscalatingFuture(submit, tracker, KEY, 4000,
+                              observe=lambda: 5000)
+    submit.futures[0].set_exception(MemoryError137('killed'))
+    assert not future.done()
+    submit.futures[1].set_result(0)
+    assert future.result() == 0
+    assert submit.calls == [(4000, False), (6000, True)]
+    assert future.memory_MB == 6000
+    assert tracker.observed_MB == 5000
+    assert tracker.escalations == [(KEY, 4000, 6000)]
+
+
+def test_escalating_future_failures():
+    submit = Submitter()
+    tracker = ResourceTracker(cap_MB=6000)
+    future = EscalatingFuture(submit, tracker, KEY, 4000)
+    submit.futures[0].set_exception(MemoryError137('killed'))
+    # The request is at the cap, so the second failure is final.
+    submit.futures[1].set_exception(MemoryError137('killed again'))
+    with pytest.raises(MemoryError137, match='killed again'):
+        future.result()
+    assert len(future.attempts) == 2
+
+    # Other failures are not resubmitted.
+    future = EscalatingFuture(submit, tracker, KEY, 4000)
+    submit.futures[-1].set_exception(RuntimeError('exit code 1'))
+    with pytest.raises(RuntimeError, match='exit code 1'):
+        future.result()
+    assert len(future.attempts) == 1
@@ -0,0 +1,60 @@
+"""
+Tests of the HEALPix pixel indexes computed by sky_ordering.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from desc_roman_sims.sky_ordering import (  # noqa: E402
+    ang2pix_ring, fov_tiles)
+
+
+# Positions in the equatorial region and both polar caps, with the
+# RING-scheme pixel indexes from healpy.ang2pix(nside, ra, dec,
+# lonlat=True).
+RA = [12.3, 101.7, 200.5, 333.3, 45.6, 270.1, 59.9]
+DEC = [0.7, 35.2, -27.8, 48.1, 75.3, -81.4, -89.5]
+HEALPY_PIXELS = {1: [4, 1, 10, 3, 0, 11, 8],
+                 32: [6084, 2660, 8967, 1615, 185, 12222, 12284],
+                 1024: [6211724, 2665605, 9224425, 1610745, 205602,
+                        12512412, 12582655]}
+
+
+@pytest.mark.parametrize('nside', sorted(HEALPY_PIXELS))
+def test_ang2pix_ring(nside):
+    np.testing.assert_array_equal(ang2pix_ring(nside, RA, DEC),
+                                  HEALPY_PIXELS[nside])
+
+
+def test_ang2pix_ring_shapes():
+    assert ang2pix_ring(32, RA[0], DEC[0]) == HEALPY_PIXELS[32][0]
+    # The RA values wrap, and scalar decs broadcast.
+    np.testing.assert_array_equal(
+        ang2pix_ring(32, np.array([[12.3], [372.3]]), 0.7),
+        [[6084], [6084]])
+
+
+def _unit_vectors(ra, dec):
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.array([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra),
+                     np.sin(dec)]).T
+
+
+@pytest.mark.parametrize('ra, dec', [(10., -45.), (150., -5.), (300., -70.)])
+def test_fov_tiles(ra, dec):
+    """
+    The tiles of the sampled FOV are those found by densely sampling
+    the sky within fov_radius of the pointing.
+    """
+    fov_radius = 2.1
+    rng = np.random.default_rng(1234)
+    # Uniform points on the sphere near the pointing.
+    z = rng.uniform(np.sin(np.radians(dec - 3.)),
+                    np.sin(np.radians(dec + 3.)), 400000)
+    dense_dec = np.degrees(np.arcsin(z))
+    dense_ra = ra + rng.uniform(-3., 3., len(z))/np.cos(np.radians(dec + 3.))
+    inside = (_unit_vectors(dense_ra, dense_dec) @ _unit_vectors(ra, dec)
+              >= np.cos(np.radians(fov_radius)))
+    dense_tiles = set(ang2pix_ring(32, dense_ra[inside], dense_dec[inside]))
+    tiles = fov_tiles(ra, dec, fov_radius=fov_radius)[0]
+    assert tiles == dense_tiles
@@ -0,0 +1,55 @@
+"""
+Tests of the CCD selection of CcdRegionFactory.  These need the LSST
+stack and imsim.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('lsst.sphgeom')
+pytest.importorskip('imsim')
+
+from desc_roman_sims.survey_region_ccds import (  # noqa: E402
+    CcdRegionFactory, SurveyRegion)
+
+
+RA0, DEC0 = 9.5, -44.
+
+
+@pytest.fixture(scope='module')
+def factory():
+    return CcdRegionFactory(60300.2, RA0, DEC0, 'i', 20.)
+
+
+@pytest.mark.parametrize('offset', [(-1.6, 0.), (-0.9, 0.4), (0., 1.3),
+                                    (0.7, -0.2), (1.2, 1.1), (0.3, -1.7)])
+def test_raft_prefilter(factory, offset):
+    """
+    The raft pre-filter selects the same CCDs as testing every CCD
+    for regions whose edges cut across the focal plane.
+    """
+    ra0 = RA0 + offset[0]/np.cos(np.radians(DEC0))
+    region = SurveyRegion(ra0, DEC0 + offset[1], 2., 2.)
+    ccds = factory.select_ccds(region)
+    assert factory.selection_stats['fov'] == 'intersects'
+    assert ccds == factory.select_ccds(region, use_rafts=False)
+
+
+def test_outer_raft_only(factory):
+    """
+    A region that overlaps only the outer corner of a CCD beyond the
+    nominal 1.76 degree FOV radius still selects that CCD.
+    """
+    det_names, ra, dec = factory.ccd_corners()
+    cos_dec = np.cos(np.radians(DEC0))
+    dx = (ra - RA0)*cos_dec
+    dy = dec - DEC0
+    index = np.unravel_index(np.argmax(np.hypot(dx, dy)), dx.shape)
+    assert np.hypot(dx[index], dy[index]) > 1.9
+    # Center a small region just inside the outermost CCD corner.
+    scale = 1. - 0.05/np.hypot(dx[index], dy[index])
+    region = SurveyRegion(RA0 + scale*dx[index]/cos_dec,
+                          DEC0 + scale*dy[index], 0.1, 0.1)
+    expected = {_ for _ in det_names if region.intersects(factory.create(_))}
+    assert det_names[index[0]] in expected
+    assert factory.select_ccds(region) == expected
+    assert factory.selection_stats['fov'] == 'intersects'